@@ -0,0 +1,47 @@
+# benchmarks/compare.py
+
+import sys, json, argparse
+
+def compare(baseline, current, threshold=0.10):
+    """
+    Compare two results files stage by stage.
+    Returns [(stage, old_seconds, new_seconds, change)] and the list of stages
+    that got slower by more than threshold (0.10 = 10%).
+    """
+    rows, regressions = [], []
+    for stage, new in current["stages"].items():
+        old = baseline["stages"].get(stage)
+        if not old or "skipped" in old or "skipped" in new:
+            continue
+        change = (new["seconds"] - old["seconds"]) / old["seconds"] if old["seconds"] else 0.0
+        rows.append((stage, old["seconds"], new["seconds"], change))
+        if change > threshold:
+            regressions.append(stage)
+    return rows, regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark results files.")
+    parser.add_argument("baseline", help="Results JSON of the reference run")
+    parser.add_argument("current", help="Results JSON of the run to check")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown that counts as a regression (default 0.10)")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    if baseline["corpus"]["spec"] != current["corpus"]["spec"] or baseline["corpus"]["scale"] != current["corpus"]["scale"]:
+        print("⚠️ The two runs used different corpora, timings are not comparable.")
+
+    rows, regressions = compare(baseline, current, args.threshold)
+    print(f"{'Stage':<16} {'Before':>9} {'After':>9} {'Change':>8}")
+    for stage, old, new, change in rows:
+        flag = " ⚠️" if stage in regressions else (" ✅" if change < -args.threshold else "")
+        print(f"{stage:<16} {old:>8.3f}s {new:>8.3f}s {change:>+7.1%}{flag}")
+    if regressions:
+        print(f"❌ {len(regressions)} stage(s) slower than the {args.threshold:.0%} threshold: {', '.join(regressions)}")
+        sys.exit(1)
+    print("✅ No regressions.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# benchmarks/corpus.py
+
+import os, json, random, shutil, subprocess, argparse
+from functools import lru_cache
+
+try:
+    from PIL import Image
+    import pillow_heif
+except ImportError:
+    Image = None
+    pillow_heif = None
+
+MARKER = ".corpus.json"
+
+# Files generated per kind at scale 1. Videos are `video_seconds` long.
+DEFAULT_SPEC = {
+    "seed": 1234,
+    "heic": 40,
+    "jpg": 20,
+    "png": 10,
+    "mov30": 6,
+    "mov120": 3,
+    "mov240": 3,
+    "mp4": 4,
+    "avi": 2,
+    "duplicate_ratio": 0.15,
+    "depth": 6,
+    "image_size": "1280x960",
+    "video_size": "1280x720",
+    "video_seconds": 2
+}
+
+# Fixed mtime base so the corpus is identical between runs (2024-01-01 UTC)
+MTIME_BASE = 1704067200
+
+def _ffmpeg(*args):
+    subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", *args],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+
+@lru_cache(maxsize=None)
+def _has_encoder(name):
+    encoders = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True).stdout
+    return f" {name} " in encoders
+
+def _video_encoder():
+    return "libx264" if _has_encoder("libx264") else "mpeg4"
+
+def _noise(seed):
+    # Seeded noise makes every generated file unique while staying reproducible
+    return f"noise=alls=12:allf=t+u:all_seed={seed}"
+
+def make_image(path, size, seed):
+    """JPEG or PNG still from the ffmpeg test source, chosen by extension."""
+    _ffmpeg(
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate=1",
+        "-ss", str(seed % 60), "-vf", _noise(seed), "-frames:v", "1",
+        "-fflags", "+bitexact", "-flags", "+bitexact", path
+    )
+
+def heic_encoder():
+    """'pillow' (pillow-heif), 'heif-enc' (libheif CLI) or None when HEIC cannot be written."""
+    if pillow_heif is not None:
+        return "pillow"
+    if shutil.which("heif-enc"):
+        return "heif-enc"
+    return None
+
+def make_heic(path, size, seed):
+    png = path + ".png"
+    make_image(png, size, seed)
+    try:
+        if heic_encoder() == "pillow":
+            pillow_heif.register_heif_opener()
+            with Image.open(png) as img:
+                img.save(path, format="HEIF", quality=80)
+        else:
+            subprocess.run(["heif-enc", "-q", "80", "-o", path, png], check=True, stdout=subprocess.DEVNULL)
+    finally:
+        os.remove(png)
+
+def make_video(path, size, fps, seconds, seed, encoder):
+    """Test-pattern video with a sine audio track; the container follows the extension."""
+    if path.endswith(".avi"):
+        video_codec, audio_codec = "mpeg4", "libmp3lame" if _has_encoder("libmp3lame") else "pcm_s16le"
+    else:
+        video_codec, audio_codec = encoder, "aac"
+    _ffmpeg(
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={fps}:duration={seconds}",
+        "-f", "lavfi", "-i", f"sine=frequency={220 + seed % 660}:sample_rate=48000:duration={seconds}",
+        "-vf", _noise(seed), "-c:v", video_codec, "-pix_fmt", "yuv420p", "-threads", "1",
+        *(["-preset", "ultrafast"] if video_codec == "libx264" else ["-q:v", "5"]),
+        "-c:a", audio_codec, "-map_metadata", "-1",
+        "-fflags", "+bitexact", "-flags:v", "+bitexact", "-flags:a", "+bitexact",
+        path
+    )
+
+def _random_dir(rng, root, depth):
+    """Directory up to `depth` levels deep, reusing names so the tree has both breadth and depth."""
+    parts = [f"{rng.choice(['DCIM', 'Camera', 'Trip', 'Backup', 'Export'])}_{rng.randrange(4)}"
+             for _ in range(rng.randint(1, depth))]
+    return os.path.join(root, *parts)
+
+def _plan(spec, scale):
+    """List of (kind, name, fps) for every unique file, in generation order."""
+    kinds = [
+        ("heic", "IMG_{:04d}.HEIC", None),
+        ("jpg", "photo_{:04d}.jpg", None),
+        ("png", "screenshot_{:04d}.png", None),
+        ("mov30", "IMG_{:04d}.MOV", 30),
+        ("mov120", "IMG_{:04d}.MOV", 120),
+        ("mov240", "IMG_{:04d}.MOV", 240),
+        ("mp4", "clip_{:04d}.mp4", 30),
+        ("avi", "old_{:04d}.avi", 25)
+    ]
+    plan = []
+    index = 0
+    for kind, pattern, fps in kinds:
+        for _ in range(max(1, round(spec[kind] * scale)) if spec[kind] else 0):
+            index += 1
+            plan.append((kind, pattern.format(index), fps))
+    return plan
+
+def generate_corpus(root, spec=None, scale=1.0, force=False):
+    """
+    Generate a deterministic media corpus under root and return its description
+    ({"spec", "scale", "files", "bytes", "skipped"}). A corpus already generated
+    with the same spec and scale is reused unless force is set.
+    HEIC stills need pillow-heif or heif-enc; without either they are skipped
+    and listed under "skipped".
+    """
+    spec = dict(DEFAULT_SPEC, **(spec or {}))
+    marker = os.path.join(root, MARKER)
+    if not force and os.path.isfile(marker):
+        with open(marker) as f:
+            existing = json.load(f)
+        if existing["spec"] == spec and existing["scale"] == scale:
+            print(f"♻️ Reusing corpus in {root}")
+            return existing
+    if not shutil.which("ffmpeg"):
+        raise RuntimeError("ffmpeg is required to generate the benchmark corpus")
+    if os.path.isdir(root) and os.listdir(root):
+        if not os.path.isfile(marker):
+            raise RuntimeError(f"{root} is not empty and is not a benchmark corpus, refusing to overwrite it")
+        shutil.rmtree(root)
+    os.makedirs(root, exist_ok=True)
+
+    rng = random.Random(spec["seed"])
+    encoder = _video_encoder()
+    can_heic = heic_encoder() is not None
+    plan = _plan(spec, scale)
+    files = []
+    skipped = []
+    print(f"🧪 Generating {len(plan)} unique files in {root} (video encoder: {encoder})...")
+    for idx, (kind, name, fps) in enumerate(plan, start=1):
+        path = os.path.join(_random_dir(rng, root, spec["depth"]), name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        seed = rng.randrange(1 << 16)
+        if kind == "heic":
+            if not can_heic:
+                skipped.append(kind)
+                continue
+            make_heic(path, spec["image_size"], seed)
+        elif kind in ("jpg", "png"):
+            make_image(path, spec["image_size"], seed)
+        else:
+            make_video(path, spec["video_size"], fps, spec["video_seconds"], seed, encoder)
+        files.append(path)
+        print(f"🧪 {idx}/{len(plan)}", end="\r")
+    print()
+
+    # Byte-identical copies under other names and folders
+    for src in rng.sample(files, round(len(files) * spec["duplicate_ratio"])):
+        stem, ext = os.path.splitext(os.path.basename(src))
+        dst = os.path.join(_random_dir(rng, root, spec["depth"]), f"{stem} (1){ext}")
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copyfile(src, dst)
+        files.append(dst)
+
+    for idx, path in enumerate(sorted(files)):
+        os.utime(path, (MTIME_BASE + idx, MTIME_BASE + idx))
+
+    description = {
+        "spec": spec,
+        "scale": scale,
+        "files": len(files),
+        "bytes": sum(os.path.getsize(path) for path in files),
+        "skipped": {kind: skipped.count(kind) for kind in set(skipped)}
+    }
+    with open(marker, "w") as f:
+        json.dump(description, f, indent=2)
+    if skipped:
+        print(f"⚠️ Skipped {len(skipped)} HEIC file(s): install pillow-heif or heif-enc to generate them.")
+    print(f"✅ Corpus ready: {description['files']} files, {description['bytes'] / 1e6:.1f} MB")
+    return description
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the synthetic benchmark corpus.")
+    parser.add_argument("root", help="Directory to (re)create the corpus in")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply the file counts of the default spec")
+    parser.add_argument("--force", action="store_true", help="Regenerate even if a matching corpus exists")
+    args = parser.parse_args(argv)
+    generate_corpus(args.root, scale=args.scale, force=args.force)
+
+if __name__ == "__main__":
+    main()
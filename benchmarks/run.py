@@ -0,0 +1,172 @@
+# benchmarks/run.py
+
+import os, sys, json, time, shutil, platform, subprocess, tempfile, argparse
+from datetime import datetime
+from core.config import HASH_ALGORITHM, CONVERSION_JOBS, WALK_EXCLUDE
+from core.walker import walk_files
+from core.scanner import filter_candidates, classify_videos, find_duplicate_digests
+from core.checksum_cache import ChecksumCache
+from core.manifest import Manifest
+from core.utils import process_template, required_tools
+from core.convert_images import IMAGES_TARGET
+from core.convert_videos import VIDEOS_TARGET
+from core.convert_slowmo import SLOWMO_TARGET
+from core import heic_engine
+from benchmarks.corpus import generate_corpus
+
+USER_OPTIONS = {cat: {"include": True, "include_non_iphone": True} for cat in ["photos", "videos", "slowmo"]}
+CONVERSION_STAGES = [("convert_images", IMAGES_TARGET), ("convert_videos", VIDEOS_TARGET), ("convert_slowmo", SLOWMO_TARGET)]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+def drop_caches():
+    """Flush the page cache so every stage starts cold (needs root, ignored otherwise)."""
+    try:
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+        return True
+    except OSError:
+        return False
+
+def stage_result(seconds, files, nbytes, **extra):
+    return dict(
+        seconds=round(seconds, 4),
+        files=files,
+        bytes=nbytes,
+        files_per_s=round(files / seconds, 2) if seconds else None,
+        mb_per_s=round(nbytes / 1e6 / seconds, 2) if seconds else None,
+        **extra
+    )
+
+def _tool_version(tool):
+    if not shutil.which(tool):
+        return None
+    flag = "-ver" if tool == "exiftool" else "-version"
+    result = subprocess.run([tool, flag], capture_output=True, text=True)
+    return (result.stdout.splitlines() or [""])[0].strip()
+
+def environment():
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    commit = subprocess.run(["git", "-C", repo, "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit.stdout.strip() or None,
+        "hash_algorithm": HASH_ALGORITHM,
+        "conversion_jobs": CONVERSION_JOBS,
+        "heic_engine": "pillow-heif" if heic_engine.available() else "heif-convert",
+        "ffmpeg": _tool_version("ffmpeg"),
+        "exiftool": _tool_version("exiftool")
+    }
+
+def run_benchmarks(corpus_dir, work_dir, cold=False, convert=True):
+    """
+    Time each stage of a run over corpus_dir separately and return {stage: result}.
+    Conversion output goes to work_dir. With cold=True the page cache is dropped
+    before every stage. Conversion stages whose tools are missing are skipped.
+    """
+    stages = {}
+
+    def start():
+        if cold:
+            drop_caches()
+        return time.perf_counter()
+
+    t = start()
+    file_stats = dict(walk_files(corpus_dir, exclude=WALK_EXCLUDE))
+    stages["walk"] = stage_result(time.perf_counter() - t, len(file_stats), sum(st.st_size for st in file_stats.values()))
+    print(f"⏱️ walk: {stages['walk']['seconds']}s")
+
+    t = start()
+    photos, videos = filter_candidates(sorted(file_stats), USER_OPTIONS)
+    categories = {path: "photos" for path in photos}
+    categories.update(classify_videos(videos, USER_OPTIONS))
+    stages["classify"] = stage_result(time.perf_counter() - t, len(videos), sum(file_stats[p].st_size for p in videos))
+    print(f"⏱️ classify: {stages['classify']['seconds']}s")
+
+    candidates = [path for path in sorted(file_stats) if path in categories]
+    candidate_bytes = sum(file_stats[p].st_size for p in candidates)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        db_path = os.path.join(cache_dir, "checksums.sqlite")
+        for stage, cache_path in [("hash", None), ("hash_cache_cold", db_path), ("hash_cache_warm", db_path)]:
+            cache = ChecksumCache(cache_path) if cache_path else None
+            t = start()
+            digests, stats = find_duplicate_digests(candidates, cache=cache, file_stats=file_stats)
+            elapsed = time.perf_counter() - t
+            if cache is not None:
+                cache.close()
+            bytes_read = sum(s["bytes_read"] for s in stats.values())
+            stages[stage] = stage_result(elapsed, len(candidates), candidate_bytes, bytes_read=bytes_read)
+            print(f"\n⏱️ {stage}: {stages[stage]['seconds']}s")
+
+    if not convert:
+        return stages
+    os.makedirs(work_dir, exist_ok=True)
+    manifest_path = os.path.join(work_dir, "manifest_bench.sqlite")
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    with Manifest(manifest_path) as manifest:
+        for path in candidates:
+            manifest.add(categories[path], digests[path], path)
+
+    for stage, target in CONVERSION_STAGES:
+        missing = [tool for tool in required_tools(target["required_tools_key"]) if not shutil.which(tool)]
+        if missing:
+            print(f"⚠️ Skipping {stage}: missing {', '.join(missing)}")
+            stages[stage] = {"skipped": f"missing {', '.join(missing)}"}
+            continue
+        with Manifest(manifest_path) as manifest:
+            sources = [paths[0] for _, paths in manifest.groups(target["category"])]
+        output_dir = os.path.join(work_dir, "output")
+        shutil.rmtree(output_dir, ignore_errors=True)
+        t = start()
+        process_template(manifest_path, output_dir, **target)
+        stages[stage] = stage_result(time.perf_counter() - t, len(sources), sum(file_stats[p].st_size for p in sources))
+        print(f"⏱️ {stage}: {stages[stage]['seconds']}s")
+    return stages
+
+def print_results(stages):
+    print(f"\n{'Stage':<16} {'Seconds':>9} {'Files':>7} {'Files/s':>9} {'MB/s':>9}")
+    for stage, r in stages.items():
+        if "skipped" in r:
+            print(f"{stage:<16} {'skipped (' + r['skipped'] + ')':>36}")
+            continue
+        print(f"{stage:<16} {r['seconds']:>9.3f} {r['files']:>7} {r['files_per_s'] or 0:>9.1f} {r['mb_per_s'] or 0:>9.1f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark walk, classify, hash and conversion stages on a synthetic corpus.")
+    parser.add_argument("--corpus", default=os.path.join(tempfile.gettempdir(), "copy-conv-bench", "corpus"),
+                        help="Corpus directory (generated if missing)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Corpus size multiplier")
+    parser.add_argument("--output", help="Results JSON (default: benchmarks/results/bench_<timestamp>.json)")
+    parser.add_argument("--cold", action="store_true", help="Drop the page cache before each stage (root only)")
+    parser.add_argument("--no-convert", action="store_true", help="Only time walk, classify and hash")
+    args = parser.parse_args(argv)
+
+    corpus = generate_corpus(args.corpus, scale=args.scale)
+    if args.cold and not drop_caches():
+        print("⚠️ Cannot drop the page cache without root, timings are warm-cache.")
+        args.cold = False
+    work_dir = os.path.join(os.path.dirname(os.path.abspath(args.corpus)), "work")
+    stages = run_benchmarks(args.corpus, work_dir, cold=args.cold, convert=not args.no_convert)
+    print_results(stages)
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "corpus": corpus,
+        "cold_cache": args.cold,
+        "environment": environment(),
+        "stages": stages
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"📄 Results saved to {output}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(130)
@@ -1,7 +1,8 @@
 # cli/main_convert.py
 
-import sys, os
-from core.config import IPHONE_IMAGE_EXTS, NON_IPHONE_IMAGE_EXTS, IPHONE_VIDEO_EXTS, NON_IPHONE_VIDEO_EXTS
+import sys, os, argparse
+from core.config import IPHONE_IMAGE_EXTS, NON_IPHONE_IMAGE_EXTS, IPHONE_VIDEO_EXTS, NON_IPHONE_VIDEO_EXTS, PERCEPTUAL_DEDUP, HASH_ALGORITHM, HASH_PROCESSES
+from core.hashing import available_algorithms
 from core.utils import (
     get_source_directory,
     get_destination_directory,
@@ -12,6 +13,9 @@ from core.scanner import scan_and_deduplicate
 from core.convert_images import process_images
 from core.convert_videos import process_videos
 from core.convert_slowmo import process_slowmo
+from core.pipeline import stream_scan_and_convert
+from core.manifest import export_json
+from core import metrics
 
 def prompt_user_options():
     print("🎛️ Select media types to include in the process:")
@@ -36,18 +40,58 @@ def prompt_user_options():
 
     return user_options
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scan, deduplicate and convert media files.")
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Reuse the latest copy-conv_* folder in the destination and skip files already converted there"
+    )
+    parser.add_argument(
+        "--export-json", action="store_true",
+        help="Also write the scan results as per-category checksum JSON files (format of earlier versions)"
+    )
+    parser.add_argument(
+        "--near-duplicates", action="store_true", default=PERCEPTUAL_DEDUP,
+        help="Convert only the best copy of visually identical photos (resized, re-encoded, HEIC vs JPEG); "
+             "needs numpy and pillow, scan-then-convert mode only"
+    )
+    parser.add_argument(
+        "--hash", choices=available_algorithms(), default=HASH_ALGORITHM,
+        help=f"Content hash used for deduplication (default: {HASH_ALGORITHM}; xxh3 needs xxhash)"
+    )
+    parser.add_argument(
+        "--hash-processes", action="store_true", default=HASH_PROCESSES,
+        help="Hash in worker processes instead of threads (faster for CPU-bound hashing on fast disks)"
+    )
+    return parser.parse_args(argv)
+
+def find_latest_run_dir(output_dir):
+    runs = sorted(
+        d for d in os.listdir(output_dir)
+        if d.startswith("copy-conv_") and os.path.isdir(os.path.join(output_dir, d))
+    )
+    return os.path.join(output_dir, runs[-1]) if runs else None
+
+def main(argv=None):
+    args = parse_args(argv)
     print("📦 MEDIA CONVERSION & COPY UTILITY")
 
     source_dir = get_source_directory("Source path: ")
     output_dir = get_destination_directory("Destination path: ")
 
-    # Create timestamped root subdir
-    timestamp = datetime.now().strftime("copy-conv_%Y%m%d_%H%M%S")
-    final_output_dir = os.path.join(output_dir, timestamp)
-    os.makedirs(final_output_dir)
+    final_output_dir = find_latest_run_dir(output_dir) if args.resume else None
+    if final_output_dir:
+        print(f"♻️ Resuming in {final_output_dir}")
+    else:
+        if args.resume:
+            print("ℹ️ No previous run found in the destination, starting a new one.")
+        # Create timestamped root subdir
+        timestamp = datetime.now().strftime("copy-conv_%Y%m%d_%H%M%S")
+        final_output_dir = os.path.join(output_dir, timestamp)
+        os.makedirs(final_output_dir)
 
     user_options = prompt_user_options()
+    streaming = yes_no_prompt("⚡ Convert files while scanning (streaming mode)?", default="y")
 
     print("\n📝 Summary:")
     print(f"Source directory:      {source_dir}")
@@ -56,22 +100,50 @@ def main():
         opt = user_options[key]
         status = "✓" if opt["include"] else "✗"
         print(f"  - {key.capitalize():<7}: {status} (non-iPhone: {'yes' if opt['include_non_iphone'] else 'no'})")
+    print(f"Mode:                  {'streaming' if streaming else 'scan, then convert'}{' (resume)' if args.resume else ''}")
 
     confirm = input("\nProceed? (y/n): ").strip().lower()
     if confirm != "y":
         print("❌ Aborted.")
         sys.exit(0)
 
-    json_files = scan_and_deduplicate(source_dir, user_options, final_output_dir)
-
-    if json_files.get("photos"):
-        process_images(json_files["photos"], final_output_dir)
-    if json_files.get("videos"):
-        process_videos(json_files["videos"], final_output_dir)
-    if json_files.get("slowmo"):
-        process_slowmo(json_files["slowmo"], final_output_dir)
+    metrics.start_run(final_output_dir)
+    try:
+        run(args, source_dir, final_output_dir, user_options, streaming)
+    finally:
+        metrics.finish_run()
 
     print("\n✅ All steps completed successfully.")
 
+def run(args, source_dir, final_output_dir, user_options, streaming):
+    if streaming:
+        if args.near_duplicates:
+            print("ℹ️ Near-duplicate detection runs after the scan, so it is skipped in streaming mode.")
+        manifests = stream_scan_and_convert(
+            source_dir, user_options, final_output_dir, resume=args.resume, near_duplicates=False, algorithm=args.hash,
+            use_processes=args.hash_processes
+        )
+    else:
+        manifests = scan_and_deduplicate(
+            source_dir, user_options, final_output_dir, near_duplicates=args.near_duplicates, algorithm=args.hash,
+            use_processes=args.hash_processes
+        )
+
+        if manifests.get("photos"):
+            process_images(manifests["photos"], final_output_dir, resume=args.resume)
+        if manifests.get("videos"):
+            process_videos(manifests["videos"], final_output_dir, resume=args.resume)
+        if manifests.get("slowmo"):
+            process_slowmo(manifests["slowmo"], final_output_dir, resume=args.resume)
+
+    if args.export_json and manifests:
+        manifest_path = next(iter(manifests.values()))
+        for path in export_json(manifest_path, list(manifests)).values():
+            print(f"📄 Exported {os.path.basename(path)}")
+
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n❌ Interrupted by user.")
+        sys.exit(130)
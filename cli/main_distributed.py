@@ -0,0 +1,76 @@
+# cli/main_distributed.py
+
+import sys, os, argparse
+from core.config import DIST_HOST, DIST_PORT
+from core.scanner import scan_and_deduplicate
+from core.distributed import coordinate, run_worker, check_coordinator_tools
+from core import metrics
+
+TYPES = ["photos", "videos", "slowmo"]
+
+def parse_types(value):
+    types = [t.strip() for t in value.split(",") if t.strip()]
+    unknown = set(types) - set(TYPES)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown media type(s): {', '.join(sorted(unknown))}")
+    return types
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Spread conversions over several worker processes or hosts.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    coordinator = commands.add_parser("coordinator", help="Scan (or load a manifest) and hand out conversion jobs")
+    coordinator.add_argument("destination", help="Output directory, also used for the logs and manifest")
+    coordinator.add_argument("--source", help="Directory to scan first")
+    coordinator.add_argument("--manifest", help="Serve an existing manifest_*.sqlite instead of scanning")
+    coordinator.add_argument("--types", type=parse_types, default=TYPES, help="Comma-separated media types (default: photos,videos,slowmo)")
+    coordinator.add_argument("--non-iphone", action="store_true", help="Also include non-iPhone formats (copied as-is)")
+    coordinator.add_argument("--host", default=DIST_HOST, help=f"Address to listen on (default: {DIST_HOST}, use 0.0.0.0 for other hosts)")
+    coordinator.add_argument("--port", type=int, default=DIST_PORT, help=f"Port to listen on (default: {DIST_PORT})")
+    coordinator.add_argument("--token", default=os.environ.get("COPY_CONV_TOKEN"), help="Shared secret workers must send (default: $COPY_CONV_TOKEN)")
+    coordinator.add_argument("--resume", action="store_true", help="Skip files the destination's journal lists as converted")
+
+    worker = commands.add_parser("worker", help="Claim and convert jobs from a coordinator")
+    worker.add_argument("url", help="Coordinator address, e.g. http://127.0.0.1:8765")
+    worker.add_argument("--types", type=parse_types, default=TYPES, help="Media types this worker converts")
+    worker.add_argument("--jobs", type=int, help="Parallel conversions (default: CONVERSION_JOBS)")
+    worker.add_argument("--token", default=os.environ.get("COPY_CONV_TOKEN"), help="Shared secret (default: $COPY_CONV_TOKEN)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "worker":
+        run_worker(args.url, args.types, args.jobs, args.token)
+        return
+
+    if bool(args.source) == bool(args.manifest):
+        print("❌ Give either --source to scan or --manifest to serve an existing scan.")
+        sys.exit(1)
+    # Before a possibly long scan: the coordinator cannot hand out jobs without them
+    check_coordinator_tools()
+    os.makedirs(args.destination, exist_ok=True)
+    metrics.start_run(args.destination)
+    try:
+        if args.manifest:
+            manifest_path = args.manifest
+        else:
+            if not os.path.isdir(args.source):
+                print(f"❌ Source directory not found: {args.source}")
+                sys.exit(1)
+            user_options = {
+                key: {"include": key in args.types, "include_non_iphone": args.non_iphone}
+                for key in TYPES
+            }
+            manifests = scan_and_deduplicate(os.path.abspath(args.source), user_options, args.destination)
+            manifest_path = next(iter(manifests.values()))
+        failed = coordinate(manifest_path, args.destination, args.types, args.host, args.port, args.token, args.resume)
+    finally:
+        metrics.finish_run()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n❌ Interrupted by user.")
+        sys.exit(130)
@@ -0,0 +1,42 @@
+# cli/main_watch.py
+
+import sys, os, argparse
+from core.watcher import watch_and_convert
+from core import metrics
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Watch a landing directory and convert new media into one stable destination."
+    )
+    parser.add_argument("source", help="Directory to watch (e.g. where phones sync to)")
+    parser.add_argument("destination", help="Output directory, reused across restarts")
+    parser.add_argument(
+        "--types", default="photos,videos,slowmo",
+        help="Comma-separated media types to ingest (default: photos,videos,slowmo)"
+    )
+    parser.add_argument("--non-iphone", action="store_true", help="Also ingest non-iPhone formats (copied as-is)")
+    parser.add_argument("--poll", action="store_true", help="Poll the tree instead of using inotify")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.isdir(args.source):
+        print(f"❌ Source directory not found: {args.source}")
+        sys.exit(1)
+    types = {t.strip() for t in args.types.split(",") if t.strip()}
+    unknown = types - {"photos", "videos", "slowmo"}
+    if unknown:
+        print(f"❌ Unknown media type(s): {', '.join(sorted(unknown))}")
+        sys.exit(1)
+    user_options = {
+        key: {"include": key in types, "include_non_iphone": args.non_iphone}
+        for key in ["photos", "videos", "slowmo"]
+    }
+    metrics.start_run(args.destination)
+    try:
+        watch_and_convert(args.source, args.destination, user_options, backend="poll" if args.poll else "auto")
+    finally:
+        metrics.finish_run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# core/checksum_cache.py
+
+import os, sqlite3
+from core.config import CHECKSUM_CACHE_PATH
+
+class ChecksumCache:
+    """
+    Persistent digest cache stored in SQLite.
+    Entries are keyed by (path, kind) and are only trusted while the file's
+    size, mtime_ns and inode still match the values recorded with the digest.
+    `kind` separates digest types, e.g. "md5" and "edge262144:md5".
+    """
+
+    def __init__(self, db_path=CHECKSUM_CACHE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS checksums (
+                path TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (path, kind)
+            )
+        """)
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self._pending = []
+
+    def get(self, path, kind, st):
+        """Return the cached digest if the entry matches the given os.stat result, else None."""
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, inode, digest FROM checksums WHERE path = ? AND kind = ?",
+            (os.path.abspath(path), kind)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        if row[:3] != (st.st_size, st.st_mtime_ns, st.st_ino):
+            self.invalidate(os.path.abspath(path), kind)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[3]
+
+    def put(self, path, kind, st, digest):
+        """Queue a digest for storage; written on the next commit()."""
+        self._pending.append((os.path.abspath(path), kind, st.st_size, st.st_mtime_ns, st.st_ino, digest))
+
+    def commit(self):
+        if self._pending:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO checksums (path, kind, size, mtime_ns, inode, digest) VALUES (?, ?, ?, ?, ?, ?)",
+                self._pending
+            )
+            self._pending = []
+        self.conn.commit()
+
+    def invalidate(self, path=None, kind=None):
+        """Drop entries for one path (optionally one kind), or the whole cache when path is None."""
+        if path is None:
+            cur = self.conn.execute("DELETE FROM checksums")
+        elif kind is None:
+            cur = self.conn.execute("DELETE FROM checksums WHERE path = ?", (path,))
+        else:
+            cur = self.conn.execute("DELETE FROM checksums WHERE path = ? AND kind = ?", (path, kind))
+        self.invalidated += cur.rowcount
+
+    def prune(self, root=None, seen=()):
+        """
+        Remove entries whose file no longer exists or has changed since it was hashed.
+        When root is given, only entries below that directory are checked.
+        Absolute paths in `seen` (files a scan just walked) are left alone without
+        a stat; get() already drops their entries if they changed.
+        Returns the number of removed entries.
+        """
+        if root is None:
+            rows = self.conn.execute("SELECT path, kind, size, mtime_ns, inode FROM checksums")
+        else:
+            prefix = os.path.join(os.path.abspath(root), "")
+            rows = self.conn.execute(
+                "SELECT path, kind, size, mtime_ns, inode FROM checksums WHERE substr(path, 1, ?) = ?",
+                (len(prefix), prefix)
+            )
+        stale = []
+        for path, kind, size, mtime_ns, inode in rows.fetchall():
+            if path in seen:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                stale.append((path, kind))
+                continue
+            if (st.st_size, st.st_mtime_ns, st.st_ino) != (size, mtime_ns, inode):
+                stale.append((path, kind))
+        self.conn.executemany("DELETE FROM checksums WHERE path = ? AND kind = ?", stale)
+        self.conn.commit()
+        return len(stale)
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,5 +1,7 @@
 # core/config.py
 
+import os
+
 # iPhone-native image formats (converted using heif-convert + exiftool)
 IPHONE_IMAGE_EXTS = {".heic", ".heif"}
 
@@ -24,15 +26,198 @@ ALL_VIDEO_EXTS = IPHONE_VIDEO_EXTS | NON_IPHONE_VIDEO_EXTS
 OUTPUT_IMAGE_EXT = ".jpg"
 OUTPUT_VIDEO_EXT = ".mp4"
 
+# JPEG quality for HEIC conversions (both engines)
+JPEG_QUALITY = 92
+
+# HEIC → JPEG engine: "auto" uses pillow-heif in a process pool when installed
+# (pip install pillow-heif), "pillow" requires it, "cli" always uses heif-convert
+HEIC_ENGINE = "auto"
+HEIC_ENGINE_WORKERS = os.cpu_count() or 1
+
+# Seconds one pillow-heif conversion may take; a worker killed mid-job (e.g. by the
+# OOM killer) never answers, so after this the pool is recreated and heif-convert is used
+HEIC_ENGINE_TIMEOUT = 300
+
 # Minimum FPS to classify as slow-motion (used with ffprobe)
 SLOWMO_FPS_THRESHOLD = 100
 
+# Concurrent slow-motion probes during the scan
+SLOWMO_PROBE_WORKERS = min(8, os.cpu_count() or 1)
+
+# Directory names (fnmatch patterns) skipped with their whole subtree while scanning
+WALK_EXCLUDE = {".thumbnails", "@eaDir", "#recycle", ".Trash-*", ".AppleDouble", ".Spotlight-V100"}
+
+# Threads listing directories in parallel during the scan (helps on NFS/SMB)
+WALK_WORKERS = 8
+
+# Bytes hashed from each end of a file during the partial-hash dedup stage
+DEDUP_EDGE_BYTES = 256 * 1024
+
+# Per-device I/O scheduling (core/io_scheduler.py) for scan hashing and pass-through copies.
+# Each source device (st_dev) gets its own concurrency limit, starting at 1 on spinning disks
+# and IO_INITIAL_CONCURRENCY elsewhere, re-tuned every IO_TUNE_WINDOW seconds from the measured
+# throughput (between 1 and IO_MAX_CONCURRENCY). On spinning disks, files of IO_SEQUENTIAL_BYTES
+# or more are read alone, one after the other. IO_MAX_THREADS bounds the shared hashing pool.
+IO_INITIAL_CONCURRENCY = 4
+IO_MAX_CONCURRENCY = 32
+IO_MAX_THREADS = 64
+IO_TUNE_WINDOW = 2.0
+IO_SEQUENTIAL_BYTES = 64 * 1024 * 1024
+
+# Content hash used for deduplication: "md5" (default, matches older JSON), "blake2b" or "xxh3" (needs xxhash)
+HASH_ALGORITHM = "md5"
+
+# Hash in a process pool instead of threads (also --hash-processes): helps CPU-bound
+# algorithms (md5, blake2b) on fast NVMe storage; workers are started with "spawn"
+HASH_PROCESSES = False
+
+# Read size used when hashing files, and the size above which files are hashed through mmap
+HASH_READ_SIZE = 4 * 1024 * 1024
+HASH_MMAP_THRESHOLD = 256 * 1024 * 1024
+
+# Persistent checksum cache shared by all runs (SQLite)
+CHECKSUM_CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "copy-conv", "checksums.sqlite"
+)
+
+# Seconds to wait for a single command of the persistent exiftool session
+EXIFTOOL_TIMEOUT = 120
+
+# How MOV → MP4 conversion picks between remux and re-encode:
+# "auto"           remux (-c copy) when video and audio codecs fit in MP4, transcode only what doesn't
+# "force_h264"     like "auto", but any non-H.264 video (e.g. HEVC) is re-encoded to H.264 for compatibility
+# "always_reencode" re-encode every file with libx264/aac (previous behaviour)
+VIDEO_POLICY = "auto"
+
+# How metadata reaches converted files:
+# "inline"      carried by ffmpeg/heif-convert during the encode; exiftool only fills in
+#               capture date / GPS / orientation if a check finds them missing
+# "inline_only" same check, but missing tags are only logged
+# "exiftool"    always rewrite the output with exiftool -TagsFromFile (previous behaviour)
+METADATA_MODE = "inline"
+
+# Codecs that can be stream-copied into an MP4 container
+MP4_VIDEO_CODECS = {"h264", "hevc", "mpeg4", "av1"}
+MP4_AUDIO_CODECS = {"aac", "mp3", "alac", "ac3", "eac3"}
+
+# Segment-parallel re-encoding of long videos: a video that has to be re-encoded and is
+# larger than VIDEO_SEGMENT_MIN_BYTES or longer than VIDEO_SEGMENT_MIN_SECONDS is split at
+# keyframes (stream copy), the segments are encoded concurrently and joined without
+# re-encoding. One segment per idle core, at most VIDEO_SEGMENT_MAX, each at least
+# VIDEO_SEGMENT_MIN_LENGTH seconds long. SLOWMO_SEGMENTED does the same for slow-motion clips.
+VIDEO_SEGMENTED = True
+SLOWMO_SEGMENTED = True
+VIDEO_SEGMENT_MIN_BYTES = 1024 ** 3
+VIDEO_SEGMENT_MIN_SECONDS = 300
+VIDEO_SEGMENT_MIN_LENGTH = 30
+VIDEO_SEGMENT_MAX = 8
+
 # External tools required
 REQUIRED_TOOLS = {
     "images": ["heif-convert", "exiftool"],
-    "videos": ["ffmpeg", "exiftool"],
-    "slowmo": ["ffmpeg", "exiftool"]
+    "videos": ["ffmpeg", "ffprobe", "exiftool"],
+    "slowmo": ["ffmpeg", "ffprobe", "exiftool"]
 }
 
+# How pass-through (non-iPhone) files are copied:
+# "auto" tries reflink, then in-kernel copy_file_range/sendfile, then a regular copy;
+# "hardlink" links when source and destination share a filesystem (falls back to "auto");
+# "copy" always uses shutil.copy2
+COPY_STRATEGY = "auto"
+
+# Concurrent conversions per media type (keys match REQUIRED_TOOLS).
+# ffmpeg/x264 already uses several threads per encode, so videos get fewer jobs.
+CONVERSION_JOBS = {
+    "images": os.cpu_count() or 1,
+    "videos": max(1, (os.cpu_count() or 1) // 4),
+    "slowmo": max(1, (os.cpu_count() or 1) // 4)
+}
+
+# Files waiting per converter in streaming mode before the scan is paused (backpressure)
+STREAM_QUEUE_SIZE = 64
+
+# Scan results are written to output_dir/data/<timestamp>/manifest_<timestamp>.sqlite;
+# rows are committed in batches of this size while the scan appends to it
+MANIFEST_COMMIT_ROWS = 10000
+
+# Conversions queued per parallel job while reading the manifest
+CONVERSION_READ_AHEAD = 4
+
+# Completion journal kept in the output directory for resumable runs,
+# and how often (seconds) new entries are fsync'ed to disk
+JOURNAL_FILENAME = ".copy-conv-journal.jsonl"
+JOURNAL_SYNC_INTERVAL = 1.0
+
+# Suffix added to output names while a conversion is in progress
+PARTIAL_SUFFIX = ".partial"
+
+# Where outputs go inside images/, movies/ and slowmo/ (core/layout.py):
+# "flat"   everything in one folder (default, as in earlier versions)
+# "date"   YYYY/MM/ by capture date (read with exiftool in batches of OUTPUT_DATE_BATCH),
+#          OUTPUT_UNDATED_FOLDER/ for files without one
+# "digest" a folder per first two hex digits of the digest (256 folders)
+OUTPUT_LAYOUT = "flat"
+OUTPUT_DATE_BATCH = 200
+OUTPUT_UNDATED_FOLDER = "undated"
+
+# Extra renditions made from the decode the conversion already does (core/renditions.py),
+# written to a RENDITIONS_FOLDER tree mirroring images/, movies/ and slowmo/ and listed in the manifest:
+# one JPEG per THUMBNAIL_SIZES entry (longest side, pixels) for photos; a poster JPEG taken
+# VIDEO_POSTER_AT seconds in and a VIDEO_PREVIEW_HEIGHT-pixel MP4 preview for videos.
+RENDITIONS_ENABLED = False
+RENDITIONS_FOLDER = "thumbs"
+THUMBNAIL_SIZES = [1024, 256]
+THUMBNAIL_QUALITY = 85
+VIDEO_POSTER_AT = 1.0
+VIDEO_POSTER_SIZE = 1024
+VIDEO_PREVIEW_HEIGHT = 360
+
+# Watch mode (cli/main_watch.py): "auto" uses inotify and falls back to polling
+# the tree every WATCH_POLL_INTERVAL seconds. A file is ingested once its size and
+# mtime have not changed for WATCH_SETTLE_SECONDS; settled files are processed in
+# batches of up to WATCH_BATCH_SIZE, or after WATCH_BATCH_WINDOW seconds.
+# Every digest ever ingested is kept in WATCH_INDEX_FILENAME in the destination.
+WATCH_BACKEND = "auto"
+WATCH_POLL_INTERVAL = 10.0
+WATCH_SETTLE_SECONDS = 5.0
+WATCH_BATCH_SIZE = 500
+WATCH_BATCH_WINDOW = 2.0
+WATCH_INDEX_FILENAME = ".copy-conv-index.sqlite"
+
+# Distributed mode (cli/main_distributed.py): the coordinator serves the manifest as a job
+# queue over HTTP, workers lease jobs for DIST_LEASE_SECONDS and renew them while converting.
+# A job whose lease expires (or whose conversion fails) is handed out again, at most
+# DIST_MAX_ATTEMPTS times in total. Idle workers ask again every DIST_POLL_INTERVAL seconds.
+# Failed requests to the coordinator are retried with exponential backoff for up to
+# DIST_RETRY_SECONDS before the worker gives up.
+DIST_HOST = "127.0.0.1"
+DIST_PORT = 8765
+DIST_LEASE_SECONDS = 120
+DIST_MAX_ATTEMPTS = 3
+DIST_POLL_INTERVAL = 2.0
+DIST_RETRY_SECONDS = 60
+
+# Progress updates published per stage and per second (terminal line, GUI bar)
+PROGRESS_UPDATES_PER_SECOND = 10
+
+# Per-file/per-stage metrics written as JSON Lines next to the logs (core/metrics.py).
+# Set METRICS_PROMETHEUS_TEXTFILE to a path (e.g. in the node_exporter textfile
+# directory) to also export the run summary for Prometheus.
+METRICS_ENABLED = True
+METRICS_PROMETHEUS_TEXTFILE = None
+
+# Per-file durations kept per stage for the percentiles (a uniform sample beyond this)
+METRICS_RESERVOIR_SIZE = 10000
+
+# Optional near-duplicate stage for photos (core/perceptual.py, needs `pip install numpy pillow`,
+# plus pillow-heif for HEIC). Images whose perceptual hashes differ by at most
+# PERCEPTUAL_THRESHOLD of 64 bits are clustered and only the best one is converted.
+# PERCEPTUAL_HASH is "phash" (DCT, more robust to resizing/recompression) or "dhash" (faster).
+PERCEPTUAL_DEDUP = False
+PERCEPTUAL_HASH = "phash"
+PERCEPTUAL_THRESHOLD = 6
+PERCEPTUAL_BATCH_SIZE = 256
+PERCEPTUAL_WORKERS = 4
+
 # Logging format (for consistency across modules)
 LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
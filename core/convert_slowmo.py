@@ -1,22 +1,27 @@
 # core/convert_slowmo.py
 
-from core.utils import copy_file, convert_mov_to_mp4, process_template
-from core.config import IPHONE_VIDEO_EXTS, OUTPUT_VIDEO_EXT
+from core.utils import copy_with_renditions, convert_mov_to_mp4, process_template
+from core.config import IPHONE_VIDEO_EXTS, OUTPUT_VIDEO_EXT, SLOWMO_SEGMENTED
 
-def process_slowmo(json_path, output_dir):
-    def convert_func(src, dst_wo_ext):
-        ext = src.lower().split('.')[-1]
-        if f".{ext}" in IPHONE_VIDEO_EXTS:
-            convert_mov_to_mp4(src, dst_wo_ext)
-        else:
-            copy_file(src, dst_wo_ext + OUTPUT_VIDEO_EXT)
+def convert_slowmo(src, dst_wo_ext):
+    ext = src.lower().split('.')[-1]
+    if f".{ext}" in IPHONE_VIDEO_EXTS:
+        return convert_mov_to_mp4(src, dst_wo_ext, segmented=SLOWMO_SEGMENTED)
+    else:
+        return copy_with_renditions(src, dst_wo_ext + OUTPUT_VIDEO_EXT, video=True)
 
-    process_template(
-        json_path,
-        output_dir,
-        subfolder="slowmo",
-        required_tools_key="slowmo",
-        process_func=convert_func,
-        filename_transform_func=lambda name: f"slowmo_{name}",
-        emoji="🐢"
-    )
+def slowmo_filename(name):
+    return f"slowmo_{name}"
+
+# process_template settings for slow-motion videos, shared with the streaming pipeline
+SLOWMO_TARGET = dict(
+    category="slowmo",
+    subfolder="slowmo",
+    required_tools_key="slowmo",
+    process_func=convert_slowmo,
+    filename_transform_func=slowmo_filename,
+    emoji="🐢"
+)
+
+def process_slowmo(manifest_path, output_dir, resume=False):
+    process_template(manifest_path, output_dir, resume=resume, **SLOWMO_TARGET)
@@ -1,21 +1,23 @@
 # core/convert_videos.py
 
-from core.utils import copy_file, convert_mov_to_mp4, process_template
+from core.utils import copy_with_renditions, convert_mov_to_mp4, process_template
 from core.config import IPHONE_VIDEO_EXTS, OUTPUT_VIDEO_EXT
 
-def process_videos(json_path, output_dir):
-    def convert_func(src, dst_wo_ext):
-        ext = src.lower().split('.')[-1]
-        if f".{ext}" in IPHONE_VIDEO_EXTS:
-            convert_mov_to_mp4(src, dst_wo_ext)
-        else:
-            copy_file(src, dst_wo_ext + OUTPUT_VIDEO_EXT)
+def convert_video(src, dst_wo_ext):
+    ext = src.lower().split('.')[-1]
+    if f".{ext}" in IPHONE_VIDEO_EXTS:
+        return convert_mov_to_mp4(src, dst_wo_ext)
+    else:
+        return copy_with_renditions(src, dst_wo_ext + OUTPUT_VIDEO_EXT, video=True)
 
-    process_template(
-        json_path,
-        output_dir,
-        subfolder="movies",
-        required_tools_key="videos",
-        process_func=convert_func,
-        emoji="🎞️"
-    )
+# process_template settings for videos, shared with the streaming pipeline
+VIDEOS_TARGET = dict(
+    category="videos",
+    subfolder="movies",
+    required_tools_key="videos",
+    process_func=convert_video,
+    emoji="🎞️"
+)
+
+def process_videos(manifest_path, output_dir, resume=False):
+    process_template(manifest_path, output_dir, resume=resume, **VIDEOS_TARGET)
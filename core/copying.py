@@ -0,0 +1,126 @@
+# core/copying.py
+
+import os, errno, fcntl, shutil, logging, threading
+from core.config import COPY_STRATEGY
+
+# ioctl number of FICLONE (linux/fs.h), supported by btrfs, XFS and others
+FICLONE = 0x40049409
+
+# errnos meaning "this strategy is not available here", so the next one is tried
+_UNSUPPORTED = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL, errno.ENOTTY, errno.ENOSYS, errno.EPERM, errno.EBADF}
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+class _Unsupported(Exception):
+    pass
+
+def _reflink(src_path, dst_path, size):
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError as e:
+            if e.errno in _UNSUPPORTED:
+                raise _Unsupported()
+            raise
+    return 0
+
+def _kernel_copy(copy_chunk, src_path, dst_path, size):
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        copied = 0
+        while copied < size:
+            try:
+                n = copy_chunk(src.fileno(), dst.fileno(), copied, size - copied)
+            except OSError as e:
+                if e.errno in _UNSUPPORTED and copied == 0:
+                    raise _Unsupported()
+                raise
+            if n == 0:
+                break
+            copied += n
+    return copied
+
+def _copy_file_range(src_path, dst_path, size):
+    if not hasattr(os, "copy_file_range"):
+        raise _Unsupported()
+    return _kernel_copy(
+        lambda src, dst, offset, count: os.copy_file_range(src, dst, min(count, 1 << 30), offset, offset),
+        src_path, dst_path, size
+    )
+
+def _sendfile(src_path, dst_path, size):
+    return _kernel_copy(
+        lambda src, dst, offset, count: os.sendfile(dst, src, offset, min(count, 1 << 30)),
+        src_path, dst_path, size
+    )
+
+def _hardlink(src_path, dst_path, size):
+    if os.stat(src_path).st_dev != os.stat(os.path.dirname(os.path.abspath(dst_path))).st_dev:
+        raise _Unsupported()
+    if os.path.lexists(dst_path):
+        os.remove(dst_path)
+    try:
+        os.link(src_path, dst_path)
+    except OSError as e:
+        if e.errno in _UNSUPPORTED or e.errno == errno.EMLINK:
+            raise _Unsupported()
+        raise
+    return 0
+
+def _plain_copy(src_path, dst_path, size):
+    shutil.copyfile(src_path, dst_path)
+    return size
+
+STRATEGIES = {
+    "reflink": _reflink,
+    "copy_file_range": _copy_file_range,
+    "sendfile": _sendfile,
+    "hardlink": _hardlink,
+    "copy": _plain_copy
+}
+
+STRATEGY_ORDER = {
+    "auto": ["reflink", "copy_file_range", "sendfile", "copy"],
+    "hardlink": ["hardlink", "reflink", "copy_file_range", "sendfile", "copy"],
+    "copy": ["copy"]
+}
+
+def smart_copy(src_path, dst_path, strategy=COPY_STRATEGY):
+    """
+    Copy src_path to dst_path with the cheapest strategy that works here
+    and preserve timestamps/permissions like shutil.copy2.
+    Returns (strategy_used, bytes_moved); reflinks and hardlinks move no data.
+    """
+    size = os.path.getsize(src_path)
+    order = STRATEGY_ORDER.get(strategy, [strategy])
+    for name in order:
+        try:
+            moved = STRATEGIES[name](src_path, dst_path, size)
+        except _Unsupported:
+            continue
+        if name != "hardlink":
+            shutil.copystat(src_path, dst_path)
+        _record(name, moved)
+        logging.info(f"Copied ({name}, {moved} bytes moved): {src_path} → {dst_path}")
+        return name, moved
+    raise OSError(f"No copy strategy worked for {src_path}")
+
+def _record(strategy, moved):
+    with _stats_lock:
+        entry = _stats.setdefault(strategy, {"files": 0, "bytes": 0})
+        entry["files"] += 1
+        entry["bytes"] += moved
+
+def reset_copy_stats():
+    with _stats_lock:
+        _stats.clear()
+
+def copy_stats_summary():
+    """One-line summary of pass-through copies since the last reset, or None if there were none."""
+    with _stats_lock:
+        if not _stats:
+            return None
+        files = sum(s["files"] for s in _stats.values())
+        moved = sum(s["bytes"] for s in _stats.values())
+        parts = ", ".join(f"{name} {s['files']}" for name, s in sorted(_stats.items()))
+    return f"📦 {files} file(s) copied as-is ({parts}) — {moved / 1e6:.1f} MB actually moved"
@@ -0,0 +1,67 @@
+# core/digest_index.py
+
+import os, time, sqlite3, threading
+from core.manifest import split_digest
+
+class DigestIndex:
+    """
+    Persistent record of every digest ever ingested into an output directory,
+    used by watch mode to send only new content to the converters.
+    A digest is claimed ("pending") when it is queued and marked "done" or
+    dropped once its conversion finishes. Pending claims left by a crash are
+    cleared on open, so those files are picked up again.
+    Safe to use from the converter worker threads.
+    """
+
+    def __init__(self, db_path):
+        self.path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS ingested (
+                algorithm TEXT NOT NULL,
+                digest BLOB NOT NULL,
+                category TEXT NOT NULL,
+                status TEXT NOT NULL,
+                src TEXT NOT NULL,
+                output TEXT,
+                ingested_at REAL NOT NULL,
+                PRIMARY KEY (algorithm, digest)
+            )
+        """)
+        self.conn.execute("DELETE FROM ingested WHERE status = 'pending'")
+        self.conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM ingested").fetchone()[0]
+
+    def claim(self, digest, category, src):
+        """Reserve digest for src. Returns False if it was already ingested or is queued."""
+        algorithm, raw = split_digest(digest)
+        with self._lock:
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO ingested (algorithm, digest, category, status, src, ingested_at) VALUES (?, ?, ?, 'pending', ?, ?)",
+                (algorithm, raw, category, os.path.abspath(src), time.time())
+            )
+            self.conn.commit()
+            return cur.rowcount == 1
+
+    def finish(self, digest, output=None, error=None):
+        """Mark a claimed digest as done, or release it when the conversion failed."""
+        algorithm, raw = split_digest(digest)
+        with self._lock:
+            if error is None:
+                self.conn.execute(
+                    "UPDATE ingested SET status = 'done', output = ?, ingested_at = ? WHERE algorithm = ? AND digest = ?",
+                    (output, time.time(), algorithm, raw)
+                )
+            else:
+                self.conn.execute("DELETE FROM ingested WHERE algorithm = ? AND digest = ?", (algorithm, raw))
+            self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
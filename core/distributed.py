@@ -0,0 +1,511 @@
+# core/distributed.py
+
+import os, re, json, time, socket, sqlite3, logging, threading, http.client, urllib.request, urllib.error
+from datetime import datetime
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from core.config import (
+    DIST_HOST, DIST_PORT, DIST_LEASE_SECONDS, DIST_MAX_ATTEMPTS, DIST_POLL_INTERVAL, DIST_RETRY_SECONDS,
+    CONVERSION_JOBS, PARTIAL_SUFFIX, OUTPUT_LAYOUT
+)
+from core.manifest import Manifest, stored_digest, FIRST_PATHS
+from core.journal import CompletionJournal
+from core.layout import OutputLayout
+from core.pipeline import TARGETS
+from core.utils import (
+    check_required_tools, required_tools, ensure_subfolder, setup_logging, run_job, describe_error,
+    reset_cancellation, cancel_running_tools
+)
+from core.exiftool import close_all_sessions
+from core.progress import ConversionCancelled
+from core import heic_engine, metrics, progress
+
+class JobQueue:
+    """
+    Conversion jobs leased to workers, kept in a `jobs` table of the scan
+    manifest so a restarted coordinator carries on where it stopped.
+    One job per digest that process_template would convert. A claim leases
+    jobs for `lease` seconds; a job is handed out again once its lease
+    expires or its conversion fails, until it has been tried max_attempts times.
+    Used from the coordinator's request loop only (single thread).
+    """
+
+    def __init__(self, manifest_path, output_dir, categories, lease=DIST_LEASE_SECONDS,
+                 max_attempts=DIST_MAX_ATTEMPTS, journal=None, resume=False):
+        self.manifest = Manifest(manifest_path)
+        self.conn = self.manifest.conn
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.journal = journal
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                group_id INTEGER PRIMARY KEY,
+                src TEXT NOT NULL,
+                status TEXT NOT NULL,
+                dst TEXT,
+                worker TEXT,
+                expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            )
+        """)
+        # Jobs are handed out by first path, so output names collide the same way every run
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_src ON jobs (src)")
+        self.layouts = {}
+        for cat in categories:
+            target = TARGETS[cat]
+            self.layouts[cat] = OutputLayout(
+                ensure_subfolder(output_dir, target["subfolder"]),
+                filename_transform_func=target.get("filename_transform_func"), journal=journal
+            )
+            # Same selection as Manifest.groups(): near-duplicates other than the best are left out
+            self.conn.execute(f"""
+                INSERT OR IGNORE INTO jobs (group_id, src, status)
+                SELECT g.id, f.first, 'pending' FROM groups g JOIN ({FIRST_PATHS}) f ON f.group_id = g.id
+                LEFT JOIN near_duplicates n ON n.group_id = g.id
+                WHERE g.category = ? AND COALESCE(n.rank, 0) = 0
+            """, (cat,))
+            if resume and journal is not None:
+                done = [stored_digest(digest) for digest, paths in self.manifest.groups(cat) if journal.is_done(digest, paths)]
+                self.conn.executemany(
+                    "UPDATE jobs SET status = 'done' WHERE group_id = (SELECT id FROM groups WHERE category = ? AND digest = ?)",
+                    [(cat, raw) for raw in done]
+                )
+        self.manifest.commit()
+        self.categories = list(categories)
+
+    def counts(self):
+        """{status: number of jobs}, with expired leases counted as pending."""
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        for status, expired, n in self.conn.execute(
+            "SELECT status, status = 'leased' AND expires < ?, COUNT(*) FROM jobs GROUP BY 1, 2", (time.time(),)
+        ):
+            counts["pending" if expired else status] += n
+        return counts
+
+    def finished(self):
+        return self.conn.execute("SELECT 1 FROM jobs WHERE status IN ('pending', 'leased') LIMIT 1").fetchone() is None
+
+    def claim(self, worker, limit, categories=None):
+        """Lease up to `limit` jobs to worker. Returns job dicts (id, category, digest, src, dst, thumbs, attempt)."""
+        categories = [c for c in (categories or self.categories) if c in self.categories]
+        if not categories or limit <= 0:
+            return []
+        now = time.time()
+        marks = ",".join("?" * len(categories))
+        self.expire(now)
+        rows = self.conn.execute(f"""
+            SELECT j.group_id, g.category, g.digest, j.dst, j.src
+            FROM jobs j JOIN groups g ON g.id = j.group_id
+            WHERE g.category IN ({marks}) AND (j.status = 'pending' OR (j.status = 'leased' AND j.expires < ?))
+            ORDER BY j.src, j.group_id LIMIT ?
+        """, (*categories, now, limit)).fetchall()
+        by_category = {}
+        for _, category, _, dst, src in rows:
+            if dst is None:
+                by_category.setdefault(category, []).append(src)
+        for category, paths in by_category.items():
+            self.layouts[category].prefetch(paths)
+        jobs = []
+        for group_id, category, raw, dst, src in rows:
+            digest = self._digest(raw)
+            try:
+                if dst is None:
+                    dst = self.layouts[category].assign(src, digest)
+                thumbs = self.layouts[category].thumbs_path(dst)
+            except OSError as e:
+                # e.g. no free output name: retrying cannot help
+                logging.error(f"Cannot assign an output to {src}: {e}")
+                self.conn.execute("UPDATE jobs SET status = 'failed', error = ? WHERE group_id = ?", (str(e), group_id))
+                continue
+            self.conn.execute(
+                "UPDATE jobs SET status = 'leased', dst = ?, worker = ?, expires = ?, attempts = attempts + 1 WHERE group_id = ?",
+                (dst, worker, now + self.lease, group_id)
+            )
+            attempt = self.conn.execute("SELECT attempts FROM jobs WHERE group_id = ?", (group_id,)).fetchone()[0]
+            jobs.append({
+                "id": group_id, "category": category, "digest": digest, "src": src, "dst": dst,
+                "thumbs": thumbs, "attempt": attempt
+            })
+        self.manifest.commit()
+        return jobs
+
+    def expire(self, now=None):
+        """Give up on leases that ran out after max_attempts tries instead of handing them out again."""
+        cur = self.conn.execute("""
+            UPDATE jobs SET status = 'failed', error = COALESCE(error, 'lease expired')
+            WHERE status = 'leased' AND expires < ? AND attempts >= ?
+        """, (now or time.time(), self.max_attempts))
+        if cur.rowcount:
+            self.manifest.commit()
+        return cur.rowcount
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def renew(self, worker, ids):
+        """Extend the leases worker still holds. Returns the ids it no longer holds."""
+        lost = []
+        for job_id in ids:
+            cur = self.conn.execute(
+                "UPDATE jobs SET expires = ? WHERE group_id = ? AND worker = ? AND status = 'leased'",
+                (time.time() + self.lease, job_id, worker)
+            )
+            if cur.rowcount == 0:
+                lost.append(job_id)
+        self.manifest.commit()
+        return lost
+
+    def release(self, worker, ids):
+        """Give leases back without counting the attempt (worker shutting down)."""
+        for job_id in ids:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'pending', worker = NULL, attempts = attempts - 1 WHERE group_id = ? AND worker = ? AND status = 'leased'",
+                (job_id, worker)
+            )
+        self.manifest.commit()
+
+    def complete(self, job_id, output, renditions=None):
+        """Mark a job done; a late report for a job re-leased meanwhile is accepted too (same dst)."""
+        row = self.conn.execute("""
+            SELECT g.category, g.digest, (SELECT path FROM paths WHERE group_id = g.id ORDER BY rowid LIMIT 1)
+            FROM jobs j JOIN groups g ON g.id = j.group_id WHERE j.group_id = ? AND j.status != 'done'
+        """, (job_id,)).fetchone()
+        if row is None:
+            return None
+        category, raw, src = row
+        digest = self._digest(raw)
+        self.conn.execute("UPDATE jobs SET status = 'done', error = NULL WHERE group_id = ?", (job_id,))
+        self.manifest.set_output(category, digest, output, renditions)
+        self.manifest.commit()
+        if self.journal is not None:
+            try:
+                self.journal.record(digest, src, output)
+            except OSError as e:
+                logging.warning(f"Cannot journal {output} (output not visible from the coordinator?): {e}")
+        return category, src
+
+    def fail(self, job_id, error):
+        """Record a failed conversion; the job is retried until it has used up max_attempts."""
+        self.conn.execute("""
+            UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, worker = NULL, error = ?
+            WHERE group_id = ? AND status = 'leased'
+        """, (self.max_attempts, error, job_id))
+        self.manifest.commit()
+        row = self.conn.execute("SELECT status FROM jobs WHERE group_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def failures(self):
+        """[(first path, error)] of the jobs given up on."""
+        return self.conn.execute("""
+            SELECT j.src, j.error FROM jobs j WHERE j.status = 'failed' ORDER BY j.src
+        """).fetchall()
+
+    def _digest(self, raw):
+        return self.manifest.format_stored(raw)
+
+    def close(self):
+        self.manifest.close()
+
+class _Handler(BaseHTTPRequestHandler):
+    """JSON over HTTP: GET /status, POST /claim, /renew, /release, /complete, /fail."""
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.client_address[0]} {format % args}")
+
+    def _reply(self, code, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        token = self.server.coordinator.token
+        if token and self.headers.get("X-Copy-Conv-Token") != token:
+            self._reply(403, {"error": "bad token"})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path != "/status":
+            return self._reply(404, {"error": "unknown endpoint"})
+        queue = self.server.coordinator.queue
+        self._handle(lambda: {"counts": queue.counts(), "done": queue.finished()})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except (ValueError, json.JSONDecodeError):
+            return self._reply(400, {"error": "invalid JSON"})
+        handler = self.server.coordinator.endpoints.get(self.path)
+        if handler is None:
+            return self._reply(404, {"error": "unknown endpoint"})
+        self._handle(lambda: handler(request))
+
+    def _handle(self, handler):
+        try:
+            self._reply(200, handler())
+        except (KeyError, TypeError) as e:
+            self._reply(400, {"error": f"bad request: {e}"})
+        except (OSError, sqlite3.Error) as e:
+            # Keep serving: drop the half-done request and tell the worker to retry
+            logging.exception(f"Request {self.path} failed")
+            self.server.coordinator.queue.rollback()
+            self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+
+class Coordinator:
+    """
+    Serves a JobQueue over HTTP. The server handles one request at a time, so
+    the queue's SQLite connection stays on the thread that runs serve().
+    Results are logged and metered on the coordinator with the durations the
+    workers report.
+    """
+
+    def __init__(self, queue, host=DIST_HOST, port=DIST_PORT, token=None):
+        self.queue = queue
+        self.token = token
+        self.server = HTTPServer((host, port), _Handler)
+        self.server.coordinator = self
+        self.server.timeout = 1.0
+        self.failed = 0
+        self.completed = 0
+        self.endpoints = {
+            "/claim": self._claim,
+            "/renew": lambda r: {"lost": self.queue.renew(r["worker"], r["ids"])},
+            "/release": lambda r: self.queue.release(r["worker"], r["ids"]) or {},
+            "/complete": self._complete,
+            "/fail": self._fail
+        }
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _claim(self, request):
+        jobs = self.queue.claim(request["worker"], int(request.get("limit", 1)), request.get("categories"))
+        return {"jobs": jobs, "lease": self.queue.lease, "done": not jobs and self.queue.finished()}
+
+    def _complete(self, request):
+        result = self.queue.complete(request["id"], request["output"], request.get("renditions"))
+        if result is not None:
+            category, src = result
+            self.completed += 1
+            logging.info(f"Processed by {request['worker']}: {src} → {request['output']}")
+            metrics.event(f"convert_{TARGETS[category]['subfolder']}", request.get("duration", 0.0), src,
+                          request.get("bytes", 0), worker=request["worker"], output_bytes=request.get("output_bytes"))
+        return {}
+
+    def _fail(self, request):
+        status = self.queue.fail(request["id"], request["error"])
+        logging.error(f"Job {request['id']} failed on {request['worker']}: {request['error']}"
+                      + (" (giving up)" if status == "failed" else " (will retry)"))
+        if status == "failed":
+            self.failed += 1
+        metrics.event("distributed_failure", request.get("duration", 0.0), request.get("src"),
+                      worker=request["worker"], error=request["error"])
+        return {"status": status}
+
+    def serve(self, linger=2 * DIST_POLL_INTERVAL):
+        """Answer workers until every job is done or failed, then `linger` seconds more so idle workers hear it."""
+        start_time = datetime.now()
+        total = sum(self.queue.counts().values())
+        while not self.queue.finished():
+            self.server.handle_request()
+            # Also when no worker is left to claim: leases that ran out for good count as failed
+            self.queue.expire()
+            counts = self.queue.counts()
+            progress.report("distributed", counts["done"] + counts["failed"], total, start_time, "🛰️ Jobs:")
+        deadline = time.monotonic() + linger
+        while time.monotonic() < deadline:
+            self.server.handle_request()
+
+    def close(self):
+        self.server.server_close()
+
+def check_coordinator_tools(layout=OUTPUT_LAYOUT):
+    """Exit unless the tools claims need are installed: the date layout reads capture dates with exiftool."""
+    if layout == "date":
+        check_required_tools(["exiftool"])
+
+def coordinate(manifest_path, output_dir, categories, host=DIST_HOST, port=DIST_PORT, token=None, resume=False):
+    """Run a coordinator for the manifest until all its jobs are finished. Returns the number of failed jobs."""
+    check_coordinator_tools()
+    log_path = setup_logging(output_dir, "log_distributed")
+    journal = CompletionJournal(output_dir)
+    queue = JobQueue(manifest_path, output_dir, categories, journal=journal, resume=resume)
+    coordinator = Coordinator(queue, host, port, token)
+    counts = queue.counts()
+    print(f"🛰️ Serving {sum(counts.values())} jobs ({counts['done']} already done) on {coordinator.address}. "
+          f"Start workers with: python3 cli/main_distributed.py worker {coordinator.address}")
+    try:
+        coordinator.serve()
+    except KeyboardInterrupt:
+        print("\n🛑 Coordinator stopped; leases in flight will be handed out again on restart.")
+        logging.warning("Coordinator stopped")
+        raise
+    finally:
+        coordinator.close()
+        failures = queue.failures()
+        queue.close()
+        journal.close()
+    print(f"\n✅ {coordinator.completed} job(s) completed, {len(failures)} failed. Log saved to {log_path}")
+    for path, error in failures[:10]:
+        print(f"   ❌ {path}: {error}")
+    logging.shutdown()
+    return len(failures)
+
+class WorkerClient:
+    """
+    Minimal JSON client for the coordinator endpoints. Dropped connections and
+    server errors are retried with exponential backoff for up to retry_seconds;
+    every endpoint tolerates a repeated request.
+    """
+
+    def __init__(self, url, token=None, timeout=30, retry_seconds=DIST_RETRY_SECONDS):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+
+    def call(self, endpoint, payload=None):
+        deadline = time.monotonic() + self.retry_seconds
+        delay = 0.5
+        while True:
+            try:
+                return self._call(endpoint, payload)
+            except urllib.error.HTTPError as e:
+                if e.code < 500 or time.monotonic() + delay > deadline:
+                    raise
+                error = e
+            except (OSError, http.client.HTTPException) as e:
+                if time.monotonic() + delay > deadline:
+                    raise
+                error = e
+            logging.warning(f"{endpoint} failed ({error}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 10.0)
+
+    def _call(self, endpoint, payload):
+        data = None if payload is None else json.dumps(payload).encode("utf-8")
+        request = urllib.request.Request(self.url + endpoint, data=data, headers={"Content-Type": "application/json"})
+        if self.token:
+            request.add_header("X-Copy-Conv-Token", self.token)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+def run_worker(url, categories=None, jobs=None, token=None, worker_id=None, poll_interval=DIST_POLL_INTERVAL):
+    """
+    Claim jobs from a coordinator and convert them with the usual convert_*
+    functions until the coordinator reports that everything is finished.
+    Leases are renewed in the background while conversions run; on Ctrl-C
+    running tools are killed and unfinished leases are released.
+    Source and destination paths must be the same on every host (shared mounts).
+    Temporary files carry the worker id and attempt number, so a job re-leased
+    while its first worker is still converting never shares a .partial file.
+    """
+    categories = categories or list(TARGETS)
+    for cat in categories:
+        check_required_tools(required_tools(TARGETS[cat]["required_tools_key"]))
+    jobs = jobs or max(CONVERSION_JOBS[TARGETS[cat]["required_tools_key"]] for cat in categories)
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    worker_tag = re.sub(r"[^A-Za-z0-9_-]", "_", worker_id)
+    client = WorkerClient(url, token)
+    running = {}
+    lock = threading.Lock()
+    stop = threading.Event()
+    lease = DIST_LEASE_SECONDS
+
+    def convert(job):
+        target = TARGETS[job["category"]]
+        start = time.perf_counter()
+        try:
+            os.makedirs(os.path.dirname(job["dst"]), exist_ok=True)
+            if job.get("thumbs"):
+                os.makedirs(os.path.dirname(job["thumbs"]), exist_ok=True)
+        except OSError as e:
+            # A local problem with this job (e.g. output mount missing): fail it back, keep the worker running
+            logging.error(f"Cannot create the output folder for {job['src']}: {e}")
+            return None, e, {}, time.perf_counter() - start
+        output, error, made = run_job(
+            target["process_func"], job["src"], job["dst"], thumbs_wo_ext=job.get("thumbs"),
+            partial_suffix=f"{PARTIAL_SUFFIX}.{worker_tag}.{job.get('attempt', 0)}"
+        )
+        return output, error, made, time.perf_counter() - start
+
+    def keep_leases():
+        while not stop.wait(max(1.0, lease / 3)):
+            with lock:
+                ids = list(running)
+            if not ids:
+                continue
+            try:
+                lost = client.call("/renew", {"worker": worker_id, "ids": ids})["lost"]
+            except (OSError, ValueError, http.client.HTTPException) as e:
+                logging.warning(f"Lease renewal failed: {e}")
+                continue
+            if lost:
+                logging.warning(f"Leases lost for jobs {lost}; their results will still be reported")
+
+    reset_cancellation()
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    renewer = threading.Thread(target=keep_leases, daemon=True)
+    renewer.start()
+    print(f"🛠️ Worker {worker_id} → {url} ({jobs} parallel jobs, {', '.join(categories)})")
+    completed = failed = 0
+    try:
+        while True:
+            free = jobs - len(running)
+            if free > 0:
+                reply = client.call("/claim", {"worker": worker_id, "limit": free, "categories": categories})
+                lease = reply.get("lease", lease)
+                for job in reply["jobs"]:
+                    with lock:
+                        running[job["id"]] = (job, executor.submit(convert, job))
+                if reply["done"] and not running:
+                    break
+            if not running:
+                time.sleep(poll_interval)
+                continue
+            finished, _ = wait([future for _, future in running.values()], timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for job_id, (job, future) in list(running.items()):
+                if future not in finished:
+                    continue
+                output, error, made, duration = future.result()
+                report = {"worker": worker_id, "id": job_id, "duration": duration, "src": job["src"]}
+                if error is None:
+                    report.update(output=output, renditions=made, bytes=os.path.getsize(job["src"]), output_bytes=os.path.getsize(output))
+                    client.call("/complete", report)
+                    completed += 1
+                else:
+                    if isinstance(error, ConversionCancelled):
+                        raise error
+                    report["error"] = describe_error(error)
+                    client.call("/fail", report)
+                    failed += 1
+                with lock:
+                    del running[job_id]
+    except (KeyboardInterrupt, ConversionCancelled):
+        print("\n🛑 Worker stopping — releasing unfinished jobs...")
+        cancel_running_tools()
+        executor.shutdown(wait=True, cancel_futures=True)
+        try:
+            client.call("/release", {"worker": worker_id, "ids": list(running)})
+        except (OSError, ValueError, http.client.HTTPException):
+            pass
+    except (OSError, http.client.HTTPException) as e:
+        print(f"\n❌ Coordinator unreachable ({e}); unfinished leases will expire and be retried.")
+        cancel_running_tools()
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+        close_all_sessions()
+        heic_engine.shutdown_pool()
+    print(f"✅ Worker {worker_id}: {completed} job(s) converted, {failed} failed.")
+    return completed, failed
@@ -0,0 +1,186 @@
+# core/exiftool.py
+
+import os, json, time, select, subprocess, threading, atexit
+from datetime import datetime
+from core.config import EXIFTOOL_TIMEOUT
+
+class ExifToolError(RuntimeError):
+    pass
+
+class ExifToolCrashed(ExifToolError):
+    pass
+
+class ExifToolSession:
+    """
+    Long-lived `exiftool -stay_open True -@ -` process.
+    Commands are serialized with a lock, so one session can be shared by
+    threads, but get_exiftool() hands out one session per worker thread.
+    A crashed or timed-out process is restarted on the next command, unless
+    close_all_sessions() closed the session: it then refuses further commands,
+    and get_exiftool() starts a new (registered) session for the thread.
+    """
+
+    def __init__(self, executable="exiftool", timeout=EXIFTOOL_TIMEOUT):
+        self.executable = executable
+        self.timeout = timeout
+        self.proc = None
+        self.closed = False
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.proc = subprocess.Popen(
+            [self.executable, "-stay_open", "True", "-@", "-", "-common_args", "-charset", "filename=utf8"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+
+    def running(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def execute(self, *args, timeout=None):
+        """Run one exiftool command and return its stdout as text. Raises ExifToolError on failure."""
+        with self._lock:
+            try:
+                return self._execute(args, timeout or self.timeout)
+            except (BrokenPipeError, ExifToolCrashed):
+                # The process died (possibly during an earlier command); retry once on a fresh one
+                self.terminate()
+                return self._execute(args, timeout or self.timeout)
+
+    def _execute(self, args, timeout):
+        if not self.running():
+            if self.closed:
+                raise ExifToolError("exiftool session was closed")
+            self.start()
+        # close_all_sessions(force=True) may reset self.proc from another thread at any point
+        proc = self.proc
+        if proc is None:
+            raise ExifToolError("exiftool session was closed")
+        self._seq += 1
+        sentinel = f"{{ready{self._seq}}}".encode()
+        lines = [str(a) for a in args] + ["-echo4", sentinel.decode(), f"-execute{self._seq}"]
+        if any("\n" in line for line in lines):
+            raise ExifToolError("exiftool arguments cannot contain newlines")
+        proc.stdin.write(("\n".join(lines) + "\n").encode("utf-8"))
+        proc.stdin.flush()
+        stdout, stderr = self._read_until(proc, sentinel, timeout)
+        err = stderr.decode("utf-8", "replace").strip()
+        if any(line.startswith("Error") for line in err.splitlines()):
+            raise ExifToolError(err)
+        return stdout.decode("utf-8", "replace")
+
+    def _read_until(self, proc, sentinel, timeout):
+        deadline = time.monotonic() + timeout
+        buffers = {proc.stdout.fileno(): b"", proc.stderr.fileno(): b""}
+        pending = set(buffers)
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.terminate()
+                raise ExifToolError(f"exiftool timed out after {timeout}s")
+            ready, _, _ = select.select(list(pending), [], [], remaining)
+            for fd in ready:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    raise ExifToolCrashed("exiftool exited unexpectedly")
+                buffers[fd] += chunk
+                if buffers[fd].rstrip().endswith(sentinel):
+                    pending.discard(fd)
+        out, err = buffers[proc.stdout.fileno()], buffers[proc.stderr.fileno()]
+        return out.rstrip()[:-len(sentinel)], err.rstrip()[:-len(sentinel)]
+
+    def terminate(self):
+        # Not under _lock: close_all_sessions(force=True) kills sessions busy in a command.
+        # The reader then sees EOF and fails with ExifToolError.
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+    def close(self):
+        if self.running():
+            try:
+                self.proc.stdin.write(b"-stay_open\nFalse\n")
+                self.proc.stdin.flush()
+                self.proc.wait(timeout=self.timeout)
+            except (BrokenPipeError, subprocess.TimeoutExpired):
+                pass
+        self.terminate()
+
+_local = threading.local()
+_sessions = []
+_sessions_lock = threading.Lock()
+
+def get_exiftool():
+    """Return the exiftool session of the calling thread, starting it on first use."""
+    session = getattr(_local, "session", None)
+    if session is None or session.closed:
+        session = ExifToolSession()
+        _local.session = session
+        with _sessions_lock:
+            _sessions.append(session)
+    return session
+
+@atexit.register
+def close_all_sessions(force=False):
+    """Close every session started so far; force kills them instead of asking them to exit."""
+    with _sessions_lock:
+        sessions = list(_sessions)
+        _sessions.clear()
+    for session in sessions:
+        session.closed = True
+        if force:
+            session.terminate()
+        else:
+            session.close()
+    _local.__dict__.pop("session", None)
+
+def copy_tags(src_path, dst_path, tags=None):
+    """Copy metadata from src_path into dst_path in place: all tags, or only the given tag arguments."""
+    get_exiftool().execute("-TagsFromFile", src_path, *(tags or []), "-overwrite_original", dst_path)
+
+def read_tags(paths, tags):
+    """
+    Read tags for many files in one exiftool call.
+    Returns {path: {tag: value}}; numeric values are returned unformatted (-n).
+    """
+    if not paths:
+        return {}
+    out = get_exiftool().execute("-j", "-n", *[f"-{tag}" for tag in tags], *paths)
+    try:
+        records = json.loads(out) if out.strip() else []
+    except json.JSONDecodeError as e:
+        raise ExifToolError(f"Unexpected exiftool output: {e}")
+    return {rec["SourceFile"]: {tag: rec.get(tag) for tag in tags} for rec in records}
+
+def get_frame_rate(path):
+    return read_tags([path], ["VideoFrameRate"]).get(path, {}).get("VideoFrameRate")
+
+# Tags holding the capture date, in order of preference
+CAPTURE_DATE_TAGS = ["DateTimeOriginal", "CreationDate", "CreateDate"]
+
+def pick_capture_date(values):
+    """First usable capture date in a read_tags() record, as a datetime, or None."""
+    for tag in CAPTURE_DATE_TAGS:
+        parsed = _parse_exif_date(values.get(tag))
+        if parsed is not None:
+            return parsed
+    return None
+
+def read_capture_dates(paths):
+    dates = {}
+    for path, values in read_tags(paths, CAPTURE_DATE_TAGS).items():
+        parsed = pick_capture_date(values)
+        if parsed is not None:
+            dates[path] = parsed
+    return dates
+
+def _parse_exif_date(value):
+    if not value or not isinstance(value, str) or value.startswith("0000"):
+        return None
+    try:
+        return datetime.strptime(value[:19], "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
@@ -0,0 +1,98 @@
+# core/hashing.py
+
+import os, hashlib, mmap, threading
+from core.config import HASH_ALGORITHM, HASH_READ_SIZE, HASH_MMAP_THRESHOLD
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+_local = threading.local()
+
+def available_algorithms():
+    algorithms = ["md5", "blake2b"]
+    if xxhash is not None:
+        algorithms.append("xxh3")
+    return algorithms
+
+def check_algorithm(algorithm):
+    """Raise ValueError unless algorithm is usable here (xxh3 needs the xxhash package)."""
+    if algorithm not in available_algorithms():
+        hint = " (pip install xxhash)" if algorithm == "xxh3" else ""
+        raise ValueError(f"Hash algorithm {algorithm!r} is not available{hint}; choose one of {', '.join(available_algorithms())}")
+
+def new_hasher(algorithm=HASH_ALGORITHM, data=b""):
+    if algorithm == "md5":
+        return hashlib.md5(data)
+    if algorithm == "blake2b":
+        return hashlib.blake2b(data, digest_size=32)
+    if algorithm == "xxh3":
+        if xxhash is None:
+            raise ValueError("xxh3 requires the 'xxhash' package (pip install xxhash)")
+        return xxhash.xxh3_128(data)
+    raise ValueError(f"Unknown hash algorithm: {algorithm}")
+
+def format_digest(algorithm, hexdigest):
+    """
+    Digest string as written to the checksum JSON.
+    MD5 digests stay bare for compatibility with existing files; other algorithms
+    are prefixed with their name, e.g. "blake2b:1f0c...".
+    """
+    return hexdigest if algorithm == "md5" else f"{algorithm}:{hexdigest}"
+
+# Keys of files the staged dedup settled without reading them in full (core/scanner.py):
+# "size:<hash of the size>" for a unique size, "partial:<first/last bytes hash>" for a
+# unique partial hash. They tell files apart within one scan but are not checksums.
+SYNTHETIC_KINDS = ("size", "partial")
+
+def synthetic_key(kind, digest):
+    return f"{kind}:{digest}"
+
+def is_synthetic(digest):
+    return digest.partition(":")[0] in SYNTHETIC_KINDS
+
+def _read_buffer(read_size):
+    """Per-thread (and per-process) read buffer, reused across files."""
+    buf = getattr(_local, "buffer", None)
+    if buf is None or len(buf) != read_size:
+        buf = bytearray(read_size)
+        _local.buffer = buf
+    return buf
+
+def update_from_file(hasher, f, length=None, read_size=HASH_READ_SIZE):
+    """Feed up to length bytes (all when None) from an open binary file into hasher."""
+    buf = _read_buffer(read_size)
+    view = memoryview(buf)
+    remaining = length
+    while remaining is None or remaining > 0:
+        want = read_size if remaining is None else min(read_size, remaining)
+        n = f.readinto(view[:want])
+        if not n:
+            break
+        hasher.update(view[:n])
+        if remaining is not None:
+            remaining -= n
+
+def hash_file(file_path, algorithm=HASH_ALGORITHM, read_size=HASH_READ_SIZE, mmap_threshold=HASH_MMAP_THRESHOLD):
+    """
+    Hash a whole file and return its hex digest.
+    Small files are read with readinto() into a reused buffer; files of at least
+    mmap_threshold bytes are mapped and hashed without copying into user space.
+    """
+    hasher = new_hasher(algorithm)
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if mmap_threshold and size >= mmap_threshold:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, "madvise"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                view = memoryview(mm)
+                try:
+                    for offset in range(0, size, read_size):
+                        hasher.update(view[offset:offset + read_size])
+                finally:
+                    view.release()
+        else:
+            update_from_file(hasher, f, read_size=read_size)
+    return hasher.hexdigest()
@@ -0,0 +1,105 @@
+# core/heic_engine.py
+
+import time
+import threading
+import multiprocessing
+from core.config import JPEG_QUALITY, HEIC_ENGINE, HEIC_ENGINE_WORKERS, HEIC_ENGINE_TIMEOUT
+from core.renditions import render_thumbnails
+
+try:
+    from PIL import Image
+    import pillow_heif
+except ImportError:
+    Image = None
+    pillow_heif = None
+
+EXIF_ORIENTATION = 0x0112
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def available(engine=HEIC_ENGINE):
+    """True if HEIC files should be decoded in-process with pillow-heif."""
+    if engine == "cli":
+        return False
+    if engine == "pillow" and Image is None:
+        raise RuntimeError("HEIC_ENGINE is 'pillow' but pillow-heif is not installed (pip install pillow-heif)")
+    return Image is not None
+
+def _init_worker():
+    pillow_heif.register_heif_opener()
+
+def encode_jpeg(src_path, dst_jpg, quality=JPEG_QUALITY, thumbs_base=None):
+    """
+    Decode src_path and write it as JPEG with its EXIF, ICC profile and XMP in one pass.
+    pillow-heif applies the HEIF rotation while decoding, so the EXIF orientation
+    is reset to 1. With thumbs_base, thumbnails are saved from the same decoded
+    image (see core/renditions.py). Runs inside a pool worker.
+    Returns (dst_jpg, {kind: thumbnail path}).
+    """
+    with Image.open(src_path) as im:
+        exif = im.getexif()
+        if EXIF_ORIENTATION in exif:
+            exif[EXIF_ORIENTATION] = 1
+        icc = im.info.get("icc_profile")
+        xmp = im.info.get("xmp")
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        params = {"quality": quality, "exif": exif.tobytes()}
+        if icc:
+            params["icc_profile"] = icc
+        if xmp:
+            params["xmp"] = xmp
+        im.save(dst_jpg, "JPEG", **params)
+        made = render_thumbnails(im, thumbs_base) if thumbs_base else {}
+    return dst_jpg, made
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the parent has threads (walker, exiftool sessions) that must not be forked
+            ctx = multiprocessing.get_context("spawn")
+            _pool = ctx.Pool(HEIC_ENGINE_WORKERS, initializer=_init_worker)
+        return _pool
+
+def convert(src_path, dst_jpg, quality=JPEG_QUALITY, thumbs_base=None, timeout=HEIC_ENGINE_TIMEOUT):
+    """
+    Convert one HEIC file in the worker pool and wait for it. Safe to call from many threads.
+    A job that has not finished after `timeout` seconds (its worker may have been killed)
+    raises TimeoutError and the pool is recreated; jobs waiting on the old pool fail too.
+    """
+    pool = _get_pool()
+    result = pool.apply_async(encode_jpeg, (src_path, dst_jpg, quality, thumbs_base))
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return result.get(timeout=1.0)
+        except multiprocessing.TimeoutError:
+            if _pool is not pool:
+                raise TimeoutError(f"pillow-heif pool was restarted while converting {src_path}")
+            if time.monotonic() >= deadline:
+                _restart_pool(pool)
+                raise TimeoutError(f"pillow-heif did not finish {src_path} within {timeout}s")
+
+def _restart_pool(pool):
+    """Drop a stuck pool; the next convert() starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return
+        _pool = None
+    pool.terminate()
+
+def shutdown_pool(kill=False):
+    """Stop the worker pool; kill=True terminates conversions in progress."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is None:
+        return
+    if kill:
+        pool.terminate()
+    else:
+        pool.close()
+    pool.join()
@@ -0,0 +1,213 @@
+# core/io_scheduler.py
+
+import os, time, threading, multiprocessing
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from core.config import IO_INITIAL_CONCURRENCY, IO_MAX_CONCURRENCY, IO_MAX_THREADS, IO_TUNE_WINDOW, IO_SEQUENTIAL_BYTES
+
+# Limits reached by tuning, per st_dev, so later phases of the run start from them
+_tuned = {}
+_tuned_lock = threading.Lock()
+
+def is_rotational(dev):
+    """True for spinning disks, False for SSD/NVMe, None when unknown (network filesystems, non-Linux)."""
+    base = f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"
+    # Partitions have no queue/ of their own, their parent disk does
+    for path in (os.path.join(base, "queue", "rotational"), os.path.join(base, "..", "queue", "rotational")):
+        try:
+            with open(path) as f:
+                return f.read().strip() == "1"
+        except OSError:
+            continue
+    return None
+
+def describe_device(dev):
+    kind = {True: "HDD", False: "SSD"}.get(is_rotational(dev), "unknown")
+    return f"{os.major(dev)}:{os.minor(dev)} ({kind})"
+
+class DeviceTuner:
+    """
+    Hill-climbs the concurrency limit of one device: after every window of
+    `window` seconds spent with work queued, the limit moves one step, keeping
+    its direction while throughput holds up and turning around when it drops.
+    """
+
+    def __init__(self, dev, max_limit=IO_MAX_CONCURRENCY, window=IO_TUNE_WINDOW):
+        self.dev = dev
+        self.rotational = is_rotational(dev)
+        with _tuned_lock:
+            self.limit = _tuned.get(dev, 1 if self.rotational else IO_INITIAL_CONCURRENCY)
+        self.max_limit = max_limit
+        self.window = window
+        self.step = 1
+        self.previous = None
+        self._bytes = 0
+        self._start = time.monotonic()
+
+    def record(self, nbytes, saturated):
+        """Account a finished task. Windows where the device ran out of queued work are not measured."""
+        if not saturated:
+            self._bytes = 0
+            self._start = time.monotonic()
+            return
+        self._bytes += nbytes
+        now = time.monotonic()
+        elapsed = now - self._start
+        if elapsed < self.window:
+            return
+        rate = self._bytes / elapsed
+        self._bytes, self._start = 0, now
+        if self.previous is not None and rate < self.previous * 0.95:
+            self.step = -self.step
+        self.previous = rate
+        limit = min(self.max_limit, max(1, self.limit + self.step))
+        if limit == self.limit:
+            self.step = -self.step
+        self.limit = limit
+        with _tuned_lock:
+            _tuned[self.dev] = limit
+
+class IOScheduler:
+    """
+    Runs I/O-bound tasks on one shared pool with a concurrency limit per
+    device (st_dev), auto-tuned by a DeviceTuner. Tasks of a device start in
+    submission order; on spinning disks a task of IO_SEQUENTIAL_BYTES or more
+    has the device to itself, so large files are streamed one at a time.
+    submit() returns a concurrent.futures.Future, so wait() and
+    as_completed() work as with an executor.
+    """
+
+    def __init__(self, max_workers=None, use_processes=False):
+        if use_processes:
+            # spawn: the parent has threads (walker, exiftool sessions) that must not be forked
+            self._executor = ProcessPoolExecutor(
+                max_workers=max_workers or os.cpu_count(), mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers or IO_MAX_THREADS)
+        self._devices = {}
+        self._lock = threading.Lock()
+
+    def submit(self, dev, nbytes, fn, *args):
+        """Queue fn(*args), expected to read about nbytes from device dev."""
+        future = Future()
+        with self._lock:
+            device = self._devices.get(dev)
+            if device is None:
+                device = self._devices[dev] = {"tuner": DeviceTuner(dev), "pending": deque(), "running": 0, "exclusive": False}
+            device["pending"].append((future, nbytes, fn, args))
+            ready = self._take(device)
+        self._start(dev, ready)
+        return future
+
+    def _take(self, device):
+        """Pop the tasks of a device that may start now (lock held)."""
+        ready = []
+        while device["pending"] and not device["exclusive"] and device["running"] < device["tuner"].limit:
+            future, nbytes, fn, args = device["pending"][0]
+            exclusive = device["tuner"].rotational and nbytes >= IO_SEQUENTIAL_BYTES
+            if exclusive and device["running"]:
+                break
+            device["pending"].popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            device["running"] += 1
+            device["exclusive"] = exclusive
+            ready.append((future, nbytes, fn, args))
+        return ready
+
+    def _start(self, dev, ready):
+        for future, nbytes, fn, args in ready:
+            try:
+                inner = self._executor.submit(fn, *args)
+            except RuntimeError as e:
+                # Pool already shut down (cancelled run)
+                future.set_exception(e)
+                continue
+            inner.add_done_callback(lambda inner, future=future, nbytes=nbytes: self._done(dev, future, nbytes, inner))
+
+    def _done(self, dev, future, nbytes, inner):
+        try:
+            result, error = inner.result(), None
+        except Exception as e:
+            # Includes CancelledError for tasks dropped by shutdown(cancel_futures=True)
+            result, error = None, e
+        with self._lock:
+            device = self._devices[dev]
+            device["running"] -= 1
+            device["exclusive"] = False
+            if error is None:
+                device["tuner"].record(nbytes, saturated=bool(device["pending"]))
+            ready = self._take(device)
+        self._start(dev, ready)
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def limits(self):
+        """{dev: current concurrency limit} for every device seen so far."""
+        with self._lock:
+            return {dev: device["tuner"].limit for dev, device in self._devices.items()}
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        if cancel_futures:
+            with self._lock:
+                for device in self._devices.values():
+                    for future, _, _, _ in device["pending"]:
+                        future.cancel()
+                    device["pending"].clear()
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown(wait=True)
+
+class DeviceSlots:
+    """
+    Blocking per-device limit for code already running in worker threads,
+    e.g. the pass-through copies of process_template:
+    `with device_slots.slot(st.st_dev, st.st_size): ...`.
+    Limits start from what the scan tuned and keep being tuned.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._devices = {}
+
+    def slot(self, dev, nbytes):
+        return _Slot(self, dev, nbytes)
+
+    def _acquire(self, dev):
+        with self._cond:
+            device = self._devices.get(dev)
+            if device is None:
+                device = self._devices[dev] = {"tuner": DeviceTuner(dev), "running": 0, "waiting": 0}
+            device["waiting"] += 1
+            while device["running"] >= device["tuner"].limit:
+                self._cond.wait()
+            device["waiting"] -= 1
+            device["running"] += 1
+
+    def _release(self, dev, nbytes, ok):
+        with self._cond:
+            device = self._devices[dev]
+            device["running"] -= 1
+            if ok:
+                device["tuner"].record(nbytes, saturated=device["waiting"] > 0)
+            self._cond.notify_all()
+
+class _Slot:
+    def __init__(self, slots, dev, nbytes):
+        self.slots, self.dev, self.nbytes = slots, dev, nbytes
+
+    def __enter__(self):
+        self.slots._acquire(self.dev)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.slots._release(self.dev, self.nbytes, exc_type is None)
+
+device_slots = DeviceSlots()
@@ -0,0 +1,87 @@
+# core/journal.py
+
+import os, json, time, threading
+from core.config import JOURNAL_FILENAME, JOURNAL_SYNC_INTERVAL
+from core.hashing import is_synthetic
+
+class CompletionJournal:
+    """
+    Append-only JSON Lines record of finished conversions in an output directory.
+    Each line is written with a single write() and fsync'ed at most every
+    JOURNAL_SYNC_INTERVAL seconds; a truncated last line (crash mid-write) is
+    ignored on load. Entries hold the digest, the source identity
+    (path, size, mtime_ns) and the output path.
+    """
+
+    def __init__(self, output_dir, filename=JOURNAL_FILENAME):
+        self.path = os.path.join(output_dir, filename)
+        self.entries = {}
+        self.by_src = {}
+        self._lock = threading.Lock()
+        self._last_sync = time.monotonic()
+        self._load()
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._add(entry)
+
+    def _add(self, entry):
+        self.entries.setdefault(entry["digest"], []).append(entry)
+        self.by_src.setdefault(entry["src"], []).append(entry)
+
+    def is_done(self, digest, src_paths):
+        """
+        True if digest was converted before from one of src_paths, that source is
+        unchanged since, and the output still exists with the recorded size.
+        Synthetic keys (see core/hashing.py) change once a same-size file shows
+        up, so when either side is one, the unchanged source alone decides.
+        """
+        candidates = [entry for entry in self.entries.get(digest, []) if entry["src"] in src_paths]
+        for src in src_paths:
+            candidates += [
+                entry for entry in self.by_src.get(src, [])
+                if entry["digest"] != digest and (is_synthetic(digest) or is_synthetic(entry["digest"]))
+            ]
+        for entry in candidates:
+            try:
+                src_stat = os.stat(entry["src"])
+                out_size = os.path.getsize(entry["output"])
+            except OSError:
+                continue
+            if (src_stat.st_size, src_stat.st_mtime_ns) == (entry["size"], entry["mtime_ns"]) and out_size == entry["output_size"]:
+                return True
+        return False
+
+    def record(self, digest, src, output):
+        st = os.stat(src)
+        entry = {
+            "digest": digest,
+            "src": src,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "output": output,
+            "output_size": os.path.getsize(output),
+            "time": time.time()
+        }
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            os.write(self._fd, line)
+            self._add(entry)
+            if time.monotonic() - self._last_sync >= JOURNAL_SYNC_INTERVAL:
+                os.fsync(self._fd)
+                self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.fsync(self._fd)
+                os.close(self._fd)
+                self._fd = None
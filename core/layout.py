@@ -0,0 +1,105 @@
+# core/layout.py
+
+import os, logging, threading
+from core.config import OUTPUT_LAYOUT, OUTPUT_DATE_BATCH, OUTPUT_UNDATED_FOLDER, RENDITIONS_ENABLED, RENDITIONS_FOLDER
+from core.exiftool import read_capture_dates, ExifToolError
+from core.manifest import split_digest
+
+LAYOUTS = ("date", "digest", "flat")
+
+class OutputLayout:
+    """
+    Chooses the output path of each file inside a category folder, see
+    OUTPUT_LAYOUT in core/config.py. Names are reserved in memory, compared
+    case-insensitively and without extension: a file whose name is already
+    taken gets _<first 8 hex digits of its digest> appended, so outputs never
+    overwrite each other and no directory has to be listed. Outputs already in
+    the completion journal stay reserved for the source that produced them.
+    With renditions=True, thumbs_path() maps outputs into a parallel
+    RENDITIONS_FOLDER tree (output_dir/thumbs/images/2024/05/IMG_0001...).
+    """
+
+    def __init__(self, subdir, layout=OUTPUT_LAYOUT, filename_transform_func=None, journal=None, renditions=RENDITIONS_ENABLED):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown output layout: {layout} (expected one of {', '.join(LAYOUTS)})")
+        self.subdir = subdir
+        self.layout = layout
+        self.filename_transform_func = filename_transform_func
+        self.renditions = renditions
+        self.thumbs_dir = os.path.join(os.path.dirname(subdir), RENDITIONS_FOLDER, os.path.basename(subdir))
+        self._dates = {}
+        self._reserved = {}
+        self._created = set()
+        self._lock = threading.Lock()
+        if journal is not None:
+            for entries in journal.entries.values():
+                for entry in entries:
+                    self._reserved[os.path.splitext(entry["output"])[0].lower()] = entry["src"]
+
+    def prefetch(self, paths):
+        """Read the capture dates of paths in batches (date layout only), ahead of assign()."""
+        if self.layout != "date":
+            return
+        missing = [path for path in paths if path not in self._dates]
+        for offset in range(0, len(missing), OUTPUT_DATE_BATCH):
+            batch = missing[offset:offset + OUTPUT_DATE_BATCH]
+            try:
+                dates = read_capture_dates(batch)
+            except ExifToolError as e:
+                # One bad file must not send the whole batch to undated/: read them one by one
+                logging.warning(f"Cannot read capture dates of {len(batch)} file(s) at once ({e}), reading them one by one")
+                dates = {}
+                for path in batch:
+                    try:
+                        dates.update(read_capture_dates([path]))
+                    except ExifToolError as e:
+                        logging.warning(f"Cannot read the capture date of {path}, filing it as {OUTPUT_UNDATED_FOLDER}: {e}")
+            with self._lock:
+                for path in batch:
+                    self._dates[path] = dates.get(path)
+
+    def _folder(self, src, hexdigest):
+        if self.layout == "flat":
+            return self.subdir
+        if self.layout == "digest":
+            return os.path.join(self.subdir, hexdigest[:2])
+        date = self._dates.pop(src, None)
+        if date is None:
+            return os.path.join(self.subdir, OUTPUT_UNDATED_FOLDER)
+        return os.path.join(self.subdir, f"{date.year:04d}", f"{date.month:02d}")
+
+    def assign(self, src, digest):
+        """Reserve and return the output path (without extension) for src, creating its folder."""
+        if self.layout == "date" and src not in self._dates:
+            self.prefetch([src])
+        name = os.path.basename(src)
+        if self.filename_transform_func:
+            name = self.filename_transform_func(name)
+        stem = os.path.splitext(name)[0]
+        hexdigest = split_digest(digest)[1].hex()
+        with self._lock:
+            folder = self._folder(src, hexdigest)
+            for candidate in (stem, f"{stem}_{hexdigest[:8]}", f"{stem}_{hexdigest}"):
+                path = os.path.join(folder, candidate)
+                owner = self._reserved.setdefault(path.lower(), src)
+                if owner == src:
+                    break
+            else:
+                raise FileExistsError(f"No free output name for {src} in {folder}")
+            self._makedirs(folder)
+        return path
+
+    def thumbs_path(self, dst_wo_ext):
+        """Prefix of the renditions of an assigned output (None when disabled), creating its folder."""
+        if not self.renditions:
+            return None
+        path = os.path.join(self.thumbs_dir, os.path.relpath(dst_wo_ext, self.subdir))
+        with self._lock:
+            self._makedirs(os.path.dirname(path))
+        return path
+
+    def _makedirs(self, folder):
+        # Lock held
+        if folder not in self._created:
+            os.makedirs(folder, exist_ok=True)
+            self._created.add(folder)
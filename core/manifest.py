@@ -0,0 +1,299 @@
+# core/manifest.py
+
+import os, json, sqlite3
+from itertools import groupby
+from core.config import MANIFEST_COMMIT_ROWS
+from core.hashing import format_digest, is_synthetic
+
+CATEGORIES = ["photos", "videos", "slowmo"]
+
+def split_digest(digest):
+    """
+    'blake2b:1f0c...' -> ('blake2b', raw bytes); bare hex digests are MD5.
+    Synthetic keys ('size:...', 'partial:...') are split after their prefix.
+    """
+    if is_synthetic(digest):
+        digest = digest.partition(":")[2]
+    algorithm, _, hexdigest = digest.rpartition(":")
+    return algorithm or "md5", bytes.fromhex(hexdigest)
+
+def stored_digest(digest):
+    """Value kept in groups.digest: raw bytes for a checksum, the key itself (TEXT) for a synthetic key."""
+    return digest if is_synthetic(digest) else split_digest(digest)[1]
+
+# First path of every group (the one that gets converted), by insertion order;
+# SQLite takes the bare `path` column from the row holding MIN(rowid)
+FIRST_PATHS = "SELECT group_id, path AS first, MIN(rowid) FROM paths GROUP BY group_id"
+
+class Manifest:
+    """
+    Scan results stored in SQLite: for each category, every digest (as raw
+    bytes, synthetic keys as text) with the paths sharing it, in the order the
+    scan found them, and the output each digest was converted to.
+    The scan appends with add(); converters iterate with groups(), which reads
+    rows lazily instead of loading the whole run into memory. Groups are
+    listed by their first path, not by the order the scan's hashing threads
+    settled them, so output name collisions resolve the same way every run.
+    """
+
+    def __init__(self, db_path):
+        self.path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS groups (
+                id INTEGER PRIMARY KEY,
+                category TEXT NOT NULL,
+                digest BLOB NOT NULL,
+                UNIQUE (category, digest)
+            );
+            CREATE INDEX IF NOT EXISTS groups_category ON groups (category);
+            CREATE TABLE IF NOT EXISTS paths (
+                group_id INTEGER NOT NULL,
+                path TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS paths_group ON paths (group_id);
+            CREATE TABLE IF NOT EXISTS near_duplicates (
+                group_id INTEGER PRIMARY KEY,
+                cluster INTEGER NOT NULL,
+                rank INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS outputs (
+                group_id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS renditions (
+                group_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                path TEXT NOT NULL,
+                PRIMARY KEY (group_id, kind)
+            );
+        """)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'algorithm'").fetchone()
+        self.algorithm = row[0] if row else None
+        self._uncommitted = 0
+
+    def add(self, category, digest, path):
+        """Append path under digest. Returns True if it is the first path of that digest."""
+        algorithm, raw = split_digest(digest)[0], stored_digest(digest)
+        if self.algorithm is None:
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('algorithm', ?)", (algorithm,))
+            self.algorithm = algorithm
+        elif algorithm != self.algorithm:
+            raise ValueError(f"Manifest holds {self.algorithm} digests, got {algorithm}")
+        cur = self.conn.execute("INSERT OR IGNORE INTO groups (category, digest) VALUES (?, ?)", (category, raw))
+        first = cur.rowcount == 1
+        if first:
+            group_id = cur.lastrowid
+        else:
+            group_id = self.conn.execute(
+                "SELECT id FROM groups WHERE category = ? AND digest = ?", (category, raw)
+            ).fetchone()[0]
+        self.conn.execute("INSERT INTO paths (group_id, path) VALUES (?, ?)", (group_id, path))
+        self._uncommitted += 1
+        if self._uncommitted >= MANIFEST_COMMIT_ROWS:
+            self.commit()
+        return first
+
+    def commit(self):
+        self.conn.commit()
+        self._uncommitted = 0
+
+    def add_clusters(self, category, clusters):
+        """
+        Record near-duplicate clusters (lists of digests, best first, see
+        core/perceptual.py). groups() then skips every member but the best.
+        """
+        for cluster in clusters:
+            ids = []
+            for digest in cluster:
+                row = self.conn.execute(
+                    "SELECT id FROM groups WHERE category = ? AND digest = ?", (category, stored_digest(digest))
+                ).fetchone()
+                if row is not None:
+                    ids.append(row[0])
+            if len(ids) < 2:
+                continue
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO near_duplicates (group_id, cluster, rank) VALUES (?, ?, ?)",
+                [(group_id, ids[0], rank) for rank, group_id in enumerate(ids)]
+            )
+        self.commit()
+
+    def clusters(self, category):
+        """Yield the near-duplicate clusters of a category as lists of (digest, first path), best first."""
+        rows = self.conn.execute("""
+            SELECT n.cluster, g.digest, (SELECT path FROM paths WHERE group_id = g.id ORDER BY rowid LIMIT 1)
+            FROM near_duplicates n JOIN groups g ON g.id = n.group_id
+            WHERE g.category = ? ORDER BY n.cluster, n.rank
+        """, (category,))
+        for _, items in groupby(rows, key=lambda row: row[0]):
+            yield [(self.format_stored(raw), path) for _, raw, path in items]
+
+    def set_output(self, category, digest, output, renditions=None):
+        """
+        Record the file the first path of digest was converted to, and the
+        renditions made with it ({kind: path}, see core/renditions.py).
+        """
+        raw = stored_digest(digest)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO outputs (group_id, path) SELECT id, ? FROM groups WHERE category = ? AND digest = ?",
+            (output, category, raw)
+        )
+        if renditions:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO renditions (group_id, kind, path) SELECT id, ?, ? FROM groups WHERE category = ? AND digest = ?",
+                [(kind, path, category, raw) for kind, path in sorted(renditions.items())]
+            )
+        self._uncommitted += 1
+        if self._uncommitted >= MANIFEST_COMMIT_ROWS:
+            self.commit()
+
+    def outputs(self, category):
+        """Yield (digest, output path) for every converted digest of a category, by first path."""
+        rows = self.conn.execute(f"""
+            SELECT g.digest, o.path FROM outputs o JOIN groups g ON g.id = o.group_id
+            JOIN ({FIRST_PATHS}) f ON f.group_id = g.id
+            WHERE g.category = ? ORDER BY f.first, g.id
+        """, (category,))
+        for raw, path in rows:
+            yield self.format_stored(raw), path
+
+    def renditions(self, category):
+        """Yield (digest, {kind: path}) for every digest of a category that has renditions, by first path."""
+        rows = self.conn.execute(f"""
+            SELECT g.digest, r.kind, r.path FROM renditions r JOIN groups g ON g.id = r.group_id
+            JOIN ({FIRST_PATHS}) f ON f.group_id = g.id
+            WHERE g.category = ? ORDER BY f.first, g.id, r.kind
+        """, (category,))
+        for raw, items in groupby(rows, key=lambda row: row[0]):
+            yield self.format_stored(raw), {kind: path for _, kind, path in items}
+
+    def count(self, category, skip_near_duplicates=True):
+        """Number of unique digests in a category (by default not counting skipped near-duplicates)."""
+        return self.conn.execute(f"""
+            SELECT COUNT(*) FROM groups g LEFT JOIN near_duplicates n ON n.group_id = g.id
+            WHERE g.category = ?{" AND COALESCE(n.rank, 0) = 0" if skip_near_duplicates else ""}
+        """, (category,)).fetchone()[0]
+
+    def groups(self, category, skip_near_duplicates=True):
+        """
+        Yield (digest, [paths]) for a category, sorted by first path, each
+        group's paths in scan order. Near-duplicates other than the best of
+        their cluster are skipped unless skip_near_duplicates is False.
+        """
+        rows = self.conn.execute(f"""
+            SELECT g.id, g.digest, p.path FROM groups g JOIN ({FIRST_PATHS}) f ON f.group_id = g.id
+            JOIN paths p ON p.group_id = g.id LEFT JOIN near_duplicates n ON n.group_id = g.id
+            WHERE g.category = ?{" AND COALESCE(n.rank, 0) = 0" if skip_near_duplicates else ""}
+            ORDER BY f.first, g.id, p.rowid
+        """, (category,))
+        for (_, raw), items in groupby(rows, key=lambda row: row[:2]):
+            yield self.format_stored(raw), [row[2] for row in items]
+
+    def format_stored(self, raw):
+        """Digest string for a groups.digest value (see stored_digest)."""
+        return raw if isinstance(raw, str) else format_digest(self.algorithm, raw.hex())
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class JsonManifest:
+    """Read-only view of a checksum JSON written by earlier versions (one category per file)."""
+
+    def __init__(self, json_path):
+        self.path = json_path
+        with open(json_path, "r") as f:
+            self._map = json.load(f)
+
+    def count(self, category):
+        return len(self._map)
+
+    def groups(self, category):
+        yield from self._map.items()
+
+    def close(self):
+        pass
+
+def open_manifest(path):
+    """Open a SQLite manifest, or a legacy checksum JSON."""
+    if path.endswith(".json"):
+        return JsonManifest(path)
+    return Manifest(path)
+
+def _write_json_map(path, items):
+    """
+    Stream (key, value) pairs to path as a JSON object, one entry at a time.
+    Nothing is written when there are no pairs; returns whether the file was.
+    """
+    f = None
+    try:
+        for key, value in items:
+            if f is None:
+                f = open(path, "w")
+                f.write("{\n")
+            else:
+                f.write(",\n")
+            body = json.dumps(value, indent=2).replace("\n", "\n  ")
+            f.write(f"  {json.dumps(key)}: {body}")
+    finally:
+        if f is not None:
+            f.write("\n}")
+            f.close()
+    return f is not None
+
+def export_json(manifest_path, categories=CATEGORIES):
+    """
+    Write the manifest as one checksum JSON per category next to it, in the
+    format earlier versions produced ({digest: [paths]}, indent=2). Files the
+    scan settled without a full hash are listed under their "size:"/"partial:" key.
+    Near-duplicate clusters go to clusters_<category>_<timestamp>.json
+    ({best digest: {digest: first path}}, best first), the converted files to
+    outputs_<category>_<timestamp>.json ({digest: output path}) and their renditions
+    to renditions_<category>_<timestamp>.json ({digest: {kind: path}}), when there
+    are any. Entries are streamed to disk one at a time. Returns {name: json_path},
+    keyed by category for the checksum files and "<category>.<kind>" for the others.
+    """
+    directory = os.path.dirname(manifest_path)
+    stem = os.path.splitext(os.path.basename(manifest_path))[0]
+    timestamp = stem.split("_", 1)[1] if "_" in stem else stem
+    json_paths = {}
+    with Manifest(manifest_path) as manifest:
+        for cat in categories:
+            output_path = os.path.join(directory, f"{cat}_{timestamp}.json")
+            with open(output_path, "w") as f:
+                f.write("{")
+                separator = "\n"
+                for digest, paths in manifest.groups(cat, skip_near_duplicates=False):
+                    f.write(f"{separator}  {json.dumps(digest)}: [\n")
+                    f.write(",\n".join(f"    {json.dumps(path)}" for path in paths))
+                    f.write("\n  ]")
+                    separator = ",\n"
+                f.write("\n}" if separator != "\n" else "}")
+            json_paths[cat] = output_path
+
+            clusters_path = os.path.join(directory, f"clusters_{cat}_{timestamp}.json")
+            clusters = ((cluster[0][0], dict(cluster)) for cluster in manifest.clusters(cat))
+            if _write_json_map(clusters_path, clusters):
+                json_paths[f"{cat}.clusters"] = clusters_path
+
+            outputs_path = os.path.join(directory, f"outputs_{cat}_{timestamp}.json")
+            if _write_json_map(outputs_path, manifest.outputs(cat)):
+                json_paths[f"{cat}.outputs"] = outputs_path
+
+            renditions_path = os.path.join(directory, f"renditions_{cat}_{timestamp}.json")
+            if _write_json_map(renditions_path, manifest.renditions(cat)):
+                json_paths[f"{cat}.renditions"] = renditions_path
+    return json_paths
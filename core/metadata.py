@@ -0,0 +1,60 @@
+# core/metadata.py
+
+import logging
+from core.config import METADATA_MODE
+from core.exiftool import read_tags, copy_tags, pick_capture_date, CAPTURE_DATE_TAGS
+from core.video_planner import REMUX, TRANSCODE_AUDIO
+
+CHECK_TAGS = ["GPSLatitude", "GPSLongitude", "Orientation", "Rotation"]
+
+# exiftool -TagsFromFile arguments restoring each kind of metadata
+FALLBACK_TAGS = {
+    "capture date": ["-AllDates", "-Keys:CreationDate"],
+    "gps": ["-GPS:all", "-Keys:GPSCoordinates", "-UserData:GPSCoordinates"],
+    "orientation": ["-Orientation", "-Rotation"]
+}
+
+def _orientation(values):
+    """Orientation as (EXIF orientation, rotation degrees), with the no-op values as defaults."""
+    return (values.get("Orientation") or 1, values.get("Rotation") or 0)
+
+def missing_metadata(src_path, dst_path, plan=None):
+    """
+    Kinds of metadata ("capture date", "gps", "orientation") present in the
+    source but lost in the output. Orientation counts as kept when the output
+    has the same tag or none at all, since both encoders apply the rotation
+    to the pixels when they re-encode. Video that was stream-copied (plan
+    REMUX or TRANSCODE_AUDIO, see core/video_planner.py) keeps its unrotated
+    pixels, so there only the same tag counts.
+    """
+    tags = read_tags([src_path, dst_path], CHECK_TAGS + CAPTURE_DATE_TAGS)
+    src, dst = tags.get(src_path, {}), tags.get(dst_path, {})
+    missing = []
+    src_date = pick_capture_date(src)
+    if src_date is not None and pick_capture_date(dst) != src_date:
+        missing.append("capture date")
+    if src.get("GPSLatitude") is not None and dst.get("GPSLatitude") is None:
+        missing.append("gps")
+    kept = [_orientation(src)] if plan in (REMUX, TRANSCODE_AUDIO) else [_orientation(src), (1, 0)]
+    if _orientation(dst) not in kept:
+        missing.append("orientation")
+    return missing
+
+def preserve_metadata(src_path, dst_path, mode=METADATA_MODE, plan=None):
+    """
+    Make sure dst_path keeps the metadata of src_path after an encode that
+    already tried to carry it. Only rewrites dst_path when something is missing
+    (or always, in "exiftool" mode). plan is the video conversion plan, if any.
+    """
+    if mode == "exiftool":
+        copy_tags(src_path, dst_path)
+        return
+    missing = missing_metadata(src_path, dst_path, plan)
+    if not missing:
+        return
+    if mode == "inline_only":
+        logging.warning(f"Metadata not carried for {src_path}: {', '.join(missing)}")
+        return
+    tags = [tag for kind in missing for tag in FALLBACK_TAGS[kind]]
+    copy_tags(src_path, dst_path, tags)
+    logging.info(f"exiftool fallback for {src_path}: {', '.join(missing)}")
@@ -0,0 +1,202 @@
+# core/metrics.py
+
+import os, json, time, random, threading
+from datetime import datetime
+from core.config import METRICS_ENABLED, METRICS_PROMETHEUS_TEXTFILE, METRICS_RESERVOIR_SIZE
+
+_lock = threading.Lock()
+_local = threading.local()
+_run = None
+
+def start_run(output_dir, enabled=METRICS_ENABLED):
+    """
+    Start collecting metrics for a run. Events are appended as JSON Lines to
+    output_dir/logs/<timestamp>/metrics_<timestamp>.jsonl and aggregated per
+    stage for summary(). Events emitted while no run is active are dropped.
+    """
+    global _run
+    finish_run(quiet=True)
+    if not enabled:
+        return None
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    log_dir = os.path.join(output_dir, "logs", timestamp)
+    os.makedirs(log_dir, exist_ok=True)
+    path = os.path.join(log_dir, f"metrics_{timestamp}.jsonl")
+    with _lock:
+        _run = {"path": path, "file": open(path, "a", encoding="utf-8"), "start": time.time(), "stages": {}}
+    return path
+
+def event(stage, duration, path=None, nbytes=0, **fields):
+    """
+    Record one event: a whole phase (path=None) or one file of a stage.
+    Extra fields (exit_code, peak_rss, output_bytes, error, ...) are written as-is.
+    """
+    with _lock:
+        if _run is None:
+            return
+        entry = {"ts": round(time.time(), 3), "stage": stage, "duration": round(duration, 6), "bytes": nbytes}
+        if path is not None:
+            entry["path"] = path
+        entry.update(fields)
+        _run["file"].write(json.dumps(entry, ensure_ascii=False) + "\n")
+        stage_stats = _run["stages"].setdefault(stage, {"count": 0, "bytes": 0, "seconds": 0.0, "failures": 0, "files": 0, "durations": [], "slowest": []})
+        stage_stats["count"] += 1
+        stage_stats["bytes"] += nbytes
+        stage_stats["seconds"] += duration
+        if fields.get("error"):
+            stage_stats["failures"] += 1
+        if path is not None:
+            _sample(stage_stats, duration)
+            stage_stats["slowest"] = sorted(stage_stats["slowest"] + [(duration, path)], reverse=True)[:5]
+
+def flush():
+    """Push buffered events to disk (long-running modes call this periodically)."""
+    with _lock:
+        if _run is not None:
+            _run["file"].flush()
+
+def _sample(stage_stats, duration):
+    """
+    Keep a uniform sample of at most METRICS_RESERVOIR_SIZE per-file durations
+    (reservoir sampling), so memory stays bounded in long watch-mode runs.
+    """
+    stage_stats["files"] += 1
+    durations = stage_stats["durations"]
+    if len(durations) < METRICS_RESERVOIR_SIZE:
+        durations.append(duration)
+        return
+    slot = random.randrange(stage_stats["files"])
+    if slot < METRICS_RESERVOIR_SIZE:
+        durations[slot] = duration
+
+def begin_file():
+    """
+    Start collecting the tools run by the current thread for one file.
+    Returns the collector; work the file hands to other threads passes it
+    to record_tool() (see current_file()).
+    """
+    _local.tools = []
+    return _local.tools
+
+def current_file():
+    """Collector of the file the current thread is working on, or None."""
+    return getattr(_local, "tools", None)
+
+def record_tool(name, exit_code, peak_rss, tools=None):
+    """
+    Called by run_tool() after each child exits; peak_rss is in bytes.
+    tools is the file's collector, by default the current thread's.
+    """
+    if tools is None:
+        tools = getattr(_local, "tools", None)
+    if tools is not None:
+        tools.append((name, exit_code, peak_rss))
+
+def end_file():
+    """Return {"tools", "exit_code", "peak_rss"} for the tools run since begin_file()."""
+    tools = getattr(_local, "tools", None) or []
+    _local.tools = None
+    if not tools:
+        return {}
+    failed = [code for _, code, _ in tools if code]
+    return {
+        "tools": [name for name, _, _ in tools],
+        "exit_code": failed[-1] if failed else 0,
+        "peak_rss": max((rss for _, _, rss in tools if rss), default=None)
+    }
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summary():
+    """
+    {stage: {count, bytes, seconds, failures, mb_per_s, p50, p90, p99, max, slowest}} for the current run.
+    Percentiles come from the sampled durations (exact up to METRICS_RESERVOIR_SIZE files).
+    """
+    with _lock:
+        if _run is None:
+            return {}
+        result = {}
+        for stage, s in _run["stages"].items():
+            durations = sorted(s["durations"])
+            result[stage] = {
+                "count": s["count"],
+                "bytes": s["bytes"],
+                "seconds": s["seconds"],
+                "failures": s["failures"],
+                "mb_per_s": s["bytes"] / 1e6 / s["seconds"] if s["seconds"] else None,
+                "p50": percentile(durations, 0.50),
+                "p90": percentile(durations, 0.90),
+                "p99": percentile(durations, 0.99),
+                "max": s["slowest"][0][0] if s["slowest"] else None,
+                "slowest": [path for _, path in s["slowest"]]
+            }
+        return result
+
+def summary_lines():
+    """Human-readable end-of-run summary, one line per stage."""
+    lines = []
+    for stage, s in summary().items():
+        throughput = f", {s['mb_per_s']:.1f} MB/s" if s["mb_per_s"] else ""
+        line = f"📈 {stage}: {s['seconds']:.2f}s{throughput}"
+        if s["p50"] is not None:
+            line += f" — {s['count']} files, p50 {s['p50']:.2f}s, p90 {s['p90']:.2f}s, p99 {s['p99']:.2f}s, max {s['max']:.2f}s"
+            if s["failures"]:
+                line += f", {s['failures']} failed"
+            if s["slowest"]:
+                line += f" (slowest: {os.path.basename(s['slowest'][0])})"
+        lines.append(line)
+    return lines
+
+def write_prometheus(path):
+    """
+    Write the run summary in the Prometheus text format, e.g. for the
+    node_exporter textfile collector. The file is replaced atomically.
+    """
+    stats = summary()
+    lines = [
+        "# HELP copyconv_stage_seconds Time spent per stage in the last run.",
+        "# TYPE copyconv_stage_seconds gauge"
+    ]
+    lines += [f'copyconv_stage_seconds{{stage="{stage}"}} {s["seconds"]:.6f}' for stage, s in stats.items()]
+    lines += ["# HELP copyconv_stage_bytes Bytes processed per stage in the last run.", "# TYPE copyconv_stage_bytes gauge"]
+    lines += [f'copyconv_stage_bytes{{stage="{stage}"}} {s["bytes"]}' for stage, s in stats.items()]
+    lines += ["# HELP copyconv_stage_files Files processed per stage in the last run.", "# TYPE copyconv_stage_files gauge"]
+    lines += [f'copyconv_stage_files{{stage="{stage}"}} {s["count"]}' for stage, s in stats.items()]
+    lines += ["# HELP copyconv_stage_failures Failed files per stage in the last run.", "# TYPE copyconv_stage_failures gauge"]
+    lines += [f'copyconv_stage_failures{{stage="{stage}"}} {s["failures"]}' for stage, s in stats.items()]
+    lines += ["# HELP copyconv_file_duration_seconds Per-file duration quantiles in the last run.", "# TYPE copyconv_file_duration_seconds summary"]
+    for stage, s in stats.items():
+        for q in ("p50", "p90", "p99"):
+            if s[q] is not None:
+                lines.append(f'copyconv_file_duration_seconds{{stage="{stage}",quantile="0.{q[1:]}"}} {s[q]:.6f}')
+    lines += ["# HELP copyconv_last_run_timestamp_seconds End of the last run.", "# TYPE copyconv_last_run_timestamp_seconds gauge"]
+    lines.append(f"copyconv_last_run_timestamp_seconds {time.time():.0f}")
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+def finish_run(prometheus_path=METRICS_PROMETHEUS_TEXTFILE, quiet=False):
+    """
+    Close the events file, write the Prometheus textfile if configured and
+    return the summary lines (also printed unless quiet).
+    """
+    global _run
+    if _run is None:
+        return []
+    lines = summary_lines()
+    if prometheus_path:
+        write_prometheus(prometheus_path)
+    with _lock:
+        _run["file"].close()
+        path = _run["path"]
+        _run = None
+    if not quiet:
+        for line in lines:
+            print(line)
+        print(f"📄 Metrics saved to {path}")
+    return lines
@@ -0,0 +1,151 @@
+# core/mp4_atoms.py
+
+import os, struct
+from collections import Counter
+
+# Containers using ISO base media file format boxes
+ISO_BMFF_EXTS = {".mov", ".mp4", ".m4v", ".3gp"}
+
+# Apple metadata keys (moov/meta, mdta handler) holding the capture frame rate
+CAPTURE_FPS_KEYS = ("com.apple.quicktime.capture.fps",)
+
+class AtomError(ValueError):
+    pass
+
+def _boxes(f, start, end):
+    """Yield (type, payload_offset, payload_end) for the boxes between start and end."""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            raise AtomError(f"Invalid box size {size} for {box_type!r} at {offset}")
+        yield box_type, offset + header_size, min(offset + size, end)
+        offset += size
+
+def _find(f, start, end, box_type):
+    for found, payload, payload_end in _boxes(f, start, end):
+        if found == box_type:
+            return payload, payload_end
+    return None
+
+def _read(f, offset, length):
+    f.seek(offset)
+    data = f.read(length)
+    if len(data) < length:
+        raise AtomError("Truncated box")
+    return data
+
+def _video_track_fps(f, trak, trak_end):
+    mdia = _find(f, trak, trak_end, b"mdia")
+    if mdia is None:
+        return None
+    hdlr = _find(f, *mdia, b"hdlr")
+    if hdlr is None or _read(f, hdlr[0] + 8, 4) != b"vide":
+        return None
+    mdhd = _find(f, *mdia, b"mdhd")
+    if mdhd is None:
+        return None
+    version = _read(f, mdhd[0], 1)[0]
+    # version 1 uses 64-bit creation/modification times
+    timescale_offset = mdhd[0] + (20 if version == 1 else 12)
+    timescale = struct.unpack(">I", _read(f, timescale_offset, 4))[0]
+
+    minf = _find(f, *mdia, b"minf")
+    stbl = _find(f, *minf, b"stbl") if minf else None
+    stts = _find(f, *stbl, b"stts") if stbl else None
+    if stts is None or not timescale:
+        return None
+    entry_count = struct.unpack(">I", _read(f, stts[0] + 4, 4))[0]
+    entries = _read(f, stts[0] + 8, entry_count * 8)
+    deltas = Counter()
+    for i in range(entry_count):
+        count, delta = struct.unpack_from(">II", entries, i * 8)
+        if delta:
+            deltas[delta] += count
+    if not deltas:
+        return None
+    # Like ffprobe's r_frame_rate: the rate of the most common frame duration
+    return timescale / deltas.most_common(1)[0][0]
+
+def _read_mdta(f, moov, moov_end):
+    """Apple mdta metadata under moov/meta as {key: value}."""
+    meta = _find(f, moov, moov_end, b"meta")
+    if meta is None:
+        return {}
+    start, end = meta
+    # QuickTime meta boxes start directly with child boxes, ISO ones with version/flags
+    if _read(f, start + 4, 4) not in (b"hdlr", b"keys", b"ilst"):
+        start += 4
+    keys_box = _find(f, start, end, b"keys")
+    ilst_box = _find(f, start, end, b"ilst")
+    if keys_box is None or ilst_box is None:
+        return {}
+    count = struct.unpack(">I", _read(f, keys_box[0] + 4, 4))[0]
+    keys = []
+    offset = keys_box[0] + 8
+    for _ in range(count):
+        size = struct.unpack(">I", _read(f, offset, 4))[0]
+        keys.append(_read(f, offset + 8, size - 8).decode("utf-8", "replace"))
+        offset += size
+    values = {}
+    for index, item, item_end in _boxes(f, *ilst_box):
+        key_index = struct.unpack(">I", index)[0] - 1
+        data = _find(f, item, item_end, b"data")
+        if data is None or not 0 <= key_index < len(keys):
+            continue
+        type_code = struct.unpack(">I", _read(f, data[0], 4))[0] & 0xFFFFFF
+        raw = _read(f, data[0] + 8, data[1] - data[0] - 8)
+        values[keys[key_index]] = _decode_data(type_code, raw)
+    return values
+
+def _decode_data(type_code, raw):
+    if type_code == 1:
+        return raw.decode("utf-8", "replace")
+    if type_code == 23 and len(raw) == 4:
+        return struct.unpack(">f", raw)[0]
+    if type_code == 24 and len(raw) == 8:
+        return struct.unpack(">d", raw)[0]
+    if type_code in (21, 22) and len(raw) in (1, 2, 4, 8):
+        return int.from_bytes(raw, "big", signed=type_code == 21)
+    return raw
+
+def read_frame_rate(file_path):
+    """
+    Frame rate of the first video track of a MOV/MP4 file, read from
+    moov/trak/mdia (mdhd timescale + stts durations) without decoding.
+    Apple's capture-fps metadata wins when present. Only box headers, moov
+    metadata and the stts table are read. Returns None when there is no video
+    track; raises AtomError on malformed files.
+    """
+    try:
+        return _read_frame_rate(file_path)
+    except struct.error as e:
+        raise AtomError(f"Truncated box: {e}")
+
+def _read_frame_rate(file_path):
+    with open(file_path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        moov = _find(f, 0, file_size, b"moov")
+        if moov is None:
+            raise AtomError("No moov box")
+        mdta = _read_mdta(f, *moov)
+        for key in CAPTURE_FPS_KEYS:
+            value = mdta.get(key)
+            if isinstance(value, (int, float)) and value > 0:
+                return float(value)
+        for box_type, trak, trak_end in _boxes(f, *moov):
+            if box_type == b"trak":
+                fps = _video_track_fps(f, trak, trak_end)
+                if fps:
+                    return fps
+    return None
@@ -0,0 +1,176 @@
+# core/perceptual.py
+
+import os
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from core.config import PERCEPTUAL_HASH, PERCEPTUAL_THRESHOLD, PERCEPTUAL_BATCH_SIZE, PERCEPTUAL_WORKERS, IPHONE_IMAGE_EXTS
+from core import progress
+from core.progress import cancel_token
+
+try:
+    import numpy as np
+    from PIL import Image, ImageOps
+except ImportError:
+    np = None
+    Image = None
+
+try:
+    import pillow_heif
+    pillow_heif.register_heif_opener()
+except ImportError:
+    pillow_heif = None
+
+HASH_SIZE = 8
+PHASH_SIZE = 32
+
+def available():
+    """True if NumPy and Pillow are installed (pip install numpy pillow; pillow-heif for HEIC)."""
+    return np is not None and Image is not None
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+def _load(path, algorithm):
+    """
+    Decode path to a small grayscale array, letting JPEG decode at reduced size.
+    Returns (array, (width, height)) with the original, orientation-corrected size.
+    """
+    size = (PHASH_SIZE, PHASH_SIZE) if algorithm == "phash" else (HASH_SIZE + 1, HASH_SIZE)
+    with Image.open(path) as img:
+        width, height = img.size
+        if img.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+            width, height = height, width
+        img.draft("L", (size[0] * 4, size[1] * 4))
+        img = ImageOps.exif_transpose(img)
+        gray = img.convert("L").resize(size, Image.BILINEAR, reducing_gap=2.0)
+        return np.asarray(gray, dtype=np.float32), (width, height)
+
+def _bits_to_ints(bits):
+    """(n, 64) booleans -> list of 64-bit Python ints."""
+    packed = np.packbits(bits.astype(np.uint8), axis=1)
+    return [int.from_bytes(row.tobytes(), "big") for row in packed]
+
+def hash_arrays(arrays, algorithm=PERCEPTUAL_HASH):
+    """Perceptual hashes for a batch of decoded arrays (see _load), computed in one NumPy pass."""
+    batch = np.stack(arrays)
+    if algorithm == "dhash":
+        bits = batch[:, :, 1:] > batch[:, :, :-1]
+        return _bits_to_ints(bits.reshape(len(arrays), -1))
+    dct = _dct_matrix(PHASH_SIZE)
+    coeffs = (dct @ batch @ dct.T)[:, :HASH_SIZE, :HASH_SIZE].reshape(len(arrays), -1)
+    # The DC term only encodes average brightness, so it is left out of the median
+    medians = np.median(coeffs[:, 1:], axis=1)
+    return _bits_to_ints(coeffs > medians[:, None])
+
+def compute_hashes(paths, algorithm=PERCEPTUAL_HASH, batch_size=PERCEPTUAL_BATCH_SIZE, max_workers=PERCEPTUAL_WORKERS):
+    """
+    Perceptual hash of every decodable image. Images are decoded in a thread
+    pool and hashed in batches of batch_size.
+    Returns ({path: (hash, width, height)}, [undecodable paths]).
+    """
+    results = {}
+    failed = []
+    start_time = datetime.now()
+
+    def load(path):
+        try:
+            return path, _load(path, algorithm)
+        except Exception:
+            return path, None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for offset in range(0, len(paths), batch_size):
+            cancel_token.check("perceptual")
+            decoded = []
+            for path, loaded in executor.map(load, paths[offset:offset + batch_size]):
+                if loaded is None:
+                    failed.append(path)
+                else:
+                    decoded.append((path, loaded))
+            if decoded:
+                hashes = hash_arrays([array for _, (array, _) in decoded], algorithm)
+                for (path, (_, (width, height))), value in zip(decoded, hashes):
+                    results[path] = (value, width, height)
+            done = min(offset + batch_size, len(paths))
+            progress.report("perceptual", done, len(paths), start_time, "🧮 Perceptual hash:")
+    return results, failed
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance: finds every hash within a
+    radius without comparing against all stored hashes.
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = (value, item, {})
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, item, {})
+                return
+            node = child
+
+    def search(self, value, radius):
+        """Return [(distance, item)] for every stored hash within radius of value."""
+        found = []
+        pending = [self.root] if self.root is not None else []
+        while pending:
+            node_value, item, children = pending.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                found.append((distance, item))
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    pending.append(child)
+        return found
+
+def quality_key(path, width, height):
+    """Sort key, best first: most pixels, then iPhone originals over re-exports, then largest file."""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = 0
+    original = os.path.splitext(path)[1].lower() in IPHONE_IMAGE_EXTS
+    return (-(width * height), not original, -size, path)
+
+def cluster_hashes(hashes, threshold=PERCEPTUAL_THRESHOLD):
+    """
+    Group {path: (hash, width, height)} into near-duplicate clusters. Each
+    cluster has a leader in the BK-tree; an image joins the nearest leader
+    within `threshold` bits or becomes a new leader. Matching against leaders
+    only (not transitively) keeps bursts of similar shots from chaining into
+    one cluster. Returns clusters of two or more paths, best quality first.
+    """
+    tree = BKTree()
+    clusters = {}
+    for path in sorted(hashes):
+        value = hashes[path][0]
+        matches = tree.search(value, threshold)
+        if matches:
+            clusters[min(matches)[1]].append(path)
+        else:
+            tree.add(value, path)
+            clusters[path] = [path]
+    return [
+        sorted(members, key=lambda p: quality_key(p, hashes[p][1], hashes[p][2]))
+        for members in clusters.values() if len(members) > 1
+    ]
+
+def find_near_duplicates(paths, threshold=PERCEPTUAL_THRESHOLD, algorithm=PERCEPTUAL_HASH):
+    """Hash and cluster paths. Returns (clusters, undecodable paths); see cluster_hashes."""
+    hashes, failed = compute_hashes(paths, algorithm)
+    return cluster_hashes(hashes, threshold), failed
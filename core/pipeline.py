@@ -0,0 +1,195 @@
+# core/pipeline.py
+
+import logging, queue, threading
+from datetime import datetime
+from core.config import CONVERSION_JOBS, STREAM_QUEUE_SIZE, OUTPUT_DATE_BATCH
+from core.utils import (
+    check_required_tools, required_tools, ensure_subfolder, setup_logging,
+    run_job, describe_error, reset_cancellation, cancel_running_tools
+)
+from core.exiftool import close_all_sessions
+from core import progress
+from core.progress import ConversionCancelled, cancel_token
+from core import heic_engine
+from core.journal import CompletionJournal
+from core.layout import OutputLayout
+from core.manifest import Manifest
+from core.copying import reset_copy_stats, copy_stats_summary
+from core.scanner import scan_and_deduplicate
+from core.convert_images import IMAGES_TARGET
+from core.convert_videos import VIDEOS_TARGET
+from core.convert_slowmo import SLOWMO_TARGET
+
+TARGETS = {
+    "photos": IMAGES_TARGET,
+    "videos": VIDEOS_TARGET,
+    "slowmo": SLOWMO_TARGET
+}
+
+class StreamingConverter:
+    """
+    Converts files of one category while the scan is still running.
+    submit() blocks once queue_size files are waiting, which pauses the scan
+    until the workers catch up. Output paths are chosen in submit(), in
+    submission order, by an OutputLayout (`layout`): with the date layout,
+    submitted files are held until OUTPUT_DATE_BATCH of them can have their
+    capture dates read in one exiftool call (or until flush()). on_done(checksum, src,
+    output, error, renditions) is called from the worker thread after each file.
+    """
+
+    def __init__(self, output_dir, category, subfolder, required_tools_key, process_func,
+                 filename_transform_func=None, emoji="▶️", jobs=None, queue_size=STREAM_QUEUE_SIZE,
+                 journal=None, resume=False, on_done=None):
+        check_required_tools(required_tools(required_tools_key))
+        self.category = category
+        self.subfolder = subfolder
+        self.subdir = ensure_subfolder(output_dir, subfolder)
+        self.layout = OutputLayout(self.subdir, filename_transform_func=filename_transform_func, journal=journal)
+        self.process_func = process_func
+        self.emoji = emoji
+        self.jobs = jobs or CONVERSION_JOBS.get(required_tools_key, 1)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.journal = journal
+        self.resume = resume
+        self.on_done = on_done
+        self.submitted = 0
+        self._held = []
+        self.skipped = 0
+        self.processed = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._aborted = threading.Event()
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.jobs)]
+
+    def start(self):
+        self.start_time = datetime.now()
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, src, checksum=None):
+        cancel_token.check("scan")
+        if self.resume and self.journal is not None and self.journal.is_done(checksum, [src]):
+            self.skipped += 1
+            return
+        self.submitted += 1
+        self._held.append((checksum, src))
+        if self.layout.layout != "date" or len(self._held) >= OUTPUT_DATE_BATCH:
+            self.flush()
+
+    def flush(self):
+        """Assign output paths to the held files, by source path, and queue them for conversion."""
+        held, self._held = sorted(self._held, key=lambda item: item[1]), []
+        self.layout.prefetch([src for _, src in held])
+        for checksum, src in held:
+            dst = self.layout.assign(src, checksum)
+            self.queue.put((checksum, src, dst, self.layout.thumbs_path(dst)))
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None or self._aborted.is_set():
+                return
+            if cancel_token.cancelled:
+                # Keep draining so a scan blocked in submit() is released
+                continue
+            checksum, src, dst_path_wo_ext, thumbs_wo_ext = item
+            output, error, made = run_job(
+                self.process_func, src, dst_path_wo_ext, checksum, self.journal, f"convert_{self.subfolder}", thumbs_wo_ext
+            )
+            with self._lock:
+                self.processed += 1
+                progress.report(f"convert_{self.subfolder}", self.processed, self.submitted, self.start_time, self.emoji)
+                if error is None:
+                    logging.info(f"Processed: {src} → {output}")
+                else:
+                    self.failures += 1
+                    logging.error(f"Error processing {src}: {describe_error(error)}")
+            if self.on_done is not None:
+                self.on_done(checksum, src, output, error, made)
+
+    def finish(self):
+        """Wait until everything submitted so far has been converted."""
+        self.flush()
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def abort(self):
+        self._aborted.set()
+        self._held = []
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        for _ in self._threads:
+            self.queue.put_nowait(None)
+
+def stream_scan_and_convert(source_dir, user_options, output_dir, queue_size=STREAM_QUEUE_SIZE, resume=False, **scan_kwargs):
+    """
+    Scan and convert at the same time: every file confirmed as the first copy of
+    its digest goes straight to its category's converter. The scan manifest is
+    still written as usual, with the output paths added once the conversions
+    are done. With resume=True, files the output_dir journal lists as
+    converted are skipped. Returns the same {category: manifest_path}
+    as scan_and_deduplicate.
+    """
+    log_path = setup_logging(output_dir, "log_stream")
+    journal = CompletionJournal(output_dir)
+    outputs = []
+
+    def record_output(category):
+        def on_done(checksum, src, output, error, made):
+            if error is None:
+                outputs.append((category, checksum, output, made))
+        return on_done
+
+    converters = {
+        cat: StreamingConverter(output_dir, queue_size=queue_size, journal=journal, resume=resume,
+                                on_done=record_output(cat), **target)
+        for cat, target in TARGETS.items() if user_options[cat]["include"]
+    }
+    reset_cancellation()
+    reset_copy_stats()
+    for converter in converters.values():
+        converter.start()
+
+    start_time = datetime.now()
+    try:
+        manifest_paths = scan_and_deduplicate(
+            source_dir, user_options, output_dir,
+            on_unique=lambda category, checksum, path: converters[category].submit(path, checksum),
+            **scan_kwargs
+        )
+        pending = sum(c.submitted - c.processed for c in converters.values())
+        if pending:
+            print(f"⏳ Scan finished, waiting for {pending} conversion(s)...")
+        for converter in converters.values():
+            converter.finish()
+    except (KeyboardInterrupt, ConversionCancelled):
+        print("\n🛑 Interrupted — stopping running conversions...")
+        cancel_running_tools()
+        for converter in converters.values():
+            converter.abort()
+        logging.warning("Streaming run cancelled")
+        raise
+    finally:
+        close_all_sessions()
+        heic_engine.shutdown_pool()
+        journal.close()
+        logging.shutdown()
+
+    if manifest_paths:
+        with Manifest(next(iter(manifest_paths.values()))) as manifest:
+            for category, checksum, output, made in outputs:
+                manifest.set_output(category, checksum, output, made)
+
+    for converter in converters.values():
+        skipped = f", {converter.skipped} already done" if converter.skipped else ""
+        print(f"{converter.emoji} /{converter.subfolder}: {converter.processed} file(s) processed, {converter.failures} failed{skipped}.")
+    summary = copy_stats_summary()
+    if summary:
+        print(summary)
+    print(f"✅ Done in {datetime.now() - start_time}. Log saved to {log_path}")
+    return manifest_paths
@@ -0,0 +1,87 @@
+# core/progress.py
+
+import time, threading
+from datetime import datetime, timedelta
+from core.config import PROGRESS_UPDATES_PER_SECOND
+
+class ConversionCancelled(Exception):
+    """Raised by scans and conversions once the run has been cancelled."""
+
+class CancelToken:
+    """
+    Cooperative cancellation shared by the scan and the converters.
+    cancel() sets the flag and runs the registered callbacks (e.g. killing
+    running tools); long loops call check() to stop at the next file.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+
+    def on_cancel(self, callback):
+        self._callbacks.append(callback)
+
+    def cancel(self):
+        self._event.set()
+        for callback in self._callbacks:
+            callback()
+
+    def reset(self):
+        self._event.clear()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self, what="run"):
+        if self._event.is_set():
+            raise ConversionCancelled(what)
+
+cancel_token = CancelToken()
+
+def console_printer(event):
+    """Default subscriber: one self-overwriting terminal line per stage."""
+    print(f"{event['label']} {event['done']}/{event['total']} ({event['percent']:.1f}%) — "
+          f"Elapsed: {event['elapsed']} — ETA: ~{event['eta']}", end="\r")
+
+_subscribers = [console_printer]
+_last_publish = {}
+_lock = threading.Lock()
+
+def subscribe(callback):
+    """Receive progress events (dicts with stage, label, done, total, percent, elapsed, eta)."""
+    with _lock:
+        _subscribers.append(callback)
+
+def unsubscribe(callback):
+    with _lock:
+        if callback in _subscribers:
+            _subscribers.remove(callback)
+
+def report(stage, done, total, start_time, label, force=False):
+    """
+    Publish progress for a stage, at most PROGRESS_UPDATES_PER_SECOND times
+    per second. The last update (done == total) and forced ones always go out.
+    Cheap enough to call for every file.
+    """
+    now = time.monotonic()
+    with _lock:
+        if not force and done < total and now - _last_publish.get(stage, 0.0) < 1.0 / PROGRESS_UPDATES_PER_SECOND:
+            return
+        _last_publish[stage] = now
+        subscribers = list(_subscribers)
+    if not total:
+        return
+    elapsed = datetime.now() - start_time
+    remaining = (elapsed.total_seconds() / done) * (total - done) if done else 0
+    event = {
+        "stage": stage,
+        "label": label,
+        "done": done,
+        "total": total,
+        "percent": done / total * 100,
+        "elapsed": elapsed,
+        "eta": timedelta(seconds=int(remaining))
+    }
+    for callback in subscribers:
+        callback(event)
@@ -0,0 +1,118 @@
+# core/renditions.py
+
+import os, shutil, logging, threading
+from core.config import (
+    THUMBNAIL_SIZES, THUMBNAIL_QUALITY, VIDEO_POSTER_AT, VIDEO_POSTER_SIZE, VIDEO_PREVIEW_HEIGHT
+)
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+_local = threading.local()
+
+def begin(base):
+    """
+    Start collecting renditions for the file the calling thread converts.
+    base is the path prefix they are written to (None: no renditions wanted);
+    run_job() sets it to the .partial name of the file's thumbs/ counterpart.
+    """
+    _local.base = base
+    _local.made = {}
+    _local.pending = {}
+
+def target():
+    """Path prefix renditions of the current file go to, or None when none are wanted."""
+    return getattr(_local, "base", None)
+
+def record(kind, path):
+    _local.made[kind] = path
+
+def end():
+    """Return {kind: path} of the renditions written since begin() and stop collecting."""
+    made = getattr(_local, "made", {})
+    _local.base, _local.made, _local.pending = None, {}, {}
+    return made
+
+def render_thumbnails(im, base, sizes=THUMBNAIL_SIZES, quality=THUMBNAIL_QUALITY):
+    """
+    Save thumbnails of an already decoded, upright Pillow image, each one
+    scaled down from the previous (larger) one. Returns {kind: path}.
+    Also used inside the pillow-heif worker processes.
+    """
+    made = {}
+    thumb = im if im.mode in ("RGB", "L") else im.convert("RGB")
+    for size in sorted(sizes, reverse=True):
+        thumb = thumb.copy()
+        thumb.thumbnail((size, size), Image.LANCZOS)
+        path = f"{base}_{size}.jpg"
+        thumb.save(path, "JPEG", quality=quality)
+        made[f"thumb_{size}"] = path
+    return made
+
+def thumbnails_from_file(path, run_tool):
+    """
+    Thumbnails for an image that was not decoded by the conversion (copied
+    as-is, or converted by heif-convert): Pillow decodes JPEGs at reduced size,
+    otherwise one ffmpeg call writes every size.
+    """
+    base = target()
+    if base is None or _local.made:
+        return
+    if Image is not None:
+        try:
+            with Image.open(path) as im:
+                im.draft("RGB", (max(THUMBNAIL_SIZES), max(THUMBNAIL_SIZES)))
+                _local.made.update(render_thumbnails(ImageOps.exif_transpose(im), base))
+            return
+        except OSError as e:
+            logging.warning(f"Pillow cannot decode {path} for thumbnails ({e}), trying ffmpeg")
+    if shutil.which("ffmpeg") is None:
+        logging.warning(f"No thumbnails for {path}: needs Pillow (pip install pillow) or ffmpeg")
+        return
+    sizes = sorted(THUMBNAIL_SIZES, reverse=True)
+    graph = f"[0:v]split={len(sizes)}" + "".join(f"[s{i}]" for i in range(len(sizes)))
+    graph += "".join(
+        f";[s{i}]scale={size}:{size}:force_original_aspect_ratio=decrease[t{i}]" for i, size in enumerate(sizes)
+    )
+    cmd = ["ffmpeg", "-nostdin", "-y", "-i", path, "-filter_complex", graph]
+    for i, size in enumerate(sizes):
+        cmd += ["-map", f"[t{i}]", "-frames:v", "1", "-update", "1", "-q:v", "3", f"{base}_{size}.jpg"]
+    run_tool(cmd)
+    for size in sizes:
+        record(f"thumb_{size}", f"{base}_{size}.jpg")
+
+def video_output_args(duration=None, video_input=0, audio_input=0):
+    """
+    Extra ffmpeg outputs (poster JPEG and low-res MP4 preview) to append to the
+    conversion's own command, so they come from the same decode. Empty when no
+    renditions are wanted. Call record_video_outputs() once the command succeeded.
+    """
+    base = target()
+    if base is None:
+        return []
+    at = VIDEO_POSTER_AT if not duration else min(VIDEO_POSTER_AT, duration / 2)
+    poster, preview = f"{base}_poster.jpg", f"{base}_preview.mp4"
+    _local.pending = {"poster": poster, "preview": preview}
+    return [
+        "-map", f"{video_input}:v:0", "-ss", f"{at:.3f}", "-frames:v", "1", "-update", "1",
+        "-vf", f"scale={VIDEO_POSTER_SIZE}:{VIDEO_POSTER_SIZE}:force_original_aspect_ratio=decrease", "-q:v", "3", poster,
+        "-map", f"{video_input}:v:0", "-map", f"{audio_input}:a?", "-vf", f"scale=-2:'min({VIDEO_PREVIEW_HEIGHT},ih)'",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "28", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", "96k", "-movflags", "+faststart", preview
+    ]
+
+def record_video_outputs():
+    for kind, path in getattr(_local, "pending", {}).items():
+        if os.path.exists(path):
+            record(kind, path)
+    _local.pending = {}
+
+def video_from_file(path, run_tool, duration=None):
+    """Poster and preview for a video that was copied as-is (one ffmpeg call, one decode)."""
+    extra = video_output_args(duration)
+    if not extra:
+        return
+    run_tool(["ffmpeg", "-nostdin", "-y", "-i", path] + extra)
+    record_video_outputs()
@@ -1,44 +1,246 @@
 import os
-import hashlib
-import json
+import shutil
 import subprocess
-from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
+from core.checksum_cache import ChecksumCache
+from core.io_scheduler import IOScheduler, describe_device
+from core.manifest import Manifest
+from core import metrics, progress, perceptual
+from core.progress import cancel_token
+from core.exiftool import get_frame_rate, ExifToolError
+from core.walker import walk_files
+from core.mp4_atoms import read_frame_rate, AtomError, ISO_BMFF_EXTS
+from core.hashing import new_hasher, format_digest, synthetic_key, hash_file, update_from_file, check_algorithm
 from core.config import (
     IPHONE_IMAGE_EXTS,
     NON_IPHONE_IMAGE_EXTS,
     IPHONE_VIDEO_EXTS,
     NON_IPHONE_VIDEO_EXTS,
-    SLOWMO_FPS_THRESHOLD
+    SLOWMO_FPS_THRESHOLD,
+    DEDUP_EDGE_BYTES,
+    CHECKSUM_CACHE_PATH,
+    HASH_ALGORITHM,
+    HASH_READ_SIZE,
+    HASH_PROCESSES,
+    SLOWMO_PROBE_WORKERS,
+    WALK_EXCLUDE,
+    PERCEPTUAL_DEDUP,
+    PERCEPTUAL_THRESHOLD
 )
 
+def _ffprobe_fps(file_path):
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "stream=r_frame_rate", "-of", "default=noprint_wrappers=1:nokey=1", file_path],
+        capture_output=True,
+        text=True
+    )
+    raw = result.stdout.strip()
+    if '/' in raw:
+        num, denom = map(int, raw.split('/'))
+        return num / denom
+    return float(raw)
+
+def get_fps(file_path):
+    """
+    Frame rate of a video. MOV/MP4 files are read directly with the box parser
+    in core/mp4_atoms.py; other containers, or files it cannot parse, go
+    through the persistent exiftool session and finally ffprobe.
+    """
+    if os.path.splitext(file_path)[1].lower() in ISO_BMFF_EXTS:
+        try:
+            fps = read_frame_rate(file_path)
+            if fps:
+                return fps
+        except (AtomError, OSError):
+            pass
+    if shutil.which("exiftool"):
+        try:
+            fps = get_frame_rate(file_path)
+            if fps:
+                return float(fps)
+        except ExifToolError:
+            pass
+    return _ffprobe_fps(file_path)
+
 def is_slowmo_by_fps(file_path, threshold=SLOWMO_FPS_THRESHOLD):
+    """True/False by frame rate, or None when no method could read the frame rate."""
     try:
-        result = subprocess.run(
-            ["ffprobe", "-v", "error", "-select_streams", "v:0",
-             "-show_entries", "stream=r_frame_rate", "-of", "default=noprint_wrappers=1:nokey=1", file_path],
-            capture_output=True,
-            text=True
-        )
-        raw = result.stdout.strip()
-        if '/' in raw:
-            num, denom = map(int, raw.split('/'))
-            fps = num / denom
-        else:
-            fps = float(raw)
+        return get_fps(file_path) > threshold
+    except Exception:
+        return None
+
+def compute_digest(file_path, algorithm=HASH_ALGORITHM, read_size=HASH_READ_SIZE):
+    return (file_path, format_digest(algorithm, hash_file(file_path, algorithm, read_size)))
 
-        return fps > threshold
-    except Exception as e:
-        print(f"⚠️ Could not read fps for {file_path}: {e}")
-        return False
+def compute_md5(file_path, chunk_size=HASH_READ_SIZE):
+    return compute_digest(file_path, "md5", chunk_size)
 
-def compute_md5(file_path, chunk_size=8192):
-    hash_md5 = hashlib.md5()
+def compute_edge_digest(file_path, size, edge_size=DEDUP_EDGE_BYTES, algorithm=HASH_ALGORITHM, read_size=HASH_READ_SIZE):
+    """
+    Hash the first and last edge_size bytes of a file, prefixed by its size.
+    Files no larger than 2 * edge_size are hashed whole, so the result equals compute_digest.
+    Returns (file_path, digest, is_full).
+    """
+    if size <= 2 * edge_size:
+        return compute_digest(file_path, algorithm, read_size) + (True,)
+
+    hasher = new_hasher(algorithm, size.to_bytes(8, "little"))
     with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(chunk_size), b""):
-            hash_md5.update(chunk)
-    return (file_path, hash_md5.hexdigest())
+        update_from_file(hasher, f, edge_size, read_size)
+        f.seek(-edge_size, os.SEEK_END)
+        update_from_file(hasher, f, edge_size, read_size)
+    return (file_path, format_digest(algorithm, hasher.hexdigest()), False)
+
+def _cached_digest(cache, path, kind, file_stats):
+    return cache.get(path, kind, file_stats[path]) if cache is not None else None
+
+def find_duplicate_digests(file_list, max_workers=None, edge_size=DEDUP_EDGE_BYTES, cache=None,
+                           algorithm=HASH_ALGORITHM, read_size=HASH_READ_SIZE, use_processes=HASH_PROCESSES,
+                           on_settled=None, file_stats=None):
+    """
+    Assign a digest to every file, reading as little data as possible:
+      1. files with a unique size cannot have a duplicate and are not read at all;
+      2. files sharing a size are hashed on their first/last edge_size bytes;
+      3. files still colliding after that get a full-content hash.
+    Files settled by stage 1 or 2 get a synthetic key ("size:..." or
+    "partial:...", see core/hashing.py) derived from their size or partial hash
+    instead of the full digest, so they are never mistaken for checksums.
+    Files read in full (stage 3, or small files in stage 2) get the plain content digest.
+    Reads go through an IOScheduler, which limits and tunes the concurrency
+    of each source device; max_workers only caps the shared pool.
+    use_processes hashes in a process pool instead of threads, which helps
+    CPU-bound algorithms on fast storage.
+    With a ChecksumCache, partial and full digests of unchanged files are taken
+    from the cache instead of being read again, and count as skipped bytes.
+    Size groups are resolved as soon as all their partial hashes are in, so
+    on_settled(path, digest) is called for each file the moment its digest is final.
+    file_stats ({path: os.stat_result}, e.g. from walk_files) avoids stat'ing again.
+    Returns (digests, stats) where digests maps path -> digest and stats maps
+    stage -> {"files": n, "bytes_read": n, "bytes_skipped": n}.
+    """
+    stats = {stage: {"files": 0, "bytes_read": 0, "bytes_skipped": 0} for stage in ["size", "partial", "full"]}
+    digests = {}
+    partial_kind = f"edge{edge_size}:{algorithm}"
+
+    def settle(path, digest, stage, bytes_read):
+        size = file_stats[path].st_size
+        digests[path] = digest
+        stats[stage]["files"] += 1
+        stats[stage]["bytes_read"] += bytes_read
+        stats[stage]["bytes_skipped"] += size - bytes_read
+        if on_settled is not None:
+            on_settled(path, digest)
+
+    if file_stats is None:
+        file_stats = {path: os.stat(path) for path in file_list}
+    by_size = {}
+    for path in file_list:
+        by_size.setdefault(file_stats[path].st_size, []).append(path)
+
+    # partial results per size group: {size: {path: (digest, is_full, bytes_read)}}
+    partial = {size: {} for size, paths in by_size.items() if len(paths) > 1}
+    # full-hash groups still waiting for results: {size: {"paths": [...], "results": {path: (digest, bytes_read)}}}
+    full = {}
+    for size, paths in by_size.items():
+        if len(paths) == 1:
+            size_digest = format_digest(algorithm, new_hasher(algorithm, f"size:{size}".encode()).hexdigest())
+            settle(paths[0], synthetic_key("size", size_digest), "size", 0)
+
+    with IOScheduler(max_workers, use_processes) as scheduler:
+        futures = {}
+
+        def resolve_group(size):
+            results = partial.pop(size)
+            by_partial = {}
+            for path in by_size[size]:
+                by_partial.setdefault(results[path][0], []).append(path)
+            colliding = []
+            for path in by_size[size]:
+                digest, is_full, bytes_read = results[path]
+                if is_full:
+                    settle(path, digest, "partial", bytes_read)
+                elif len(by_partial[digest]) == 1:
+                    settle(path, synthetic_key("partial", digest), "partial", bytes_read)
+                else:
+                    colliding.append(path)
+            if not colliding:
+                return
+            full[size] = {"paths": colliding, "results": {}}
+            for path in colliding:
+                cached = _cached_digest(cache, path, algorithm, file_stats)
+                if cached is not None:
+                    full[size]["results"][path] = (cached, 0)
+                else:
+                    st = file_stats[path]
+                    futures[scheduler.submit(st.st_dev, st.st_size, compute_digest, path, algorithm, read_size)] = "full"
+            settle_full_group(size)
+
+        def settle_full_group(size):
+            # Settle in walk order once the whole group is hashed, so the first
+            # copy of a digest does not depend on thread completion order
+            group = full[size]
+            if len(group["results"]) < len(group["paths"]):
+                return
+            del full[size]
+            for path in group["paths"]:
+                digest, bytes_read = group["results"][path]
+                settle(path, digest, "full", bytes_read)
+
+        for size in list(partial):
+            for path in by_size[size]:
+                cached = _cached_digest(cache, path, partial_kind, file_stats)
+                if cached is not None:
+                    partial[size][path] = (cached, size <= 2 * edge_size, 0)
+                else:
+                    futures[scheduler.submit(
+                        file_stats[path].st_dev, min(size, 2 * edge_size),
+                        compute_edge_digest, path, size, edge_size, algorithm, read_size
+                    )] = "partial"
+            if len(partial[size]) == len(by_size[size]):
+                resolve_group(size)
+
+        start_time = datetime.now()
+        done_count = 0
+        while futures:
+            if cancel_token.cancelled:
+                scheduler.shutdown(wait=False, cancel_futures=True)
+                cancel_token.check("hash")
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = futures.pop(future)
+                path, digest, *rest = future.result()
+                size = file_stats[path].st_size
+                if stage == "partial":
+                    is_full = rest[0]
+                    if cache is not None:
+                        cache.put(path, partial_kind, file_stats[path], digest)
+                    partial[size][path] = (digest, is_full, size if is_full else 2 * edge_size)
+                    if len(partial[size]) == len(by_size[size]):
+                        resolve_group(size)
+                else:
+                    if cache is not None:
+                        cache.put(path, algorithm, file_stats[path], digest)
+                    full[size]["results"][path] = (digest, size)
+                    settle_full_group(size)
+                done_count += 1
+                progress.report("hash", done_count, done_count + len(futures), start_time, "🧮 Hashing:")
+        if done_count:
+            print()
+            limits = ", ".join(f"{describe_device(dev)} → {limit}" for dev, limit in scheduler.limits().items())
+            print(f"💽 Concurrent reads per device: {limits}")
+        if cache is not None:
+            cache.commit()
+
+    return digests, stats
+
+def print_dedup_stats(stats):
+    for stage, label in [("size", "Size grouping"), ("partial", "Partial hash"), ("full", "Full hash")]:
+        s = stats[stage]
+        print(f"   {label:<13}: {s['files']} files settled — read {s['bytes_read'] / 1e6:.1f} MB, skipped {s['bytes_skipped'] / 1e6:.1f} MB")
 
 def classify_file(file_path):
     ext = os.path.splitext(file_path)[1].lower()
@@ -49,63 +251,184 @@ def classify_file(file_path):
         return "slowmo" if is_slowmo_by_fps(file_path) else "videos"
     return None
 
-def scan_and_deduplicate(source_dir, user_options, output_dir, max_workers=3):
-    print("🔍 Scanning files...")
-    file_list = []
-    for root, _, files in os.walk(source_dir):
-        for name in files:
-            file_list.append(os.path.join(root, name))
-
-    checksum_map = {
-        "photos": {},
-        "videos": {},
-        "slowmo": {}
-    }
-
-    total = len(file_list)
-    start_time = datetime.now()
+def _is_iphone_ext(ext):
+    return ext in IPHONE_IMAGE_EXTS or ext in IPHONE_VIDEO_EXTS
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(compute_md5, path): path for path in file_list}
+def _is_wanted(category, ext, user_options):
+    opt = user_options[category]
+    return opt["include"] and (_is_iphone_ext(ext) or opt["include_non_iphone"])
 
-        for idx, future in enumerate(as_completed(futures), start=1):
-            file_path, checksum = future.result()
-            category = classify_file(file_path)
+def is_candidate(file_path, user_options):
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in IPHONE_IMAGE_EXTS or ext in NON_IPHONE_IMAGE_EXTS:
+        return _is_wanted("photos", ext, user_options)
+    if ext in IPHONE_VIDEO_EXTS or ext in NON_IPHONE_VIDEO_EXTS:
+        return _is_wanted("videos", ext, user_options) or _is_wanted("slowmo", ext, user_options)
+    return False
 
-            if category is None:
-                continue
+def filter_candidates(file_list, user_options):
+    """
+    Cheap extension/user_options filter, run before any file is opened.
+    Returns (photos, videos): photos are final, videos still need slow-motion probing.
+    A video is kept if either "videos" or "slowmo" would accept it.
+    """
+    photos, videos = [], []
+    for file_path in file_list:
+        if not is_candidate(file_path, user_options):
+            continue
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext in IPHONE_IMAGE_EXTS or ext in NON_IPHONE_IMAGE_EXTS:
+            photos.append(file_path)
+        else:
+            videos.append(file_path)
+    return photos, videos
 
-            if not user_options[category]["include"]:
-                continue
+def classify_videos(video_paths, user_options, max_workers=SLOWMO_PROBE_WORKERS):
+    """
+    Probe videos for slow motion in a bounded pool and return {path: category}
+    for the videos whose category the user selected. Videos whose frame rate
+    cannot be read are treated as normal videos and listed in a warning.
+    """
+    categories = {}
+    unreadable = []
+    if not video_paths:
+        return categories
+    start_time = datetime.now()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(is_slowmo_by_fps, path): path for path in video_paths}
+        for idx, future in enumerate(as_completed(futures), start=1):
+            path = futures[future]
+            slowmo = future.result()
+            if slowmo is None:
+                unreadable.append(path)
+            category = "slowmo" if slowmo else "videos"
+            if _is_wanted(category, os.path.splitext(path)[1].lower(), user_options):
+                categories[path] = category
+            progress.report("classify", idx, len(video_paths), start_time, "🧮 Slow-motion probe:")
+            if cancel_token.cancelled:
+                executor.shutdown(wait=False, cancel_futures=True)
+                cancel_token.check("classify")
+    print()
+    if unreadable:
+        print(f"⚠️ Could not read the frame rate of {len(unreadable)} video(s); treated as normal videos:")
+        for path in sorted(unreadable)[:10]:
+            print(f"   {path}")
+        if len(unreadable) > 10:
+            print(f"   ... and {len(unreadable) - 10} more")
+    return categories
 
-            ext = os.path.splitext(file_path)[1].lower()
-            is_iphone = (
-                ext in IPHONE_IMAGE_EXTS or ext in IPHONE_VIDEO_EXTS
-            )
+def print_phase_timings(timings):
+    total = sum(timings.values())
+    parts = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in timings.items())
+    print(f"⏱️ Phases: {parts} (total {total:.2f}s)")
 
-            if not is_iphone and not user_options[category]["include_non_iphone"]:
-                continue
+def find_near_duplicate_photos(manifest_path, threshold=PERCEPTUAL_THRESHOLD):
+    """Cluster the unique photos of a manifest by perceptual hash and record the clusters in it."""
+    if not perceptual.available():
+        print("⚠️ Near-duplicate detection needs NumPy and Pillow (pip install numpy pillow), skipped.")
+        return
+    with Manifest(manifest_path) as manifest:
+        digests = {paths[0]: digest for digest, paths in manifest.groups("photos")}
+        print(f"🔎 Looking for near-duplicates among {len(digests)} photos...")
+        clusters, failed = perceptual.find_near_duplicates(sorted(digests), threshold)
+        manifest.add_clusters("photos", [[digests[path] for path in cluster] for cluster in clusters])
+    skipped = sum(len(cluster) - 1 for cluster in clusters)
+    print(f"🔎 {len(clusters)} near-duplicate clusters, {skipped} photos skipped in favour of a better copy.")
+    if failed:
+        print(f"⚠️ {len(failed)} photos could not be decoded for perceptual hashing and are kept as-is.")
 
-            checksum_map[category].setdefault(checksum, []).append(file_path)
+def scan_and_deduplicate(source_dir, user_options, output_dir, max_workers=None, cache_path=CHECKSUM_CACHE_PATH,
+                         algorithm=HASH_ALGORITHM, read_size=HASH_READ_SIZE, use_processes=HASH_PROCESSES,
+                         probe_workers=SLOWMO_PROBE_WORKERS, on_unique=None, exclude=WALK_EXCLUDE,
+                         near_duplicates=PERCEPTUAL_DEDUP, threshold=PERCEPTUAL_THRESHOLD):
+    """
+    Walk source_dir (skipping `exclude` subtrees), keep the files selected in user_options, deduplicate them
+    and append the results to a SQLite manifest under output_dir/data/<timestamp>/ (see core/manifest.py).
+    on_unique(category, digest, path) is called from the scanning thread as soon
+    as a file is confirmed as the first copy of its digest; that path is also
+    the first path of its digest in the manifest.
+    With near_duplicates, photos whose perceptual hashes are within `threshold`
+    bits are clustered afterwards and only the best of each cluster is left for
+    the converters (see core/perceptual.py).
+    Returns {category: manifest_path} for the included categories.
+    """
+    check_algorithm(algorithm)
+    timings = {}
+    print("🔍 Scanning files...")
+    phase_start = time.perf_counter()
+    # Extension filtering happens while walking, so only candidates are kept in memory
+    file_stats = {}
+    found = 0
+    for path, st in walk_files(source_dir, exclude=exclude):
+        cancel_token.check("walk")
+        found += 1
+        if is_candidate(path, user_options):
+            file_stats[path] = st
+    timings["walk"] = time.perf_counter() - phase_start
 
-            elapsed = datetime.now() - start_time
-            percent = (idx / total) * 100
-            print(f"🧮 {idx}/{total} files ({percent:.1f}%) — Elapsed: {elapsed} — ETA: ~{timedelta(seconds=int((elapsed.total_seconds()/idx)*(total - idx)))}", end="\r")
+    phase_start = time.perf_counter()
+    # Sorted so the first copy of a digest does not depend on walk order
+    photos, videos = filter_candidates(sorted(file_stats), user_options)
+    timings["filter"] = time.perf_counter() - phase_start
+    print(f"🗂️ {found} files found, {len(photos)} photos and {len(videos)} videos selected.")
+
+    phase_start = time.perf_counter()
+    categories = {path: "photos" for path in photos}
+    categories.update(classify_videos(videos, user_options, probe_workers))
+    candidates = [path for path in sorted(file_stats) if path in categories]
+    timings["classify"] = time.perf_counter() - phase_start
 
-    print("\n✅ Scan complete. Writing JSON files...")
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    data_root = os.path.join(output_dir, "data")
-    json_subdir = os.path.join(data_root, timestamp)
-    os.makedirs(json_subdir, exist_ok=True)
-    json_paths = {}
+    manifest_dir = os.path.join(output_dir, "data", timestamp)
+    os.makedirs(manifest_dir, exist_ok=True)
+    manifest_path = os.path.join(manifest_dir, f"manifest_{timestamp}.sqlite")
+    manifest = Manifest(manifest_path)
 
-    for cat in ["photos", "videos", "slowmo"]:
-        if not user_options[cat]["include"]:
-            continue
-        output_path = os.path.join(json_subdir, f"{cat}_{timestamp}.json")
-        with open(output_path, "w") as f:
-            json.dump(checksum_map[cat], f, indent=2)
-        json_paths[cat] = output_path
-        print(f"📄 Saved {os.path.basename(output_path)} with {len(checksum_map[cat])} unique files.")
+    def add_to_manifest(file_path, checksum):
+        category = categories[file_path]
+        if manifest.add(category, checksum, file_path) and on_unique is not None:
+            on_unique(category, checksum, file_path)
+
+    phase_start = time.perf_counter()
+    cache = ChecksumCache(cache_path) if cache_path else None
+    try:
+        _, stats = find_duplicate_digests(
+            candidates, max_workers=max_workers, cache=cache,
+            algorithm=algorithm, read_size=read_size, use_processes=use_processes,
+            on_settled=add_to_manifest, file_stats=file_stats
+        )
+        # Forget files moved or deleted under this root since earlier runs, so the shared cache stays bounded
+        pruned = cache.prune(source_dir, {os.path.abspath(path) for path in file_stats}) if cache is not None else 0
+    finally:
+        if cache is not None:
+            cache.close()
+        manifest.close()
+    timings["hash"] = time.perf_counter() - phase_start
+
+    print(f"📊 Dedup stages ({algorithm}):")
+    print_dedup_stats(stats)
+    if cache is not None:
+        print(f"   Checksum cache: {cache.hits} hits, {cache.misses} misses, {cache.invalidated + pruned} stale entries dropped")
+    if near_duplicates and user_options["photos"]["include"]:
+        phase_start = time.perf_counter()
+        find_near_duplicate_photos(manifest_path, threshold)
+        timings["perceptual"] = time.perf_counter() - phase_start
+    print("✅ Scan complete.")
+    phase_start = time.perf_counter()
+    manifest_paths = {}
+    with Manifest(manifest_path) as manifest:
+        counts = []
+        for cat in ["photos", "videos", "slowmo"]:
+            if not user_options[cat]["include"]:
+                continue
+            manifest_paths[cat] = manifest_path
+            counts.append(f"{manifest.count(cat)} {cat}")
+    print(f"📄 Saved {os.path.basename(manifest_path)} (unique files: {', '.join(counts)}).")
+    timings["manifest"] = time.perf_counter() - phase_start
+    print_phase_timings(timings)
+    phase_files = {"walk": found, "filter": len(file_stats), "classify": len(videos), "hash": len(candidates), "manifest": len(candidates), "perceptual": len(photos)}
+    phase_bytes = {"hash": sum(s["bytes_read"] for s in stats.values())}
+    for phase, seconds in timings.items():
+        metrics.event(f"scan_{phase}", seconds, nbytes=phase_bytes.get(phase, 0), files=phase_files.get(phase))
 
-    return json_paths
+    return manifest_paths
@@ -1,8 +1,28 @@
 # core/utils.py
 
-import os, shutil, subprocess, logging, json
-from core.config import OUTPUT_VIDEO_EXT, LOG_FORMAT, REQUIRED_TOOLS, OUTPUT_IMAGE_EXT
-from datetime import datetime, timedelta
+import os, glob, time, shutil, subprocess, logging, threading, signal
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from core.config import OUTPUT_VIDEO_EXT, LOG_FORMAT, REQUIRED_TOOLS, OUTPUT_IMAGE_EXT, CONVERSION_JOBS, PARTIAL_SUFFIX, VIDEO_POLICY, JPEG_QUALITY, CONVERSION_READ_AHEAD, OUTPUT_DATE_BATCH, VIDEO_SEGMENTED
+from core.exiftool import close_all_sessions
+from core.metadata import preserve_metadata
+from core import heic_engine, renditions
+from core.journal import CompletionJournal
+from core.manifest import Manifest, open_manifest
+from core.layout import OutputLayout
+from core import metrics, progress
+from core.progress import ConversionCancelled, cancel_token
+from core.copying import smart_copy, reset_copy_stats, copy_stats_summary
+from core.io_scheduler import device_slots
+from core.video_planner import (
+    REENCODE, probe_streams, probe_duration, plan_conversion, plan_segments, video_timescale, build_ffmpeg_command,
+    build_split_command, build_segment_encode_command, build_concat_command
+)
+from datetime import datetime
+
+_children = set()
+_children_lock = threading.Lock()
 
 def create_timestamped_log_path(output_dir, prefix):
     """
@@ -78,40 +98,248 @@ def check_required_tools(required_tools):
         print(f"❌ Missing required tool(s): {', '.join(missing)}")
         exit(1)
 
+def run_tool(cmd, tools=None):
+    """
+    Run an external tool like subprocess.run(cmd, check=True).
+    The child runs in its own process group, registered so cancel_running_tools()
+    can kill it, and its stderr is captured so parallel jobs don't interleave
+    on the terminal. Exit code and peak RSS are reported to core/metrics.py,
+    for the file whose collector is `tools` (default: the calling thread's).
+    """
+    if cancel_token.cancelled:
+        raise ConversionCancelled(cmd[0])
+    proc = subprocess.Popen(
+        cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, start_new_session=True
+    )
+    with _children_lock:
+        _children.add(proc)
+    peak_rss = None
+    try:
+        stderr = proc.stderr.read()
+        proc.stderr.close()
+        try:
+            # wait4 reaps the child like proc.wait() and also reports its peak RSS (KiB on Linux)
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            peak_rss = usage.ru_maxrss * 1024
+        except ChildProcessError:
+            proc.wait()
+    finally:
+        with _children_lock:
+            _children.discard(proc)
+    metrics.record_tool(os.path.basename(cmd[0]), proc.returncode, peak_rss, tools)
+    if cancel_token.cancelled:
+        raise ConversionCancelled(cmd[0])
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr)
+
+def reset_cancellation():
+    """Allow run_tool() to start tools again after cancel_running_tools()."""
+    cancel_token.reset()
+
+def _kill_running_tools():
+    with _children_lock:
+        children = list(_children)
+    for proc in children:
+        # Not poll(): reaping here would race with the wait4() in run_tool
+        if proc.returncode is None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+    close_all_sessions(force=True)
+    heic_engine.shutdown_pool(kill=True)
+
+cancel_token.on_cancel(_kill_running_tools)
+
+def cancel_running_tools():
+    """
+    Cancel the run: scans and conversion loops stop at their next file, and
+    the tools currently running (ffmpeg, heif-convert, exiftool) are killed.
+    Safe to call from any thread, e.g. a GUI stop button.
+    """
+    cancel_token.cancel()
+
+def source_slot(src_path):
+    """
+    Slot of src_path's device (see core/io_scheduler.py) to hold while a job
+    reads the file, so parallel jobs don't thrash a spinning disk.
+    """
+    st = os.stat(src_path)
+    return device_slots.slot(st.st_dev, st.st_size)
+
 def copy_file(src_path, dst_path):
-    shutil.copy2(src_path, dst_path)
+    """
+    Pass-through copy, holding a slot of the source device. Writes land in
+    the page cache, so the destination flushes while the next read runs.
+    """
+    with source_slot(src_path):
+        smart_copy(src_path, dst_path)
+    return dst_path
+
+def copy_with_renditions(src_path, dst_path, video=False):
+    """
+    copy_file() for pass-through files, plus their renditions when wanted.
+    Nothing decodes these files otherwise, so this is their only decode.
+    """
+    copy_file(src_path, dst_path)
+    if renditions.target():
+        if video:
+            renditions.video_from_file(dst_path, run_tool, probe_duration(dst_path))
+        else:
+            renditions.thumbnails_from_file(dst_path, run_tool)
+    return dst_path
+
+# Video conversions in progress, so concurrent segmented encodes share the cores
+_active_videos = 0
+_active_videos_lock = threading.Lock()
+
+def idle_cores():
+    """CPU cores not busy according to the 1-minute load average (at least 1)."""
+    cores = os.cpu_count() or 1
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        load = 0.0
+    return max(1, cores - int(load))
 
-def convert_mov_to_mp4(src_path, dst_path_without_ext):
+def encode_segmented(src_path, dst_mp4, streams, duration, segments, cores=None):
+    """
+    Re-encode a long video in parallel: split it at keyframes with stream copy,
+    encode the pieces concurrently (sharing `cores`, all of them by default) and concatenate
+    them without re-encoding, adding the source audio and metadata at the end.
+    Intermediate files live in <dst>.segments/ and are removed afterwards.
+    """
+    work_dir = dst_mp4 + ".segments"
+    os.makedirs(work_dir, exist_ok=True)
+    timescale = video_timescale(streams)
+    try:
+        segment_list = os.path.join(work_dir, "segments.txt")
+        run_tool(build_split_command(src_path, os.path.join(work_dir, "segment_%03d.mov"), segment_list, duration, segments))
+        with open(segment_list) as f:
+            pieces = [os.path.join(work_dir, os.path.basename(line.strip())) for line in f if line.strip()]
+        encoded = [os.path.splitext(piece)[0] + OUTPUT_VIDEO_EXT for piece in pieces]
+        threads = max(1, (cores or os.cpu_count() or 1) // len(pieces))
+        # The pool threads report their encodes to this file's metrics
+        tools = metrics.current_file()
+        with ThreadPoolExecutor(max_workers=len(pieces)) as executor:
+            futures = [
+                executor.submit(run_tool, build_segment_encode_command(piece, out, threads, timescale), tools)
+                for piece, out in zip(pieces, encoded)
+            ]
+            for future in futures:
+                future.result()
+        concat_list = os.path.join(work_dir, "concat.txt")
+        with open(concat_list, "w") as f:
+            # Relative entries are resolved against the list's own directory
+            f.writelines(f"file '{os.path.basename(out)}'\n" for out in encoded)
+        run_tool(build_concat_command(
+            concat_list, src_path, dst_mp4, timescale, renditions.video_output_args(duration, audio_input=1)
+        ))
+        renditions.record_video_outputs()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def convert_mov_to_mp4(src_path, dst_path_without_ext, policy=VIDEO_POLICY, segmented=VIDEO_SEGMENTED):
+    """
+    Convert a video to MP4, remuxing instead of re-encoding whenever the codecs
+    allow it (see core/video_planner.py). The chosen path is logged per file.
+    With segmented=True, long videos that need re-encoding are encoded in
+    parallel segments (see encode_segmented); the cores are split between the
+    videos converting at the same time, so parallel jobs don't oversubscribe the CPU.
+    If the segmented path fails, the video is encoded again in a single pass.
+    Metadata is checked once at the end.
+    Renditions (poster, preview) are extra outputs of the same ffmpeg run.
+    Remuxes are mostly I/O and hold a slot of the source device like copies;
+    re-encodes don't, since they read at encoding speed for minutes and would
+    keep other jobs off a spinning disk for that long.
+    """
+    global _active_videos
+    with _active_videos_lock:
+        _active_videos += 1
+    try:
+        return _convert_mov_to_mp4(src_path, dst_path_without_ext, policy, segmented)
+    finally:
+        with _active_videos_lock:
+            _active_videos -= 1
+
+def _convert_mov_to_mp4(src_path, dst_path_without_ext, policy, segmented):
     dst_mp4 = dst_path_without_ext + OUTPUT_VIDEO_EXT
-    subprocess.run([
-        "ffmpeg", "-i", src_path, "-map_metadata", "0", "-c:v", "libx264",
-        "-crf", "18", "-preset", "ultrafast", "-c:a", "aac", dst_mp4
-    ], check=True)
-    subprocess.run(["exiftool", "-TagsFromFile", src_path, "-overwrite_original", dst_mp4], check=True)
+    streams = probe_streams(src_path)
+    plan, reason = plan_conversion(streams, policy)
+    segments = 1
+    duration = None
+    if (plan == REENCODE and segmented) or renditions.target():
+        duration = probe_duration(src_path)
+    if plan == REENCODE and segmented:
+        with _active_videos_lock:
+            sharing = max(1, _active_videos)
+        cores = max(1, (os.cpu_count() or 1) // sharing)
+        segments = plan_segments(duration, os.path.getsize(src_path), max(1, idle_cores() // sharing))
+    if segments > 1:
+        logging.info(f"Video plan for {src_path}: {plan} in {segments} parallel segments ({reason})")
+        try:
+            encode_segmented(src_path, dst_mp4, streams, duration, segments, cores)
+        except (subprocess.CalledProcessError, OSError) as e:
+            logging.warning(f"Segmented encode failed for {src_path} ({describe_error(e)}), retrying in a single pass")
+            segments = 1
+    if segments == 1:
+        logging.info(f"Video plan for {src_path}: {plan} ({reason})")
+        cmd = build_ffmpeg_command(src_path, dst_mp4, plan, streams, renditions.video_output_args(duration))
+        if plan == REENCODE:
+            run_tool(cmd)
+        else:
+            with source_slot(src_path):
+                run_tool(cmd)
+        renditions.record_video_outputs()
+    preserve_metadata(src_path, dst_mp4, plan=plan)
+    return dst_mp4
 
 def convert_heic_to_jpg(src_path, dst_path_without_ext):
+    """
+    Convert HEIC to JPEG in-process with pillow-heif when available (see
+    core/heic_engine.py), otherwise with heif-convert. Both write EXIF/ICC
+    into the JPEG themselves. Files pillow-heif cannot decode, or that time out
+    (HEIC_ENGINE_TIMEOUT), are retried with heif-convert if it is installed.
+    Thumbnails come from the pillow-heif decode; after heif-convert they are
+    made from the written JPEG. The conversion holds a slot of the source device.
+    """
     dst_jpg = dst_path_without_ext + OUTPUT_IMAGE_EXT
-    subprocess.run(["heif-convert", src_path, dst_jpg], check=True)
-    subprocess.run(["exiftool", "-TagsFromFile", src_path, "-overwrite_original", dst_jpg], check=True)
+    with source_slot(src_path):
+        if heic_engine.available():
+            try:
+                _, made = heic_engine.convert(src_path, dst_jpg, thumbs_base=renditions.target())
+                for kind, path in made.items():
+                    renditions.record(kind, path)
+            except Exception as e:
+                if shutil.which("heif-convert") is None:
+                    raise
+                logging.warning(f"pillow-heif failed for {src_path} ({e}), falling back to heif-convert")
+                run_tool(["heif-convert", "-q", str(JPEG_QUALITY), src_path, dst_jpg])
+        else:
+            run_tool(["heif-convert", "-q", str(JPEG_QUALITY), src_path, dst_jpg])
+    renditions.thumbnails_from_file(dst_jpg, run_tool)
+    preserve_metadata(src_path, dst_jpg)
+    return dst_jpg
 
 
 def init_logging(log_path):
     logging.basicConfig(filename=log_path, level=logging.INFO, format=LOG_FORMAT)
 
 
-def print_progress(idx, total, start_time, emoji="▶️"):
-    elapsed = datetime.now() - start_time
-    percent = (idx / total) * 100
-    eta = timedelta(seconds=int((elapsed.total_seconds() / idx) * (total - idx)))
-    print(f"{emoji} {idx}/{total} ({percent:.1f}%) — Elapsed: {elapsed} — ETA: ~{eta}", end="\r")
+def required_tools(required_tools_key):
+    """External tools needed for a media type; heif-convert is optional when pillow-heif is installed."""
+    tools = REQUIRED_TOOLS[required_tools_key]
+    if heic_engine.available():
+        tools = [tool for tool in tools if tool != "heif-convert"]
+    return tools
 
-def load_checksum_map(json_path, required_tools_key):
-    if not os.path.isfile(json_path):
-        print(f"❌ Missing input file: {json_path}")
+def load_manifest(manifest_path, required_tools_key):
+    if not os.path.isfile(manifest_path):
+        print(f"❌ Missing input file: {manifest_path}")
         return None
-    check_required_tools(REQUIRED_TOOLS[required_tools_key])
-    with open(json_path, "r") as f:
-        return json.load(f)
+    check_required_tools(required_tools(required_tools_key))
+    return open_manifest(manifest_path)
 
 def ensure_subfolder(output_dir, subfolder):
     full = os.path.join(output_dir, subfolder)
@@ -123,35 +351,161 @@ def setup_logging(output_dir, prefix):
     init_logging(log_path)
     return log_path
 
-def process_template(json_path, output_dir, subfolder, required_tools_key, process_func, filename_transform_func=None, emoji="▶️"):
-    checksum_map = load_checksum_map(json_path, required_tools_key)
-    if checksum_map is None:
+def describe_error(e):
+    stderr = getattr(e, "stderr", None)
+    if stderr:
+        last = stderr.decode("utf-8", "replace").strip().splitlines()[-1:]
+        return f"{e} ({last[0]})" if last else str(e)
+    return str(e)
+
+def run_job(process_func, src, dst_path_wo_ext, checksum=None, journal=None, stage=None, thumbs_wo_ext=None,
+            partial_suffix=PARTIAL_SUFFIX):
+    """
+    Run process_func against a temporary name (dst + partial_suffix) and rename
+    the output into place only on success, so an interrupted run never leaves a
+    truncated file under the final name. process_func must return the path it wrote.
+    With thumbs_wo_ext, process_func may also write renditions (see core/renditions.py)
+    under thumbs_wo_ext + partial_suffix; they are renamed the same way.
+    On success the conversion is recorded in the journal, if any.
+    With a stage name, a per-file metrics event is emitted.
+    Returns (output_path, None, {kind: rendition path}) or (None, exception, {}).
+    """
+    tmp_wo_ext = dst_path_wo_ext + partial_suffix
+    thumbs_tmp = thumbs_wo_ext + partial_suffix if thumbs_wo_ext else None
+    metrics.begin_file()
+    renditions.begin(thumbs_tmp)
+    start = time.perf_counter()
+    output, error, made = None, None, {}
+    try:
+        written = process_func(src, tmp_wo_ext)
+        output = dst_path_wo_ext + written[len(tmp_wo_ext):]
+        for kind, path in renditions.end().items():
+            made[kind] = thumbs_wo_ext + path[len(thumbs_tmp):]
+            os.replace(path, made[kind])
+        os.replace(written, output)
+        if journal is not None:
+            journal.record(checksum, src, output)
+    except Exception as e:
+        output, error = None, e
+        renditions.end()
+        leftovers = glob.glob(glob.escape(tmp_wo_ext) + ".*")
+        if thumbs_tmp:
+            leftovers += glob.glob(glob.escape(thumbs_tmp) + "_*") + list(made.values())
+        made = {}
+        for leftover in leftovers:
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
+    tools = metrics.end_file()
+    if stage is not None:
+        fields = dict(tools)
+        if output is not None:
+            fields["output_bytes"] = os.path.getsize(output)
+        if error is not None:
+            fields["error"] = describe_error(error)
+            fields.setdefault("exit_code", getattr(error, "returncode", None))
+        metrics.event(stage, time.perf_counter() - start, src, os.path.getsize(src), **fields)
+    return output, error, made
+
+def process_template(manifest_path, output_dir, category, subfolder, required_tools_key, process_func, filename_transform_func=None, emoji="▶️", jobs=None, resume=False):
+    """
+    Convert the first path of every digest of `category` in the manifest with
+    process_func, running up to `jobs` conversions at once (CONVERSION_JOBS[required_tools_key]
+    by default). The manifest is read lazily, keeping at most jobs * CONVERSION_READ_AHEAD
+    conversions queued. Results are logged in manifest order from the calling thread.
+    Ctrl-C or cancel_running_tools() kills the running tools and skips everything
+    not yet started. Progress goes through core/progress.py.
+    Every finished file is recorded in the output_dir completion journal; with
+    resume=True, entries the journal already lists as done are skipped.
+    Output paths come from an OutputLayout and are recorded in the manifest,
+    with the thumbnails/posters made alongside when RENDITIONS_ENABLED is set.
+    """
+    manifest = load_manifest(manifest_path, required_tools_key)
+    if manifest is None:
         return
 
     subdir = ensure_subfolder(output_dir, subfolder)
     log_path = setup_logging(output_dir, f"log_{subfolder}")
-    print(f"{emoji} Starting processing of {len(checksum_map)} files into /{subfolder}...")
-    total = len(checksum_map)
+    jobs = jobs or CONVERSION_JOBS.get(required_tools_key, 1)
+    total = manifest.count(category)
+    print(f"{emoji} Starting processing of {total} files into /{subfolder} ({jobs} parallel jobs)...")
     start_time = datetime.now()
     failures = 0
+    done = 0
+    skipped = 0
 
-    for idx, (checksum, paths) in enumerate(checksum_map.items(), start=1):
-        src = paths[0]
-        original_name = os.path.basename(src)
-        final_name = filename_transform_func(original_name) if filename_transform_func else original_name
-        dst_path_wo_ext = os.path.splitext(os.path.join(subdir, final_name))[0]
+    journal = CompletionJournal(output_dir)
+    layout = OutputLayout(subdir, filename_transform_func=filename_transform_func, journal=journal)
+    # Separate connection, so outputs are written while the groups are still being read
+    outputs = Manifest(manifest_path) if isinstance(manifest, Manifest) else None
+    reset_cancellation()
+    reset_copy_stats()
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    queued = deque()
 
-        try:
-            process_func(src, dst_path_wo_ext)
-            logging.info(f"Processed: {src} → {dst_path_wo_ext}")
-        except Exception as e:
+    def log_oldest():
+        nonlocal done, failures
+        checksum, src, future = queued.popleft()
+        output, error, made = future.result()
+        if error is None:
+            logging.info(f"Processed: {src} → {output}")
+            if outputs is not None:
+                outputs.set_output(category, checksum, output, made)
+        else:
             failures += 1
-            logging.error(f"Error processing {src}: {e}")
+            logging.error(f"Error processing {src}: {describe_error(error)}")
+        done += 1
+        progress.report(f"convert_{subfolder}", done + skipped, total, start_time, emoji)
 
-        print_progress(idx, total, start_time, emoji)
+    try:
+        groups = manifest.groups(category)
+        # Groups are taken in chunks so capture dates are read with one exiftool call per chunk
+        for chunk in iter(lambda: list(islice(groups, OUTPUT_DATE_BATCH)), []):
+            pending = []
+            for checksum, paths in chunk:
+                if resume and journal.is_done(checksum, paths):
+                    skipped += 1
+                else:
+                    pending.append((checksum, paths[0]))
+            layout.prefetch([src for _, src in pending])
+            for checksum, src in pending:
+                cancel_token.check(subfolder)
+                dst = layout.assign(src, checksum)
+                queued.append((checksum, src, executor.submit(
+                    run_job, process_func, src, dst, checksum, journal, f"convert_{subfolder}", layout.thumbs_path(dst)
+                )))
+                if len(queued) >= jobs * CONVERSION_READ_AHEAD:
+                    log_oldest()
+        while queued:
+            log_oldest()
+        cancel_token.check(subfolder)
+        if skipped:
+            progress.report(f"convert_{subfolder}", done + skipped, total, start_time, emoji, force=True)
+    except (KeyboardInterrupt, ConversionCancelled):
+        print("\n🛑 Interrupted — stopping running conversions...")
+        cancel_running_tools()
+        executor.shutdown(wait=True, cancel_futures=True)
+        logging.warning(f"Cancelled after {done + skipped}/{total} files")
+        logging.shutdown()
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        close_all_sessions()
+        heic_engine.shutdown_pool()
+        journal.close()
+        manifest.close()
+        if outputs is not None:
+            outputs.close()
 
+    if skipped:
+        print(f"\n⏭️ Skipped {skipped} file(s) already converted in a previous run.")
+        logging.info(f"Resume: skipped {skipped} file(s) found in {journal.path}")
     print(f"\n✅ Done. Log saved to {log_path}")
+    summary = copy_stats_summary()
+    if summary:
+        print(summary)
+        logging.info(summary)
     if failures:
         print(f"⚠️ {failures} file(s) failed. See log for details.")
     logging.shutdown()
-
@@ -0,0 +1,162 @@
+# core/video_planner.py
+
+import re, json, subprocess
+from functools import lru_cache
+from core.config import (
+    VIDEO_POLICY, MP4_VIDEO_CODECS, MP4_AUDIO_CODECS, VIDEO_SEGMENT_MIN_BYTES, VIDEO_SEGMENT_MIN_SECONDS,
+    VIDEO_SEGMENT_MIN_LENGTH, VIDEO_SEGMENT_MAX
+)
+
+REMUX = "remux"
+TRANSCODE_AUDIO = "transcode_audio"
+REENCODE = "reencode"
+
+# Video encoder settings for REENCODE, shared by the single-pass and segmented paths
+REENCODE_VIDEO_ARGS = ["-c:v", "libx264", "-crf", "18", "-preset", "ultrafast"]
+
+def probe_streams(src_path):
+    """Return ffprobe's stream list for src_path ([] if it cannot be probed)."""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "stream=index,codec_type,codec_name,codec_tag_string,time_base",
+         "-of", "json", src_path],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        return []
+    try:
+        return json.loads(result.stdout).get("streams", [])
+    except json.JSONDecodeError:
+        return []
+
+@lru_cache(maxsize=None)
+def ffmpeg_version():
+    """(major, minor) of the installed ffmpeg, or None for git snapshots and unknown builds."""
+    try:
+        result = subprocess.run(["ffmpeg", "-hide_banner", "-version"], capture_output=True, text=True)
+    except OSError:
+        return None
+    match = re.match(r"ffmpeg version n?(\d+)\.(\d+)", result.stdout)
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+def passthrough_sync_args(version=None):
+    """
+    Keep every frame's timestamp: -fps_mode exists from ffmpeg 5.1 on, older
+    builds only know -vsync. Unknown versions (git snapshots) are taken as recent.
+    """
+    version = version or ffmpeg_version()
+    if version is not None and version < (5, 1):
+        return ["-vsync", "passthrough"]
+    return ["-fps_mode", "passthrough"]
+
+def probe_duration(src_path):
+    """Container duration in seconds, or None if ffprobe cannot tell."""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=nw=1:nk=1", src_path],
+        capture_output=True,
+        text=True
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+def plan_segments(duration, size, idle_cores):
+    """
+    Number of segments to encode a REENCODE video in (1 = single pass):
+    one per idle core for videos above the VIDEO_SEGMENT_* thresholds.
+    """
+    if duration is None or (size < VIDEO_SEGMENT_MIN_BYTES and duration < VIDEO_SEGMENT_MIN_SECONDS):
+        return 1
+    return max(1, min(VIDEO_SEGMENT_MAX, idle_cores, int(duration // VIDEO_SEGMENT_MIN_LENGTH)))
+
+def video_timescale(streams):
+    """Time base denominator of the first video stream (e.g. 600 for iPhone MOVs), or None."""
+    for s in streams:
+        if s.get("codec_type") == "video":
+            _, _, denominator = (s.get("time_base") or "").partition("/")
+            return int(denominator) if denominator.isdigit() else None
+    return None
+
+def plan_conversion(streams, policy=VIDEO_POLICY):
+    """
+    Decide how to turn a file with these streams into an MP4.
+    Returns (plan, reason) where plan is REMUX, TRANSCODE_AUDIO or REENCODE.
+    """
+    if policy == "always_reencode":
+        return REENCODE, "policy always_reencode"
+
+    video = [s.get("codec_name") for s in streams if s.get("codec_type") == "video"]
+    audio = [s.get("codec_name") for s in streams if s.get("codec_type") == "audio"]
+    if not video:
+        return REENCODE, "no video stream found by ffprobe"
+
+    vcodec = video[0]
+    if policy == "force_h264" and vcodec != "h264":
+        return REENCODE, f"policy force_h264, video is {vcodec}"
+    if vcodec not in MP4_VIDEO_CODECS:
+        return REENCODE, f"video codec {vcodec} not MP4-compatible"
+
+    bad_audio = [a for a in audio if a not in MP4_AUDIO_CODECS]
+    if bad_audio:
+        return TRANSCODE_AUDIO, f"video {vcodec} copied, audio {', '.join(bad_audio)} → aac"
+    return REMUX, f"video {vcodec}, audio {', '.join(audio) or 'none'} copied"
+
+def build_ffmpeg_command(src_path, dst_path, plan, streams, extra_outputs=None):
+    """
+    ffmpeg arguments for the chosen plan. Only the first video and all audio streams are kept.
+    Container metadata, including Apple's mdta keys (location, creation date), is
+    carried in the same pass via -map_metadata and -movflags use_metadata_tags.
+    extra_outputs (e.g. renditions.video_output_args()) are appended after dst_path,
+    so ffmpeg writes them from the same demux/decode.
+    """
+    cmd = ["ffmpeg", "-nostdin", "-y", "-i", src_path, "-map_metadata", "0", "-movflags", "use_metadata_tags"]
+    if plan == REENCODE:
+        return cmd + REENCODE_VIDEO_ARGS + ["-c:a", "aac", dst_path] + (extra_outputs or [])
+
+    cmd += ["-map", "0:v:0", "-map", "0:a?", "-c:v", "copy"]
+    vcodec = next((s.get("codec_name") for s in streams if s.get("codec_type") == "video"), None)
+    if vcodec == "hevc":
+        # Apple players only accept HEVC in MP4 with the hvc1 tag
+        cmd += ["-tag:v", "hvc1"]
+    cmd += ["-c:a", "aac" if plan == TRANSCODE_AUDIO else "copy"]
+    return cmd + [dst_path] + (extra_outputs or [])
+
+def build_split_command(src_path, segment_pattern, segment_list, duration, segments):
+    """
+    Stream-copy the first video stream into `segments` pieces of about equal length.
+    The segment muxer only cuts on keyframes, so every piece starts with one.
+    """
+    times = ",".join(f"{duration * i / segments:.3f}" for i in range(1, segments))
+    return [
+        "ffmpeg", "-nostdin", "-y", "-i", src_path, "-map", "0:v:0", "-c", "copy",
+        "-f", "segment", "-segment_format", "mov", "-segment_times", times,
+        "-segment_list", segment_list, "-reset_timestamps", "1", segment_pattern
+    ]
+
+def build_segment_encode_command(segment_path, dst_path, threads, timescale=None, sync_args=None):
+    """
+    Re-encode one video-only segment. Frames keep their timestamps (no
+    duplication or dropping), so high-fps clips keep their exact timing.
+    sync_args defaults to passthrough_sync_args() for the installed ffmpeg.
+    """
+    cmd = ["ffmpeg", "-nostdin", "-y", "-i", segment_path, "-map", "0:v:0"] + REENCODE_VIDEO_ARGS
+    cmd += ["-threads", str(threads)] + (sync_args or passthrough_sync_args())
+    if timescale:
+        cmd += ["-video_track_timescale", str(timescale)]
+    return cmd + [dst_path]
+
+def build_concat_command(concat_list, src_path, dst_path, timescale=None, extra_outputs=None):
+    """
+    Join the encoded segments without re-encoding and add the source's audio
+    (as AAC) and container metadata in the same pass. extra_outputs are
+    appended as in build_ffmpeg_command (video from input 0, audio from input 1).
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-y", "-f", "concat", "-safe", "0", "-i", concat_list, "-i", src_path,
+        "-map", "0:v:0", "-map", "1:a?", "-map_metadata", "1", "-movflags", "use_metadata_tags",
+        "-c:v", "copy", "-c:a", "aac"
+    ]
+    if timescale:
+        cmd += ["-video_track_timescale", str(timescale)]
+    return cmd + [dst_path] + (extra_outputs or [])
@@ -0,0 +1,46 @@
+# core/walker.py
+
+import os
+from fnmatch import fnmatch
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from core.config import WALK_EXCLUDE, WALK_WORKERS
+
+def is_excluded(name, exclude):
+    return any(fnmatch(name, pattern) for pattern in exclude)
+
+def _scan_dir(path, exclude):
+    """List one directory. Returns ([(file_path, stat_result)], [subdir_paths])."""
+    files, subdirs = [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not is_excluded(entry.name, exclude):
+                            subdirs.append(entry.path)
+                    elif entry.is_file():
+                        files.append((entry.path, entry.stat()))
+                except OSError:
+                    # Vanished or unreadable entry, skipped like os.walk does
+                    continue
+    except OSError:
+        pass
+    return files, subdirs
+
+def walk_files(root, exclude=WALK_EXCLUDE, max_workers=WALK_WORKERS):
+    """
+    Yield (path, os.stat_result) for every file under root.
+    Directories are listed in parallel with os.scandir, and the stat result
+    of each DirEntry is carried along so later stages never stat again.
+    Subtrees whose directory name matches an exclude pattern are not entered.
+    Order is not deterministic.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(_scan_dir, root, exclude)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                for subdir in subdirs:
+                    pending.add(executor.submit(_scan_dir, subdir, exclude))
+                yield from files
@@ -0,0 +1,309 @@
+# core/watcher.py
+
+import os, time, struct, select, signal, logging, ctypes, ctypes.util
+from core.config import (
+    WALK_EXCLUDE, HASH_ALGORITHM, HASH_READ_SIZE, CHECKSUM_CACHE_PATH, WATCH_BACKEND, WATCH_POLL_INTERVAL,
+    WATCH_SETTLE_SECONDS, WATCH_BATCH_SIZE, WATCH_BATCH_WINDOW, WATCH_INDEX_FILENAME
+)
+from core.walker import walk_files, is_excluded
+from core.scanner import filter_candidates, classify_videos, compute_digest, is_candidate
+from core.checksum_cache import ChecksumCache
+from core.hashing import check_algorithm
+from core.io_scheduler import IOScheduler
+from core.digest_index import DigestIndex
+from core.journal import CompletionJournal
+from core.pipeline import StreamingConverter, TARGETS
+from core.utils import setup_logging, reset_cancellation, cancel_running_tools
+from core.exiftool import close_all_sessions
+from core.progress import ConversionCancelled
+from core import heic_engine, metrics
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")
+
+class InotifyWatcher:
+    """
+    Recursive inotify watch of a directory tree through libc (Linux only).
+    changes() returns the file paths touched since the last call; new
+    directories are watched as they appear and their files reported.
+    """
+
+    def __init__(self, root, exclude=WALK_EXCLUDE):
+        self.root = root
+        self.exclude = exclude
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}
+        self._add_tree(root)
+
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            # ENOSPC here means fs.inotify.max_user_watches is exhausted
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        self._dirs[wd] = path
+
+    def _add_tree(self, root):
+        """Watch root and its subdirectories; returns the files already inside."""
+        files = []
+        pending = [root]
+        while pending:
+            path = pending.pop()
+            self._add_watch(path)
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not is_excluded(entry.name, self.exclude):
+                                pending.append(entry.path)
+                        elif entry.is_file():
+                            files.append(entry.path)
+            except OSError:
+                continue
+        return files
+
+    def changes(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 256 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0"))
+                offset += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    # Events were lost: report everything so the caller rechecks the tree
+                    changed.update(path for path, _ in walk_files(self.root, exclude=self.exclude))
+                    continue
+                if mask & IN_IGNORED:
+                    self._dirs.pop(wd, None)
+                    continue
+                parent = self._dirs.get(wd)
+                if parent is None or not name:
+                    continue
+                path = os.path.join(parent, name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and not is_excluded(name, self.exclude):
+                        changed.update(self._add_tree(path))
+                else:
+                    changed.add(path)
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Portable fallback: rescans the tree every `interval` seconds and reports new or modified files."""
+
+    def __init__(self, root, exclude=WALK_EXCLUDE, interval=WATCH_POLL_INTERVAL):
+        self.root = root
+        self.exclude = exclude
+        self.interval = interval
+        self._seen = self._snapshot()
+        self._next = time.monotonic() + interval
+
+    def _snapshot(self):
+        return {path: (st.st_size, st.st_mtime_ns) for path, st in walk_files(self.root, exclude=self.exclude)}
+
+    def changes(self, timeout):
+        wait = self._next - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(0.0, wait))
+        self._next = time.monotonic() + self.interval
+        snapshot = self._snapshot()
+        changed = {path for path, sig in snapshot.items() if self._seen.get(path) != sig}
+        self._seen = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+def open_watcher(root, exclude=WALK_EXCLUDE, backend=WATCH_BACKEND):
+    """inotify when available ("auto"/"inotify"), otherwise polling."""
+    if backend != "poll":
+        try:
+            return InotifyWatcher(root, exclude)
+        except (OSError, AttributeError) as e:
+            if backend == "inotify":
+                raise
+            print(f"⚠️ inotify unavailable ({e}), polling every {WATCH_POLL_INTERVAL:.0f}s instead.")
+    return PollingWatcher(root, exclude)
+
+class SettleTracker:
+    """
+    Holds changed files until their size and mtime have stayed the same for
+    settle_seconds, so files still being synced are not read half-written.
+    """
+
+    def __init__(self, settle_seconds=WATCH_SETTLE_SECONDS):
+        self.settle_seconds = settle_seconds
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def touch(self, path):
+        self._pending[path] = (None, time.monotonic())
+
+    def settled(self):
+        """Return the files that have stopped changing and forget them."""
+        now = time.monotonic()
+        ready = []
+        for path, (sig, since) in list(self._pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+            current = (st.st_size, st.st_mtime_ns)
+            if current != sig:
+                self._pending[path] = (current, now)
+            elif now - since >= self.settle_seconds:
+                del self._pending[path]
+                ready.append(path)
+        return ready
+
+def _hash_batch(paths, cache, algorithm, max_workers):
+    """Full digests for paths, taken from the checksum cache where possible. Returns {path: digest}."""
+    digests = {}
+    to_hash = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        cached = cache.get(path, algorithm, st) if cache is not None else None
+        if cached is not None:
+            digests[path] = cached
+        else:
+            to_hash.append((path, st))
+    with IOScheduler(max_workers) as scheduler:
+        futures = [
+            (path, st, scheduler.submit(st.st_dev, st.st_size, compute_digest, path, algorithm, HASH_READ_SIZE))
+            for path, st in to_hash
+        ]
+        for path, st, future in futures:
+            try:
+                _, digest = future.result()
+            except OSError as e:
+                logging.warning(f"Cannot read {path}: {e}")
+                continue
+            digests[path] = digest
+            if cache is not None:
+                cache.put(path, algorithm, st, digest)
+    if cache is not None:
+        cache.commit()
+    return digests
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def watch_and_convert(source_dir, output_dir, user_options, backend=WATCH_BACKEND, exclude=WALK_EXCLUDE,
+                      settle_seconds=WATCH_SETTLE_SECONDS, batch_size=WATCH_BATCH_SIZE, batch_window=WATCH_BATCH_WINDOW,
+                      cache_path=CHECKSUM_CACHE_PATH, algorithm=HASH_ALGORITHM, max_workers=None):
+    """
+    Watch source_dir and convert every new file into output_dir until interrupted.
+    Files already present are ingested first. A changed file is handled once it
+    has settled; settled files are processed in batches (batch_size files, or
+    whatever has settled after batch_window seconds without reaching it).
+    Each batch is classified and hashed, and only digests not yet in the output
+    directory's DigestIndex go to the converters, so content is converted once
+    no matter how often or under which name it shows up.
+    """
+    check_algorithm(algorithm)
+    os.makedirs(output_dir, exist_ok=True)
+    setup_logging(output_dir, "log_watch")
+    index = DigestIndex(os.path.join(output_dir, WATCH_INDEX_FILENAME))
+    journal = CompletionJournal(output_dir)
+    cache = ChecksumCache(cache_path) if cache_path else None
+
+    def on_done(checksum, src, output, error, made):
+        index.finish(checksum, output, error)
+
+    converters = {
+        cat: StreamingConverter(output_dir, journal=journal, on_done=on_done, **target)
+        for cat, target in TARGETS.items() if user_options[cat]["include"]
+    }
+    reset_cancellation()
+    for converter in converters.values():
+        converter.start()
+
+    tracker = SettleTracker(settle_seconds)
+    watcher = open_watcher(source_dir, exclude, backend)
+    for path, _ in walk_files(source_dir, exclude=exclude):
+        if is_candidate(path, user_options):
+            tracker.touch(path)
+    previous_sigterm = signal.signal(signal.SIGTERM, _raise_interrupt)
+    print(f"👀 Watching {source_dir} → {output_dir} ({type(watcher).__name__}, {len(index)} digests already ingested). Ctrl-C to stop.")
+
+    ready = []
+    ready_since = None
+    try:
+        while True:
+            for path in watcher.changes(timeout=min(1.0, settle_seconds)):
+                if is_candidate(path, user_options):
+                    tracker.touch(path)
+            settled = tracker.settled()
+            if settled:
+                ready.extend(settled)
+                ready_since = ready_since or time.monotonic()
+            if ready and (len(ready) >= batch_size or time.monotonic() - ready_since >= batch_window):
+                batch, ready = ready[:batch_size], ready[batch_size:]
+                ready_since = time.monotonic() if ready else None
+                _ingest_batch(batch, user_options, converters, index, cache, algorithm, max_workers)
+    except (KeyboardInterrupt, ConversionCancelled):
+        print("\n🛑 Stopping watch mode...")
+        cancel_running_tools()
+        for converter in converters.values():
+            converter.abort()
+        logging.warning("Watch mode stopped")
+    finally:
+        signal.signal(signal.SIGTERM, previous_sigterm)
+        watcher.close()
+        close_all_sessions()
+        heic_engine.shutdown_pool()
+        journal.close()
+        index.close()
+        if cache is not None:
+            cache.close()
+        logging.shutdown()
+
+def _ingest_batch(batch, user_options, converters, index, cache, algorithm, max_workers):
+    start = time.perf_counter()
+    photos, videos = filter_candidates(sorted(set(batch)), user_options)
+    categories = {path: "photos" for path in photos}
+    categories.update(classify_videos(videos, user_options))
+    digests = _hash_batch(sorted(categories), cache, algorithm, max_workers)
+    claimed = {}
+    for path in sorted(digests):
+        category = categories[path]
+        if index.claim(digests[path], category, path):
+            claimed.setdefault(category, []).append(path)
+        else:
+            logging.info(f"Already ingested: {path}")
+    queued = 0
+    for category, paths in claimed.items():
+        for path in paths:
+            converters[category].submit(path, digests[path])
+            queued += 1
+        converters[category].flush()
+    duration = time.perf_counter() - start
+    metrics.event("watch_batch", duration, files=len(batch), queued=queued)
+    metrics.flush()
+    print(f"📥 Batch of {len(batch)} file(s): {queued} new, {len(digests) - queued} already ingested ({duration:.1f}s).")
@@ -11,48 +11,77 @@ from core.scanner import scan_and_deduplicate
 from core.convert_images import process_images
 from core.convert_videos import process_videos
 from core.convert_slowmo import process_slowmo
+from core.pipeline import stream_scan_and_convert
+from core import metrics, progress
+from core.progress import ConversionCancelled
+from core.utils import cancel_running_tools, reset_cancellation
 
 
 class WorkerThread(QThread):
     log = Signal(str)
     finished = Signal()
     progress = Signal(int)
+    file_progress = Signal(str, int, int, str)
 
-    def __init__(self, source, destination, options):
+    def __init__(self, source, destination, options, streaming=False, resume=False):
         super().__init__()
         self.source = source
         self.destination = destination
         self.options = options
+        self.streaming = streaming
+        self.resume = resume
+
+    def _on_progress(self, event):
+        # Called from worker threads; Qt queues the signal to the GUI thread
+        self.file_progress.emit(event["label"], event["done"], event["total"], str(event["eta"]))
 
     def run(self):
+        reset_cancellation()
+        metrics.start_run(self.destination)
+        progress.subscribe(self._on_progress)
+        try:
+            self.run_steps()
+        except ConversionCancelled:
+            self.log.emit("🛑 Cancelled.")
+        else:
+            self.progress.emit(100)
+            self.log.emit("✅ Done.")
+        finally:
+            progress.unsubscribe(self._on_progress)
+            for line in metrics.finish_run(quiet=True):
+                self.log.emit(line)
+            self.finished.emit()
+
+    def run_steps(self):
+        if self.streaming:
+            self.log.emit("⚡ Scanning and converting files (streaming mode)...")
+            stream_scan_and_convert(self.source, self.options, self.destination, resume=self.resume)
+            return
+
         self.log.emit("🔍 Scanning and deduplicating files...")
-        json_files = scan_and_deduplicate(self.source, self.options, self.destination)
+        manifests = scan_and_deduplicate(self.source, self.options, self.destination)
 
-        total_steps = sum(bool(json_files.get(k)) for k in ["photos", "videos", "slowmo"])
+        total_steps = sum(bool(manifests.get(k)) for k in ["photos", "videos", "slowmo"])
         completed = 0
 
-        if json_files.get("photos"):
+        if manifests.get("photos"):
             self.log.emit("📸 Converting images...")
-            process_images(json_files["photos"], self.destination)
+            process_images(manifests["photos"], self.destination, resume=self.resume)
             completed += 1
             self.progress.emit(int(completed / total_steps * 100))
 
-        if json_files.get("videos"):
+        if manifests.get("videos"):
             self.log.emit("🎞️ Converting videos...")
-            process_videos(json_files["videos"], self.destination)
+            process_videos(manifests["videos"], self.destination, resume=self.resume)
             completed += 1
             self.progress.emit(int(completed / total_steps * 100))
 
-        if json_files.get("slowmo"):
+        if manifests.get("slowmo"):
             self.log.emit("🐢 Converting slow-motion videos...")
-            process_slowmo(json_files["slowmo"], self.destination)
+            process_slowmo(manifests["slowmo"], self.destination, resume=self.resume)
             completed += 1
             self.progress.emit(int(completed / total_steps * 100))
 
-        self.progress.emit(100)
-        self.log.emit("✅ Done.")
-        self.finished.emit()
-
 
 class MainWindow(QWidget):
     def __init__(self):
@@ -66,6 +95,9 @@ class MainWindow(QWidget):
         self.log_output.setReadOnly(True)
         self.progress_bar = QProgressBar()
         self.progress_bar.setValue(0)
+        self.file_progress_bar = QProgressBar()
+        self.file_progress_bar.setValue(0)
+        self.file_progress_label = QLabel("")
 
         self.photos_cb = QCheckBox("📸 Photos")
         self.photos_non_iphone_cb = QCheckBox("Include non-iPhone type files")
@@ -73,6 +105,9 @@ class MainWindow(QWidget):
         self.videos_non_iphone_cb = QCheckBox("Include non-iPhone type files")
         self.slowmo_cb = QCheckBox("🐢 Slow motion videos")
         self.slowmo_non_iphone_cb = QCheckBox("Include non-iPhone type files")
+        self.streaming_cb = QCheckBox("⚡ Convert while scanning (streaming mode)")
+        self.streaming_cb.setChecked(True)
+        self.resume_cb = QCheckBox("♻️ Skip files already converted into this destination")
 
         self.info_label = QLabel("\u26A0\ufe0f Non-iPhone files will be copied without conversion.")
         self.info_label.setWordWrap(True)
@@ -97,12 +132,22 @@ class MainWindow(QWidget):
         layout.addLayout(self._media_option_row(self.slowmo_cb, self.slowmo_non_iphone_cb))
 
         layout.addWidget(self.info_label)
-
-        start_button = QPushButton("🚀 Start Conversion")
-        start_button.clicked.connect(self.start_process)
-        layout.addWidget(start_button)
+        layout.addWidget(self.streaming_cb)
+        layout.addWidget(self.resume_cb)
+
+        buttons = QHBoxLayout()
+        self.start_button = QPushButton("🚀 Start Conversion")
+        self.start_button.clicked.connect(self.start_process)
+        buttons.addWidget(self.start_button)
+        self.stop_button = QPushButton("🛑 Stop")
+        self.stop_button.setEnabled(False)
+        self.stop_button.clicked.connect(self.stop_process)
+        buttons.addWidget(self.stop_button)
+        layout.addLayout(buttons)
 
         layout.addWidget(self.progress_bar)
+        layout.addWidget(self.file_progress_label)
+        layout.addWidget(self.file_progress_bar)
         layout.addWidget(QLabel("Log:"))
         layout.addWidget(self.log_output)
 
@@ -180,12 +225,36 @@ class MainWindow(QWidget):
         }
 
         self.progress_bar.setValue(0)
-        self.thread = WorkerThread(source, dest, options)
+        self.file_progress_bar.setValue(0)
+        self.file_progress_label.setText("")
+        self.start_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
+        self.thread = WorkerThread(
+            source, dest, options,
+            streaming=self.streaming_cb.isChecked(),
+            resume=self.resume_cb.isChecked()
+        )
         self.thread.log.connect(self._append_log)
         self.thread.progress.connect(self.progress_bar.setValue)
-        self.thread.finished.connect(lambda: self._append_log("🏁 All done."))
+        self.thread.file_progress.connect(self._update_file_progress)
+        self.thread.finished.connect(self._on_finished)
         self.thread.start()
 
+    def stop_process(self):
+        self.stop_button.setEnabled(False)
+        self._append_log("🛑 Stopping...")
+        cancel_running_tools()
+
+    def _update_file_progress(self, label, done, total, eta):
+        self.file_progress_bar.setMaximum(total)
+        self.file_progress_bar.setValue(done)
+        self.file_progress_label.setText(f"{label} {done}/{total} — ETA ~{eta}")
+
+    def _on_finished(self):
+        self.start_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        self._append_log("🏁 All done.")
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,140 @@
+# tests/test_distributed.py
+
+import json, threading
+import urllib.error
+from http.server import HTTPServer, BaseHTTPRequestHandler
+import pytest
+from core import distributed, layout
+from core.distributed import JobQueue, WorkerClient
+from core.manifest import Manifest
+
+DIGEST = "a" * 32
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(distributed.time, "time", lambda: now[0])
+    return now
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    # no exiftool needed: every photo goes to undated/
+    monkeypatch.setattr(layout, "read_capture_dates", lambda paths: {})
+    src = tmp_path / "IMG_0001.jpg"
+    src.write_bytes(b"photo")
+    manifest_path = str(tmp_path / "manifest_test.sqlite")
+    with Manifest(manifest_path) as manifest:
+        manifest.add("photos", DIGEST, str(src))
+    queue = JobQueue(manifest_path, str(tmp_path / "out"), ["photos"], lease=10, max_attempts=2)
+    yield queue
+    queue.close()
+
+def test_expired_lease_is_handed_out_again(queue, clock):
+    [job] = queue.claim("w1", 5)
+    assert job["attempt"] == 1
+    assert queue.claim("w2", 5) == []
+    assert queue.counts()["leased"] == 1
+
+    clock[0] += 11
+    assert queue.counts()["pending"] == 1
+    [again] = queue.claim("w2", 5)
+    assert (again["id"], again["dst"], again["attempt"]) == (job["id"], job["dst"], 2)
+    # the first worker lost its lease
+    assert queue.renew("w1", [job["id"]]) == [job["id"]]
+    assert queue.renew("w2", [job["id"]]) == []
+
+def test_expired_lease_fails_after_max_attempts(queue, clock):
+    queue.claim("w1", 5)
+    clock[0] += 11
+    queue.claim("w2", 5)
+    clock[0] += 11
+    assert queue.claim("w3", 5) == []
+    assert queue.finished()
+    assert [error for _, error in queue.failures()] == ["lease expired"]
+
+def test_failed_job_is_retried(queue, clock):
+    [job] = queue.claim("w1", 5)
+    assert queue.fail(job["id"], "ffmpeg crashed") == "pending"
+    [again] = queue.claim("w1", 5)
+    assert again["attempt"] == 2
+    assert queue.fail(again["id"], "ffmpeg crashed again") == "failed"
+    assert [error for _, error in queue.failures()] == ["ffmpeg crashed again"]
+
+def test_release_does_not_count_the_attempt(queue, clock):
+    [job] = queue.claim("w1", 5)
+    queue.release("w1", [job["id"]])
+    assert queue.claim("w2", 5)[0]["attempt"] == 1
+
+def test_late_completion_is_accepted(queue, clock):
+    [job] = queue.claim("w1", 5)
+    clock[0] += 11
+    queue.claim("w2", 5)
+    assert queue.complete(job["id"], job["dst"] + ".jpg") == ("photos", job["src"])
+    assert queue.complete(job["id"], job["dst"] + ".jpg") is None
+    assert queue.finished()
+
+def serve(responses):
+    """HTTP server answering POSTs with the given status codes in turn, then 200 {"ok": true}."""
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            calls.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            code = responses.pop(0) if responses else 200
+            body = json.dumps({"ok": code == 200}).encode()
+            self.send_response(code)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, calls
+
+def test_client_retries_server_errors(monkeypatch):
+    monkeypatch.setattr(distributed.time, "sleep", lambda seconds: None)
+    server, calls = serve([500, 503])
+    try:
+        client = WorkerClient(f"http://127.0.0.1:{server.server_port}", retry_seconds=60)
+        assert client.call("/claim", {"worker": "w1"}) == {"ok": True}
+        assert len(calls) == 3
+    finally:
+        server.shutdown()
+
+def test_client_does_not_retry_client_errors(monkeypatch):
+    monkeypatch.setattr(distributed.time, "sleep", lambda seconds: None)
+    server, calls = serve([403])
+    try:
+        client = WorkerClient(f"http://127.0.0.1:{server.server_port}", retry_seconds=60)
+        with pytest.raises(urllib.error.HTTPError):
+            client.call("/claim", {"worker": "w1"})
+        assert len(calls) == 1
+    finally:
+        server.shutdown()
+
+def test_client_gives_up_after_retry_seconds():
+    server, calls = serve([500] * 10)
+    try:
+        client = WorkerClient(f"http://127.0.0.1:{server.server_port}", retry_seconds=0)
+        with pytest.raises(urllib.error.HTTPError):
+            client.call("/claim", {"worker": "w1"})
+        assert len(calls) == 1
+    finally:
+        server.shutdown()
+
+def test_jobs_are_claimed_by_first_path(tmp_path, monkeypatch, clock):
+    monkeypatch.setattr(layout, "read_capture_dates", lambda paths: {})
+    manifest_path = str(tmp_path / "manifest_order.sqlite")
+    with Manifest(manifest_path) as manifest:
+        manifest.add("photos", "2" * 32, "/src/b/IMG_1.jpg")
+        manifest.add("photos", "1" * 32, "/src/a/IMG_1.jpg")
+    queue = JobQueue(manifest_path, str(tmp_path / "out"), ["photos"])
+    try:
+        first, second = queue.claim("w1", 5)
+        assert first["src"] == "/src/a/IMG_1.jpg"
+        assert first["dst"].endswith("IMG_1") and second["dst"].endswith("IMG_1_22222222")
+    finally:
+        queue.close()
@@ -0,0 +1,75 @@
+# tests/test_exiftool.py
+
+import threading
+import pytest
+from core import exiftool
+from core.exiftool import ExifToolSession, ExifToolError
+
+@pytest.fixture
+def silent_exiftool(tmp_path):
+    """Stand-in executable that accepts commands and never answers, like a hung exiftool."""
+    path = tmp_path / "exiftool"
+    path.write_text("#!/bin/sh\nwhile read -r line; do :; done\n")
+    path.chmod(0o755)
+    return str(path)
+
+@pytest.fixture
+def echoing_exiftool(tmp_path):
+    """Stand-in executable that answers every command with nothing but its sentinel."""
+    path = tmp_path / "exiftool"
+    path.write_text(
+        "#!/bin/sh\n"
+        "while read -r line; do case \"$line\" in\n"
+        "  {ready*) sentinel=\"$line\" ;;\n"
+        "  -execute*) echo \"$sentinel\"; echo \"$sentinel\" >&2 ;;\n"
+        "esac; done\n"
+    )
+    path.chmod(0o755)
+    return str(path)
+
+def test_killed_right_after_the_answer(echoing_exiftool, monkeypatch):
+    session = ExifToolSession(echoing_exiftool, timeout=30)
+    assert session.execute("-ver") == ""
+    read = exiftool.os.read
+    answers = []
+
+    def read_then_kill(fd, size):
+        chunk = read(fd, size)
+        if b"{ready" in chunk:
+            answers.append(chunk)
+            if len(answers) == 2:
+                # the forced close lands between the last read and the end of the command
+                session.terminate()
+        return chunk
+
+    monkeypatch.setattr(exiftool.os, "read", read_then_kill)
+    assert session.execute("-ver") == ""
+    assert not session.running()
+
+def test_force_close_during_a_command(silent_exiftool, monkeypatch):
+    session = ExifToolSession(silent_exiftool, timeout=30)
+    monkeypatch.setattr(exiftool, "_sessions", [session])
+    errors = []
+
+    def run():
+        try:
+            session.execute("-ver")
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    while not session.running():
+        pass
+    exiftool.close_all_sessions(force=True)
+    thread.join(10)
+    assert not thread.is_alive()
+    assert len(errors) == 1 and isinstance(errors[0], ExifToolError)
+    with pytest.raises(ExifToolError, match="closed"):
+        session.execute("-ver")
+
+def test_timeout(silent_exiftool):
+    session = ExifToolSession(silent_exiftool, timeout=0.2)
+    with pytest.raises(ExifToolError, match="timed out"):
+        session.execute("-ver")
+    assert not session.running()
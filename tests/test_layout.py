@@ -0,0 +1,72 @@
+# tests/test_layout.py
+
+import os
+from datetime import datetime
+import pytest
+from core import layout
+from core.layout import OutputLayout
+from core.journal import CompletionJournal
+
+D1 = "11111111" + "a" * 24
+D2 = "22222222" + "b" * 24
+D3 = "22222222" + "c" * 24
+
+def test_name_collisions(tmp_path):
+    out = OutputLayout(str(tmp_path / "images"), layout="flat", renditions=False)
+    first = out.assign("/src/a/IMG_0001.HEIC", D1)
+    assert first == str(tmp_path / "images" / "IMG_0001")
+    # same stem in another case: first 8 hex digits of the digest are appended
+    second = out.assign("/src/b/img_0001.jpg", D2)
+    assert second == str(tmp_path / "images" / f"img_0001_{D2[:8]}")
+    # same stem and same short suffix: the full digest is used
+    third = out.assign("/src/c/IMG_0001.png", D3)
+    assert third == str(tmp_path / "images" / f"IMG_0001_{D3}")
+    # a source asking again keeps its name
+    assert out.assign("/src/a/IMG_0001.HEIC", D1) == first
+    with pytest.raises(FileExistsError):
+        out.assign("/src/d/IMG_0001.jpg", D3)
+
+def test_filename_transform_and_synthetic_digest(tmp_path):
+    out = OutputLayout(str(tmp_path), layout="digest", filename_transform_func=lambda name: name.replace(".MOV", "_conv.MOV"),
+                       renditions=False)
+    assert out.assign("/src/CLIP.MOV", "size:" + D2) == str(tmp_path / "22" / "CLIP_conv")
+    assert os.path.isdir(tmp_path / "22")
+
+def test_date_folders(tmp_path, monkeypatch):
+    monkeypatch.setattr(layout, "read_capture_dates", lambda paths: {"/src/dated.jpg": datetime(2024, 5, 17, 9, 30)})
+    out = OutputLayout(str(tmp_path), layout="date", renditions=False)
+    out.prefetch(["/src/dated.jpg", "/src/undated.jpg"])
+    assert out.assign("/src/dated.jpg", D1) == str(tmp_path / "2024" / "05" / "dated")
+    assert out.assign("/src/undated.jpg", D2) == str(tmp_path / layout.OUTPUT_UNDATED_FOLDER / "undated")
+
+def test_journal_outputs_stay_reserved(tmp_path):
+    src = tmp_path / "IMG_0002.jpg"
+    src.write_bytes(b"photo")
+    subdir = tmp_path / "out" / "images"
+    subdir.mkdir(parents=True)
+    output = subdir / "IMG_0002.jpg"
+    output.write_bytes(b"converted")
+    journal = CompletionJournal(str(tmp_path / "out"))
+    journal.record(D1, str(src), str(output))
+
+    out = OutputLayout(str(subdir), layout="flat", journal=journal, renditions=False)
+    assert out.assign("/elsewhere/IMG_0002.jpg", D2) == str(subdir / f"IMG_0002_{D2[:8]}")
+    assert out.assign(str(src), D1) == str(subdir / "IMG_0002")
+    journal.close()
+
+def test_thumbs_path_mirrors_the_output_tree(tmp_path):
+    out = OutputLayout(str(tmp_path / "images"), layout="digest", renditions=True)
+    dst = out.assign("/src/IMG_0003.HEIC", D1)
+    assert out.thumbs_path(dst) == str(tmp_path / layout.RENDITIONS_FOLDER / "images" / "11" / "IMG_0003")
+    assert os.path.isdir(tmp_path / layout.RENDITIONS_FOLDER / "images" / "11")
+
+def test_failed_date_batch_is_read_file_by_file(tmp_path, monkeypatch):
+    def read_capture_dates(paths):
+        if "/src/broken.mov" in paths:
+            raise layout.ExifToolError("exiftool choked")
+        return {path: datetime(2023, 1, 2) for path in paths}
+    monkeypatch.setattr(layout, "read_capture_dates", read_capture_dates)
+    out = OutputLayout(str(tmp_path), layout="date", renditions=False)
+    out.prefetch(["/src/good.jpg", "/src/broken.mov"])
+    assert out.assign("/src/good.jpg", D1) == str(tmp_path / "2023" / "01" / "good")
+    assert out.assign("/src/broken.mov", D2) == str(tmp_path / layout.OUTPUT_UNDATED_FOLDER / "broken")
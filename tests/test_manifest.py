@@ -0,0 +1,22 @@
+# tests/test_manifest.py
+
+from core.manifest import Manifest
+
+D1, D2, D3 = "1" * 32, "2" * 32, "3" * 32
+
+def test_groups_are_listed_by_first_path(tmp_path):
+    # hashing threads settle groups in any order; the listing must not depend on it
+    with Manifest(str(tmp_path / "manifest_a.sqlite")) as manifest:
+        manifest.add("photos", D3, "/src/c/IMG_1.jpg")
+        manifest.add("photos", D1, "/src/a/IMG_1.jpg")
+        manifest.add("photos", D3, "/src/0/IMG_1.jpg")
+        manifest.add("photos", D2, "/src/b/IMG_1.jpg")
+        manifest.add("videos", D1, "/src/0/clip.mov")
+        assert list(manifest.groups("photos")) == [
+            (D1, ["/src/a/IMG_1.jpg"]),
+            (D2, ["/src/b/IMG_1.jpg"]),
+            (D3, ["/src/c/IMG_1.jpg", "/src/0/IMG_1.jpg"]),
+        ]
+        manifest.set_output("photos", D3, "/out/IMG_1.jpg")
+        manifest.set_output("photos", D1, "/out/IMG_1_11111111.jpg")
+        assert list(manifest.outputs("photos")) == [(D1, "/out/IMG_1_11111111.jpg"), (D3, "/out/IMG_1.jpg")]
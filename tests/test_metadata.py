@@ -0,0 +1,30 @@
+# tests/test_metadata.py
+
+import pytest
+from core import metadata
+from core.metadata import missing_metadata
+from core.video_planner import REMUX, TRANSCODE_AUDIO, REENCODE
+
+def tags(monkeypatch, src, dst):
+    monkeypatch.setattr(metadata, "read_tags", lambda paths, names: {"src.mov": src, "dst.mp4": dst})
+
+def test_date_and_gps(monkeypatch):
+    tags(monkeypatch, {"CreationDate": "2024:05:17 09:30:00", "GPSLatitude": 48.1}, {"CreateDate": "2024:05:17 09:30:00"})
+    assert missing_metadata("src.mov", "dst.mp4") == ["gps"]
+
+@pytest.mark.parametrize("plan, missing", [
+    (REENCODE, []),
+    (None, []),
+    (REMUX, ["orientation"]),
+    (TRANSCODE_AUDIO, ["orientation"]),
+])
+def test_dropped_rotation(monkeypatch, plan, missing):
+    # a re-encode applies the rotation to the pixels; a stream copy must keep the tag
+    tags(monkeypatch, {"Rotation": 90}, {})
+    assert missing_metadata("src.mov", "dst.mp4", plan) == missing
+
+def test_kept_and_changed_rotation(monkeypatch):
+    tags(monkeypatch, {"Rotation": 90}, {"Rotation": 90})
+    assert missing_metadata("src.mov", "dst.mp4", REMUX) == []
+    tags(monkeypatch, {"Rotation": 90}, {"Rotation": 180})
+    assert missing_metadata("src.mov", "dst.mp4", REENCODE) == ["orientation"]
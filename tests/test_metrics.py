@@ -0,0 +1,15 @@
+# tests/test_metrics.py
+
+from concurrent.futures import ThreadPoolExecutor
+from core import metrics
+
+def test_tools_from_other_threads_reach_the_file():
+    tools = metrics.begin_file()
+    assert metrics.current_file() is tools
+    metrics.record_tool("ffmpeg", 0, 100)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        list(pool.map(lambda rss: metrics.record_tool("ffmpeg", 0, rss, tools), [300, 200]))
+        # without the collector, a pool thread's tool is not attributed to the file
+        pool.submit(metrics.record_tool, "ffmpeg", 1, 999).result()
+    assert metrics.end_file() == {"tools": ["ffmpeg"] * 3, "exit_code": 0, "peak_rss": 300}
+    assert metrics.current_file() is None
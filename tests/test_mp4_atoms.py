@@ -0,0 +1,53 @@
+# tests/test_mp4_atoms.py
+
+import struct
+import pytest
+from core.mp4_atoms import read_frame_rate, AtomError
+
+def box(box_type, *children):
+    payload = b"".join(children)
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+def track(handler=b"vide", timescale=600, stts=((10, 20),)):
+    mdhd = box(b"mdhd", bytes(12), struct.pack(">II", timescale, 0))
+    hdlr = box(b"hdlr", bytes(8), handler, bytes(12))
+    entries = b"".join(struct.pack(">II", count, delta) for count, delta in stts)
+    stbl = box(b"stbl", box(b"stts", bytes(4), struct.pack(">I", len(stts)), entries))
+    return box(b"trak", box(b"mdia", mdhd, hdlr, box(b"minf", stbl)))
+
+def capture_fps_meta(fps):
+    key = b"com.apple.quicktime.capture.fps"
+    keys = box(b"keys", bytes(4), struct.pack(">I", 1), struct.pack(">I", 8 + len(key)), b"mdta", key)
+    data = box(b"data", struct.pack(">I", 23), bytes(4), struct.pack(">f", fps))
+    ilst = box(b"ilst", box(struct.pack(">I", 1), data))
+    return box(b"meta", box(b"hdlr", bytes(8), b"mdta", bytes(12)), keys, ilst)
+
+def write(tmp_path, *boxes):
+    path = tmp_path / "clip.mov"
+    path.write_bytes(box(b"ftyp", b"qt  ", bytes(4)) + b"".join(boxes))
+    return str(path)
+
+def test_fps_from_stts(tmp_path):
+    assert read_frame_rate(write(tmp_path, box(b"moov", track()))) == 30.0
+
+def test_most_common_frame_duration_wins(tmp_path):
+    path = write(tmp_path, box(b"moov", track(stts=((1, 40), (239, 5), (1, 7)))))
+    assert read_frame_rate(path) == 120.0
+
+def test_audio_track_is_skipped(tmp_path):
+    path = write(tmp_path, box(b"moov", track(handler=b"soun", timescale=44100, stts=((100, 1024),)), track()))
+    assert read_frame_rate(path) == 30.0
+    assert read_frame_rate(write(tmp_path, box(b"moov", track(handler=b"soun")))) is None
+
+def test_capture_fps_metadata_wins(tmp_path):
+    path = write(tmp_path, box(b"moov", capture_fps_meta(240.0), track()))
+    assert read_frame_rate(path) == 240.0
+
+def test_no_moov(tmp_path):
+    with pytest.raises(AtomError, match="No moov box"):
+        read_frame_rate(write(tmp_path, box(b"mdat", bytes(16))))
+
+def test_truncated_stts(tmp_path):
+    moov = box(b"moov", track())
+    with pytest.raises(AtomError):
+        read_frame_rate(write(tmp_path, moov[:-8]))
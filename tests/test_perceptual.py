@@ -0,0 +1,45 @@
+# tests/test_perceptual.py
+
+import random
+from core.perceptual import BKTree, hamming, cluster_hashes
+
+def test_bktree_search_matches_brute_force():
+    rng = random.Random(1234)
+    values = [rng.getrandbits(64) for _ in range(300)]
+    # near copies of a few values, a bit or two apart
+    values += [values[i] ^ (1 << rng.randrange(64)) for i in range(0, 300, 30)]
+    tree = BKTree()
+    for index, value in enumerate(values):
+        tree.add(value, index)
+    for query in values[:20] + [rng.getrandbits(64) for _ in range(20)]:
+        for radius in (0, 1, 6, 20, 32):
+            expected = sorted((hamming(query, value), index) for index, value in enumerate(values)
+                              if hamming(query, value) <= radius)
+            assert sorted(tree.search(query, radius)) == expected
+
+def test_bktree_duplicates_and_empty():
+    tree = BKTree()
+    assert tree.search(0, 64) == []
+    tree.add(0b1010, "a")
+    tree.add(0b1010, "b")
+    tree.add(0b1011, "c")
+    assert sorted(tree.search(0b1010, 0)) == [(0, "a"), (0, "b")]
+    assert sorted(tree.search(0b1010, 1)) == [(0, "a"), (0, "b"), (1, "c")]
+
+def test_clusters_do_not_chain():
+    # b is 4 bits from a, c is 4 bits from b but 8 from a: with threshold 6
+    # c must not join a's cluster through b
+    hashes = {
+        "/missing/a.jpg": (0x00, 4000, 3000),
+        "/missing/b.jpg": (0x0F, 1000, 750),
+        "/missing/c.jpg": (0xFF, 4000, 3000),
+    }
+    assert cluster_hashes(hashes, threshold=6) == [["/missing/a.jpg", "/missing/b.jpg"]]
+
+def test_cluster_best_first():
+    hashes = {
+        "/missing/small.jpg": (0x1, 800, 600),
+        "/missing/IMG_1.HEIC": (0x3, 4032, 3024),
+        "/missing/IMG_1.jpg": (0x1, 4032, 3024),
+    }
+    assert cluster_hashes(hashes, threshold=6) == [["/missing/IMG_1.HEIC", "/missing/IMG_1.jpg", "/missing/small.jpg"]]
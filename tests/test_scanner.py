@@ -0,0 +1,57 @@
+# tests/test_scanner.py
+
+import hashlib
+from core.hashing import is_synthetic
+from core.scanner import find_duplicate_digests
+
+EDGE = 4
+
+def write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+def test_size_edge_full_grouping(tmp_path):
+    files = {
+        "unique": write(tmp_path, "unique.bin", b"u" * 5),
+        # same size, different edges: settled by the partial hash
+        "edge_a": write(tmp_path, "edge_a.bin", b"A" + b"x" * 30 + b"A"),
+        "edge_b": write(tmp_path, "edge_b.bin", b"B" + b"x" * 30 + b"B"),
+        # same size and edges, different middle: need the full hash
+        "mid_a": write(tmp_path, "mid_a.bin", b"head" + b"1" * 12 + b"tail"),
+        "mid_b": write(tmp_path, "mid_b.bin", b"head" + b"2" * 12 + b"tail"),
+        # identical copies
+        "copy_a": write(tmp_path, "copy_a.bin", b"same content, read in full"),
+        "copy_b": write(tmp_path, "copy_b.bin", b"same content, read in full"),
+        # small enough to be read in full by the partial stage
+        "small_a": write(tmp_path, "small_a.bin", b"abc"),
+        "small_b": write(tmp_path, "small_b.bin", b"abd"),
+    }
+    digests, stats = find_duplicate_digests(list(files.values()), max_workers=2, edge_size=EDGE, algorithm="md5")
+
+    assert digests[files["unique"]].startswith("size:")
+    assert digests[files["edge_a"]].startswith("partial:")
+    assert digests[files["edge_a"]] != digests[files["edge_b"]]
+    for name in ("mid_a", "mid_b", "copy_a", "small_a", "small_b"):
+        with open(files[name], "rb") as f:
+            assert digests[files[name]] == hashlib.md5(f.read()).hexdigest()
+    assert digests[files["copy_a"]] == digests[files["copy_b"]]
+    assert digests[files["mid_a"]] != digests[files["mid_b"]]
+
+    assert stats["size"] == {"files": 1, "bytes_read": 0, "bytes_skipped": 5}
+    assert stats["partial"]["files"] == 4
+    assert stats["full"]["files"] == 4
+    assert sum(is_synthetic(d) for d in digests.values()) == 3
+
+def test_settled_callback_sees_every_file_once(tmp_path):
+    paths = [write(tmp_path, f"{i}.bin", bytes([i % 2]) * 64) for i in range(4)]
+    settled = []
+    digests, _ = find_duplicate_digests(paths, edge_size=EDGE, on_settled=lambda path, digest: settled.append(path))
+    assert sorted(settled) == sorted(paths)
+    assert digests[paths[0]] == digests[paths[2]] != digests[paths[1]]
+
+def test_process_pool_gives_the_same_digests(tmp_path):
+    paths = [write(tmp_path, f"{i}.bin", bytes([i % 3]) * 100 + bytes([i % 2])) for i in range(6)]
+    threaded, _ = find_duplicate_digests(paths, edge_size=EDGE)
+    spawned, _ = find_duplicate_digests(paths, max_workers=2, edge_size=EDGE, use_processes=True)
+    assert spawned == threaded
@@ -0,0 +1,57 @@
+# tests/test_video_planner.py
+
+import pytest
+from core.video_planner import (
+    REMUX, TRANSCODE_AUDIO, REENCODE, plan_conversion, build_ffmpeg_command, build_segment_encode_command,
+    passthrough_sync_args, video_timescale
+)
+
+def streams(video, *audio):
+    found = [{"codec_type": "video", "codec_name": video, "time_base": "1/600"}] if video else []
+    return found + [{"codec_type": "audio", "codec_name": codec} for codec in audio]
+
+@pytest.mark.parametrize("video, audio, policy, plan", [
+    ("hevc", ["aac"], "auto", REMUX),
+    ("h264", ["aac"], "auto", REMUX),
+    ("h264", [], "auto", REMUX),
+    ("hevc", ["pcm_s16le"], "auto", TRANSCODE_AUDIO),
+    ("h264", ["aac", "pcm_s16le"], "auto", TRANSCODE_AUDIO),
+    ("prores", ["aac"], "auto", REENCODE),
+    (None, ["aac"], "auto", REENCODE),
+    ("hevc", ["aac"], "force_h264", REENCODE),
+    ("h264", ["pcm_s16le"], "force_h264", TRANSCODE_AUDIO),
+    ("h264", ["aac"], "force_h264", REMUX),
+    ("h264", ["aac"], "always_reencode", REENCODE),
+    ("hevc", ["aac"], "always_reencode", REENCODE),
+])
+def test_plan_matrix(video, audio, policy, plan):
+    assert plan_conversion(streams(video, *audio), policy)[0] == plan
+
+def test_hevc_remux_command():
+    cmd = build_ffmpeg_command("in.mov", "out.mp4", REMUX, streams("hevc", "aac"))
+    assert cmd[cmd.index("-map_metadata") + 1] == "0"
+    assert cmd[cmd.index("-movflags") + 1] == "use_metadata_tags"
+    assert cmd[cmd.index("-c:v") + 1] == "copy"
+    assert cmd[cmd.index("-tag:v") + 1] == "hvc1"
+    assert cmd[cmd.index("-c:a") + 1] == "copy"
+    assert cmd[-1] == "out.mp4"
+
+def test_audio_only_transcode_command():
+    cmd = build_ffmpeg_command("in.mov", "out.mp4", TRANSCODE_AUDIO, streams("h264", "pcm_s16le"))
+    assert cmd[cmd.index("-c:v") + 1] == "copy"
+    assert cmd[cmd.index("-c:a") + 1] == "aac"
+    assert "-tag:v" not in cmd
+
+def test_reencode_command_and_extra_outputs():
+    cmd = build_ffmpeg_command("in.mov", "out.mp4", REENCODE, streams("prores", "aac"), ["-map", "0:v:0", "poster.jpg"])
+    assert cmd[cmd.index("-c:v") + 1] == "libx264"
+    assert cmd[cmd.index("-map_metadata") + 1] == "0"
+    assert cmd[-4:] == ["out.mp4", "-map", "0:v:0", "poster.jpg"]
+
+def test_segment_encode_sync_option():
+    assert passthrough_sync_args((4, 4)) == ["-vsync", "passthrough"]
+    assert passthrough_sync_args((6, 0)) == ["-fps_mode", "passthrough"]
+    cmd = build_segment_encode_command("seg.mov", "seg.mp4", 4, video_timescale(streams("h264")), ["-vsync", "passthrough"])
+    assert cmd[cmd.index("-threads") + 1] == "4"
+    assert cmd[cmd.index("-vsync") + 1] == "passthrough"
+    assert cmd[cmd.index("-video_track_timescale") + 1] == "600"